@@ -0,0 +1,124 @@
+"""
+Compare the rows per second served by the JSON API with the equivalent HTML
+blog list, walking both with cursors through Django's test client.
+
+The HTML list is measured at its own page size and at the API's page size,
+so that per-request overhead and per-row cost can be told apart. Results are
+printed as JSON.
+
+    python benchmarks/api_throughput.py --blogs 20000 --rows 10000
+"""
+
+import argparse
+import json
+import re
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from common import seed, setup_django
+
+# The HTML list is read the way a scraper would, without the test client's
+# template instrumentation, which would inflate its cost.
+BLOG_LINK_RE = re.compile(rb'<li>\s*<a href="/blog/blog/\d+"')
+NEXT_CURSOR_RE = re.compile(rb'\?cursor=([\w-]+)">next<')
+
+
+def walk(client, url, params, rows):
+    """
+    Follow next links from `url`, starting over at the end of the list, until
+    `rows` rows were served; return the rows, requests and elapsed time.
+    """
+    served = requests = 0
+    next_url, next_params = url, params
+    start = time.perf_counter()
+    while served < rows:
+        response = client.get(next_url, next_params)
+        assert response.status_code == 200, response.status_code
+        requests += 1
+        if response["Content-Type"] == "application/json":
+            data = response.json()
+            served += len(data["results"])
+            next_url, next_params = data["next"], {}
+        else:
+            served += len(BLOG_LINK_RE.findall(response.content))
+            cursor = NEXT_CURSOR_RE.search(response.content)
+            next_params = {"cursor": cursor[1].decode()} if cursor else {}
+            if cursor is None:
+                next_url = None
+        if next_url is None:
+            next_url, next_params = url, params
+    return served, requests, time.perf_counter() - start
+
+
+def measure(name, client, url, params, rows):
+    # Warm up the query plan and template caches.
+    walk(client, url, params, 1)
+    served, requests, elapsed = walk(client, url, params, rows)
+    return {
+        "name": name,
+        "rows": served,
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(served / elapsed),
+        "requests_per_second": round(requests / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--blogs", type=int, default=20000)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(
+            Path(directory) / "db.sqlite3",
+            BLOG_CURSOR_PAGINATION=True,
+            SQLITE_PRAGMA_PROFILE="production",
+            ALLOWED_HOSTS="testserver",
+            DEBUG="",
+        )
+        from django.test import Client
+        from django.urls import reverse
+
+        from blog.views import BlogListView
+
+        seed(args.blogs, 0)
+        client = Client()
+        api = reverse("api-blogs")
+        html = reverse("blogs")
+        results = [
+            measure(
+                "api",
+                client,
+                api,
+                {"limit": args.page_size},
+                args.rows,
+            ),
+            measure(
+                "api_description",
+                client,
+                api,
+                {"limit": args.page_size, "fields": "id,name,description,post_date"},
+                args.rows,
+            ),
+            measure(
+                f"html_{BlogListView.paginate_by}",
+                client,
+                html,
+                {},
+                args.rows,
+            ),
+        ]
+        with mock.patch.object(BlogListView, "paginate_by", args.page_size):
+            results.append(
+                measure(f"html_{args.page_size}", client, html, {}, args.rows)
+            )
+    print(json.dumps({"blogs": args.blogs, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
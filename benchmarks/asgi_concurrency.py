@@ -0,0 +1,179 @@
+"""
+Compare the sync views under gunicorn (WSGI, sync workers) with the async
+views under uvicorn workers (ASGI) while many slow clients are connected.
+
+Slow clients trickle their request headers over --slow seconds, the way
+clients on bad mobile links do, and tie up a sync worker for that long. While
+they are connected, a few fast clients measure the latency everyone else
+sees. Both servers get the same number of worker processes and the same
+seeded database. Results are printed as JSON.
+
+    python benchmarks/asgi_concurrency.py --slow-clients 1000 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import BASE_DIR, benchmark_env, percentile, seed, setup_django
+
+ASYNC_VIEWS = "index,blogs,blogs-by-author,blog-detail,blog-comment"
+
+SERVERS = {
+    "wsgi": ["django_diy_blog.wsgi:application"],
+    "asgi": ["django_diy_blog.asgi:application", "-k", "uvicorn.workers.UvicornWorker"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.2)
+            continue
+        writer.close()
+        return
+    raise RuntimeError(f"Server on port {port} did not start.")
+
+
+async def get(port, path, trickle=0.0, timeout=60.0):
+    """
+    GET `path`, sending the headers one by one over `trickle` seconds.
+
+    Returns (status, seconds) or (None, seconds) on error or timeout.
+    """
+    start = time.monotonic()
+    headers = [
+        f"GET {path} HTTP/1.1\r\n",
+        "Host: 127.0.0.1\r\n",
+        "User-Agent: asgi-concurrency-benchmark\r\n",
+        "Accept: text/html\r\n",
+        "Accept-Language: en\r\n",
+        "Connection: close\r\n",
+        "\r\n",
+    ]
+    try:
+        async with asyncio.timeout(timeout):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for header in headers:
+                writer.write(header.encode())
+                await writer.drain()
+                if trickle:
+                    await asyncio.sleep(trickle / len(headers))
+            status_line = await reader.readline()
+            await reader.read()
+            writer.close()
+        return int(status_line.split()[1]), time.monotonic() - start
+    except (OSError, IndexError, ValueError, TimeoutError):
+        return None, time.monotonic() - start
+
+
+async def fast_client(port, paths, deadline, latencies, failures):
+    i = 0
+    while time.monotonic() < deadline:
+        status, seconds = await get(port, paths[i % len(paths)], timeout=30)
+        if status == 200:
+            latencies.append(seconds)
+        else:
+            failures.append(status)
+        i += 1
+
+
+async def slow_client(port, paths, deadline, slow, completed, failures):
+    i = 0
+    while time.monotonic() < deadline:
+        status, _ = await get(port, paths[i % len(paths)], trickle=slow)
+        if status == 200:
+            completed.append(1)
+        else:
+            failures.append(status)
+        i += 1
+
+
+async def drive(port, paths, args):
+    await wait_until_up(port)
+    deadline = time.monotonic() + args.duration
+    latencies, fast_failures, slow_completed, slow_failures = [], [], [], []
+    tasks = [
+        slow_client(port, paths, deadline, args.slow, slow_completed, slow_failures)
+        for _ in range(args.slow_clients)
+    ]
+    tasks += [
+        fast_client(port, paths, deadline, latencies, fast_failures)
+        for _ in range(args.fast_clients)
+    ]
+    await asyncio.gather(*tasks)
+    return {
+        "fast_requests_per_second": round(len(latencies) / args.duration, 1),
+        "fast_p50_ms": round((percentile(latencies, 0.5) or 0) * 1000, 1),
+        "fast_p99_ms": round((percentile(latencies, 0.99) or 0) * 1000, 1),
+        "fast_failures": len(fast_failures),
+        "slow_requests_completed": len(slow_completed),
+        "slow_failures": len(slow_failures),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--servers", nargs="+", default=list(SERVERS))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--slow-clients", type=int, default=1000)
+    parser.add_argument("--fast-clients", type=int, default=10)
+    parser.add_argument("--slow", type=float, default=5, help="Seconds per request.")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--blogs", type=int, default=200)
+    parser.add_argument("--comments", type=int, default=20)
+    args = parser.parse_args()
+
+    # Every slow client holds a socket open on both ends.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    report = []
+    with tempfile.TemporaryDirectory() as directory:
+        database = Path(directory) / "db.sqlite3"
+        setup_django(database)
+        blog_ids = seed(args.blogs, args.comments)
+        paths = ["/blog/blogs/"] + [f"/blog/blog/{pk}" for pk in blog_ids[:50]]
+
+        for name in args.servers:
+            port = free_port()
+            env = dict(os.environ)
+            # DEBUG is read as a plain string, so only an empty value is false.
+            env.update(benchmark_env(database, DEBUG="", ALLOWED_HOSTS="127.0.0.1"))
+            if name == "asgi":
+                env["BLOG_ASYNC_VIEWS"] = ASYNC_VIEWS
+            server = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", *SERVERS[name]]
+                + ["--workers", str(args.workers), "--bind", f"127.0.0.1:{port}"]
+                + ["--backlog", str(args.slow_clients * 2), "--log-level", "error"],
+                cwd=BASE_DIR,
+                env=env,
+            )
+            try:
+                result = asyncio.run(drive(port, paths, args))
+            finally:
+                server.terminate()
+                server.wait()
+            report.append({"server": name, "workers": args.workers, **result})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Helpers shared by the benchmark scripts in this directory.
+"""
+
+import datetime
+import io
+import os
+import random
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def benchmark_env(database_path, **settings):
+    """
+    Return the environment variables pointing the site at a benchmark
+    database, with any other settings given as keyword arguments.
+    """
+    env = {
+        "DATABASE_URL": f"sqlite:///{database_path}",
+        "SECRET_ADMIN_URL": "admin",
+        "DJANGO_SETTINGS_MODULE": "django_diy_blog.settings",
+    }
+    env.update({name: str(value) for name, value in settings.items()})
+    return env
+
+
+def setup_django(database_path, **settings):
+    """
+    Configure Django in this process against the given database.
+    """
+    os.environ.update(benchmark_env(database_path, **settings))
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+
+    django.setup()
+
+
+def seed(blogs, comments_per_blog):
+    """
+    Migrate the database and create one blogger with `blogs` blogs of
+    `comments_per_blog` comments each; returns the blog ids.
+    """
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+
+    from blog.models import Blog, BlogAuthor, BlogComment
+
+    call_command("migrate", verbosity=0)
+    user = User.objects.create_user("bench", password="bench")
+    author = BlogAuthor.objects.create(user=user, bio="Benchmark author.")
+    for i in range(blogs):
+        blog = Blog.objects.create(
+            name=f"Blog {i}", author=author, description="Lorem ipsum. " * 40
+        )
+        BlogComment.objects.bulk_create(
+            BlogComment(author=user, blog=blog, description=f"Comment {j}")
+            for j in range(comments_per_blog)
+        )
+    return list(Blog.objects.values_list("pk", flat=True))
+
+
+def zipf_weights(count, skew):
+    """
+    Weights of `count` items by rank, the first being the most popular.
+    """
+    return [1 / (rank + 1) ** skew for rank in range(count)]
+
+
+def seed_skewed(
+    users, authors, blogs, comments, skew=1.1, random_seed=0, batch_size=5000
+):
+    """
+    Migrate the database and create a deterministic synthetic site: `users`
+    users, the first `authors` of them bloggers, and `blogs` blogs and
+    `comments` comments spread over them with Zipf-like skew, so that a few
+    bloggers write most posts and a few hot posts get most comments.
+
+    Returns the blogger and blog ids, hottest first.
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+
+    from blog.models import Blog, BlogAuthor, BlogComment
+    from blog.sitemaps import build_sitemaps
+
+    rng = random.Random(random_seed)
+    call_command("migrate", verbosity=0)
+    # One hash for everyone: hashing each password would take minutes.
+    password = make_password("bench")
+    User.objects.bulk_create(
+        (User(username=f"user{i}", password=password) for i in range(users)),
+        batch_size=batch_size,
+    )
+    user_ids = list(User.objects.order_by("pk").values_list("pk", flat=True))
+    BlogAuthor.objects.bulk_create(
+        BlogAuthor(user_id=pk, bio=f"Synthetic blogger {i}.")
+        for i, pk in enumerate(user_ids[:authors])
+    )
+    author_ids = list(BlogAuthor.objects.order_by("pk").values_list("pk", flat=True))
+    rng.shuffle(author_ids)
+
+    today = datetime.date.today()
+    Blog.objects.bulk_create(
+        (
+            Blog(
+                name=f"Blog {i}",
+                author_id=author_id,
+                description="Lorem ipsum dolor sit amet. " * rng.randint(5, 60),
+                post_date=today - datetime.timedelta(days=rng.randrange(3650)),
+            )
+            for i, author_id in enumerate(
+                rng.choices(author_ids, zipf_weights(len(author_ids), skew), k=blogs)
+            )
+        ),
+        batch_size=batch_size,
+    )
+    blog_ids = list(Blog.objects.order_by("pk").values_list("pk", flat=True))
+    rng.shuffle(blog_ids)
+
+    BlogComment.objects.bulk_create(
+        (
+            BlogComment(
+                blog_id=blog_id,
+                author_id=rng.choice(user_ids),
+                description=f"Comment {i}: " + "blah " * rng.randint(1, 40),
+            )
+            for i, blog_id in enumerate(
+                rng.choices(blog_ids, zipf_weights(len(blog_ids), skew), k=comments)
+            )
+        ),
+        batch_size=batch_size,
+    )
+    call_command("recount_blog", stdout=io.StringIO())
+    call_command("rebuild_search_index", stdout=io.StringIO())
+    build_sitemaps(rebuild=True)
+    return author_ids, blog_ids
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
@@ -0,0 +1,161 @@
+"""
+Measure blog read throughput while comments are being written, per SQLite
+pragma profile.
+
+Each profile runs against a fresh database in a temporary directory: reader
+processes render the queries behind the blog list and detail pages while one
+writer process posts comments as fast as it can. Results are printed as JSON.
+
+    python benchmarks/sqlite_concurrency.py --profiles off production
+"""
+
+import argparse
+import json
+import multiprocessing
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import percentile, seed, setup_django
+
+
+def is_locked(error):
+    return "locked" in str(error) or "busy" in str(error)
+
+
+def reader(deadline, blog_ids, results):
+    from django.db import OperationalError
+
+    from blog.models import Blog
+    from blog.views import comment_paginator
+
+    reads = errors = 0
+    latencies = []
+    while time.monotonic() < deadline:
+        pk = blog_ids[reads % len(blog_ids)]
+        start = time.perf_counter()
+        try:
+            list(
+                Blog.objects.select_related("author__user").order_by(
+                    "-post_date", "-id"
+                )[:5]
+            )
+            Blog.objects.select_related("author__user").get(pk=pk)
+            list(comment_paginator(pk).page())
+        except OperationalError as error:
+            if not is_locked(error):
+                raise
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        reads += 1
+    results.put({"reads": reads, "read_errors": errors, "latencies": latencies})
+
+
+def writer(deadline, blog_ids, results):
+    from django.contrib.auth.models import User
+    from django.db import OperationalError
+
+    from blog.models import BlogComment
+
+    user = User.objects.get(username="bench")
+    writes = errors = 0
+    while time.monotonic() < deadline:
+        try:
+            BlogComment.objects.create(
+                author=user,
+                blog_id=blog_ids[writes % len(blog_ids)],
+                description="Benchmark comment.",
+            )
+        except OperationalError as error:
+            if not is_locked(error):
+                raise
+            errors += 1
+            continue
+        writes += 1
+    results.put({"writes": writes, "write_errors": errors})
+
+
+def run_profile(args):
+    """
+    Benchmark one profile; runs in its own process so Django can be set up
+    against that profile's database.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(
+            Path(directory) / "db.sqlite3", SQLITE_PRAGMA_PROFILE=args.run_profile
+        )
+        from django.db import connection, connections
+
+        blog_ids = seed(args.blogs, args.comments)
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            journal_mode = cursor.fetchone()[0]
+        # Forked workers must open their own connections.
+        connections.close_all()
+
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        deadline = time.monotonic() + args.duration
+        workers = [
+            context.Process(target=reader, args=(deadline, blog_ids, results))
+            for _ in range(args.readers)
+        ]
+        if args.writers:
+            workers += [
+                context.Process(target=writer, args=(deadline, blog_ids, results))
+                for _ in range(args.writers)
+            ]
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+    latencies = [
+        value for outcome in outcomes for value in outcome.get("latencies", [])
+    ]
+    total = lambda key: sum(outcome.get(key, 0) for outcome in outcomes)
+    return {
+        "profile": args.run_profile,
+        "journal_mode": journal_mode,
+        "readers": args.readers,
+        "writers": args.writers,
+        "reads_per_second": round(total("reads") / args.duration, 1),
+        "writes_per_second": round(total("writes") / args.duration, 1),
+        "read_lock_errors": total("read_errors"),
+        "write_lock_errors": total("write_errors"),
+        "read_p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "read_p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=["off", "production"])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--blogs", type=int, default=200)
+    parser.add_argument("--comments", type=int, default=20)
+    parser.add_argument("--run-profile", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        print(json.dumps(run_profile(args)))
+        return
+
+    report = []
+    for profile in args.profiles:
+        command = [sys.executable, __file__, "--run-profile", profile]
+        for option in ("duration", "readers", "writers", "blogs", "comments"):
+            command += [f"--{option}", str(getattr(args, option))]
+        output = subprocess.run(command, check=True, capture_output=True, text=True)
+        report.append(json.loads(output.stdout.splitlines()[-1]))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+"""
+Benchmark every URL of blog/urls.py, plus logins and comment posts, on a
+seeded synthetic site, through Django's test client and through gunicorn
+(WSGI, sync workers) and uvicorn workers (ASGI).
+
+Pages with an id are requested with the same skew as the data: hot posts
+and prolific bloggers most often. For each URL the report gives throughput,
+p50/p95/p99 latency and SQL queries per request (from the Server-Timing
+header of blog.metrics), and each run its peak RSS, as JSON.
+
+The report is compared with a baseline recorded on the same machine, and
+the script exits with status 1 on regressions: more queries or errors than
+the baseline, or p50/p95 latency, throughput or peak RSS worse than
+--tolerance. Record the baseline again after an intended change.
+
+    python benchmarks/suite.py --update-baseline  # record benchmarks/baseline.json
+    python benchmarks/suite.py                    # compare with it
+"""
+
+import argparse
+import concurrent.futures
+import http.cookiejar
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+from asgi_concurrency import ASYNC_VIEWS, SERVERS, free_port
+from common import (
+    BASE_DIR,
+    benchmark_env,
+    percentile,
+    seed_skewed,
+    setup_django,
+    zipf_weights,
+)
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+SKIPPED = {
+    "blog-live-comments": "a server-sent event stream, it never completes",
+    "blog-export": "a dump of the whole database, see the export_blog command",
+}
+# URLs whose <pk> is a blogger's; the others take a blog's.
+BLOGGER_URLS = {"blogs-by-author", "blogs-by-author-feed", "blogs-by-author-atom"}
+# URLs for logged in users only.
+LOGGED_IN_URLS = {"blog-comment"}
+QUERY_STRINGS = {"blog-search": "?q=lorem"}
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+# Latency regressions smaller than this are noise, whatever the tolerance.
+LATENCY_SLACK_MS = 2.0
+
+
+def workload(author_ids, blog_ids, requests, skew, random_seed):
+    """
+    Return {name: [(method, path, logged_in)]}, `requests` requests for each
+    URL of blog/urls.py and for the login and comment forms.
+    """
+    from django.urls import reverse
+
+    from blog import urls
+
+    rng = random.Random(random_seed)
+    picks = {
+        "blogger": rng.choices(
+            author_ids, zipf_weights(len(author_ids), skew), k=requests
+        ),
+        "blog": rng.choices(blog_ids, zipf_weights(len(blog_ids), skew), k=requests),
+    }
+    targets = {}
+    for pattern in urls.urlpatterns:
+        name = pattern.name
+        if name in SKIPPED:
+            continue
+        converters = pattern.pattern.converters
+        ids = picks["blogger" if name in BLOGGER_URLS else "blog"]
+        paths = []
+        for i in range(requests):
+            kwargs = {}
+            if "pk" in converters:
+                kwargs["pk"] = ids[i]
+            if "section" in converters:
+                kwargs.update(section="blog", number=0)
+            path = reverse(name, kwargs=kwargs) + QUERY_STRINGS.get(name, "")
+            paths.append(("GET", path, name in LOGGED_IN_URLS))
+        targets[name] = paths
+    targets["login"] = [("POST", reverse("login"), False)] * requests
+    targets["comment"] = [
+        ("POST", reverse("blog-comment", args=[pk]), True) for pk in picks["blog"]
+    ]
+    return targets
+
+
+def form_data(path):
+    if path.startswith("/accounts/login/"):
+        return {"username": "user0", "password": "bench"}
+    return {"description": "Benchmark comment."}
+
+
+class ClientSession:
+    """
+    Requests through Django's test client, in this process.
+    """
+
+    def __init__(self):
+        from django.test import Client
+
+        self.anonymous = Client()
+        self.logged_in = Client()
+        self.logged_in.login(username="user0", password="bench")
+
+    def request(self, method, path, logged_in):
+        client = self.logged_in if logged_in else self.anonymous
+        if method == "POST":
+            response = client.post(path, form_data(path))
+        else:
+            response = client.get(path)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response.status_code, response.get("Server-Timing", "")
+
+
+class NoRedirects(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ServerSession:
+    """
+    Requests over HTTP to a server, with a cookie jar per kind of user and
+    CSRF tokens taken from the cookies.
+    """
+
+    def __init__(self, port):
+        self.base = f"http://127.0.0.1:{port}"
+        self.jars = {
+            False: http.cookiejar.CookieJar(),
+            True: http.cookiejar.CookieJar(),
+        }
+        self.openers = {
+            logged_in: urllib.request.build_opener(
+                urllib.request.HTTPCookieProcessor(jar), NoRedirects
+            )
+            for logged_in, jar in self.jars.items()
+        }
+        # The login page sets the CSRF cookie.
+        self.request("GET", "/accounts/login/", False)
+        self.request("GET", "/accounts/login/", True)
+        self.request("POST", "/accounts/login/", True)
+
+    def csrf_token(self, logged_in):
+        for cookie in self.jars[logged_in]:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def request(self, method, path, logged_in):
+        data = None
+        if method == "POST":
+            data = dict(form_data(path), csrfmiddlewaretoken=self.csrf_token(logged_in))
+            data = urllib.parse.urlencode(data).encode()
+        request = urllib.request.Request(
+            self.base + path, data=data, headers={"Referer": self.base + path}
+        )
+        try:
+            with self.openers[logged_in].open(request, timeout=30) as response:
+                response.read()
+                return response.status, response.headers.get("Server-Timing", "")
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code, error.headers.get("Server-Timing", "")
+
+
+def measure(sessions, requests):
+    """
+    Send `requests`, spread over one thread per session; return the results
+    for one URL.
+    """
+    latencies, queries, errors = [], [], 0
+
+    def send(session, part):
+        results = []
+        for method, path, logged_in in part:
+            start = time.perf_counter()
+            status, timing = session.request(method, path, logged_in)
+            results.append((status, time.perf_counter() - start, timing, method))
+        return results
+
+    # Warm up the template and query plan caches.
+    for session in sessions:
+        session.request(*requests[0])
+    parts = [requests[i :: len(sessions)] for i in range(len(sessions))]
+    start = time.perf_counter()
+    if len(sessions) == 1:
+        results = send(sessions[0], parts[0])
+    else:
+        with concurrent.futures.ThreadPoolExecutor(len(sessions)) as pool:
+            results = sum(pool.map(send, sessions, parts), [])
+    elapsed = time.perf_counter() - start
+
+    for status, seconds, timing, method in results:
+        if status != (302 if method == "POST" else 200):
+            errors += 1
+            continue
+        latencies.append(seconds)
+        match = QUERIES_RE.search(timing)
+        if match:
+            queries.append(int(match[1]))
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "requests_per_second": round(len(results) / elapsed, 1),
+        "p50_ms": round((percentile(latencies, 0.5) or 0) * 1000, 2),
+        "p95_ms": round((percentile(latencies, 0.95) or 0) * 1000, 2),
+        "p99_ms": round((percentile(latencies, 0.99) or 0) * 1000, 2),
+        "queries": max(queries, default=None),
+    }
+
+
+def best_of(rounds):
+    """
+    Combine the rounds of one URL: noise only ever makes a round slower, so
+    keep the best latency and throughput, and the worst errors and queries.
+    """
+    return {
+        "requests": sum(result["requests"] for result in rounds),
+        "errors": max(result["errors"] for result in rounds),
+        "requests_per_second": max(result["requests_per_second"] for result in rounds),
+        "p50_ms": min(result["p50_ms"] for result in rounds),
+        "p95_ms": min(result["p95_ms"] for result in rounds),
+        "p99_ms": min(result["p99_ms"] for result in rounds),
+        "queries": max(
+            (result["queries"] for result in rounds if result["queries"] is not None),
+            default=None,
+        ),
+    }
+
+
+def run_targets(sessions, targets, rounds):
+    return {
+        name: best_of([measure(sessions, requests) for _ in range(rounds)])
+        for name, requests in targets.items()
+    }
+
+
+def peak_rss_mb(pid):
+    """
+    Return the largest peak RSS of the children of `pid` (server workers),
+    in MB, or None where /proc doesn't tell.
+    """
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            pids = children.read().split()
+    except OSError:
+        return None
+    peaks = []
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        peaks.append(int(line.split()[1]) / 1024)
+        except OSError:
+            continue
+    return round(max(peaks), 1) if peaks else None
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start.")
+
+
+def run_server(name, database, targets, args):
+    port = free_port()
+    env = dict(os.environ)
+    # DEBUG is read as a plain string, so only an empty value is false.
+    env.update(
+        benchmark_env(database, DEBUG="", ALLOWED_HOSTS="127.0.0.1", BLOG_METRICS=True)
+    )
+    if name == "asgi":
+        env["BLOG_ASYNC_VIEWS"] = ASYNC_VIEWS
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", *SERVERS[name]]
+        + ["--workers", str(args.workers), "--bind", f"127.0.0.1:{port}"]
+        + ["--log-level", "error"],
+        cwd=BASE_DIR,
+        env=env,
+    )
+    try:
+        wait_until_up(port)
+        sessions = [ServerSession(port) for _ in range(args.concurrency)]
+        results = run_targets(sessions, targets, args.rounds)
+        return results, peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(report, baseline, tolerance):
+    """
+    Return the regressions of `report` against `baseline`.
+    """
+    problems = []
+    for run, targets in baseline["results"].items():
+        for name, old in targets.items():
+            new = report["results"].get(run, {}).get(name)
+            if new is None:
+                continue
+            label = f"{run} {name}"
+            if (new["queries"] or 0) > (old["queries"] or 0):
+                problems.append(
+                    f"{label}: {new['queries']} queries, baseline {old['queries']}"
+                )
+            if new["errors"] > old["errors"]:
+                problems.append(
+                    f"{label}: {new['errors']} errors, baseline {old['errors']}"
+                )
+            # p99 is reported, not checked: a handful of samples decide it.
+            for key in ("p50_ms", "p95_ms"):
+                limit = max(old[key] * (1 + tolerance), old[key] + LATENCY_SLACK_MS)
+                if new[key] > limit:
+                    problems.append(f"{label}: {key} {new[key]}, baseline {old[key]}")
+            rate = old["requests_per_second"] / (1 + tolerance)
+            if new["requests_per_second"] < rate:
+                problems.append(
+                    f"{label}: {new['requests_per_second']} requests/s, "
+                    f"baseline {old['requests_per_second']}"
+                )
+    for run, old in baseline["peak_rss_mb"].items():
+        new = report["peak_rss_mb"].get(run)
+        if new is not None and old is not None and new > old * (1 + tolerance):
+            problems.append(f"{run}: peak RSS {new} MB, baseline {old} MB")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", nargs="+", default=["client", *SERVERS])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--bloggers", type=int, default=50)
+    parser.add_argument("--blogs", type=int, default=5000)
+    parser.add_argument("--comments", type=int, default=50000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=50, help="Per URL.")
+    parser.add_argument("--rounds", type=int, default=3, help="Best of, per URL.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", type=Path, help="Also write the report here.")
+    args = parser.parse_args()
+
+    dataset = {
+        "users": args.users,
+        "bloggers": args.bloggers,
+        "blogs": args.blogs,
+        "comments": args.comments,
+        "skew": args.skew,
+        "seed": args.seed,
+        "requests": args.requests,
+        "rounds": args.rounds,
+    }
+    report = {"dataset": dataset, "results": {}, "peak_rss_mb": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        database = Path(directory) / "db.sqlite3"
+        setup_django(
+            database,
+            DEBUG="",
+            ALLOWED_HOSTS="testserver",
+            BLOG_METRICS=True,
+            BLOG_SITEMAP_ROOT=Path(directory) / "sitemaps",
+        )
+        # Seed in a child process, so that the client run's peak RSS is its own.
+        with multiprocessing.get_context("fork").Pool(1) as pool:
+            author_ids, blog_ids = pool.apply(
+                seed_skewed,
+                (args.users, args.bloggers, args.blogs, args.comments, args.skew),
+                {"random_seed": args.seed},
+            )
+        targets = workload(author_ids, blog_ids, args.requests, args.skew, args.seed)
+
+        for run in args.runs:
+            if run == "client":
+                report["results"][run] = run_targets(
+                    [ClientSession()], targets, args.rounds
+                )
+                report["peak_rss_mb"][run] = round(
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+                )
+            else:
+                # Same database for every run: the comment posts of a run
+                # add less than a page to the hot blogs.
+                results, peak = run_server(run, database, targets, args)
+                report["results"][run] = results
+                report["peak_rss_mb"][run] = peak
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        return
+    if not args.baseline.exists():
+        sys.exit(f"No baseline at {args.baseline}; record one with --update-baseline.")
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["dataset"] != dataset:
+        sys.exit("The baseline was recorded on another dataset: pass the same options.")
+    problems = compare(report, baseline, args.tolerance)
+    if problems:
+        sys.exit("Regressions against the baseline:\n" + "\n".join(problems))
+    print("No regressions against the baseline.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 
-from .models import Blog, BlogAuthor, BlogComment
+from .models import Blog, BlogAuthor, BlogComment, RequestProfile
+from .profiling import top_functions
 
 
 class BlogInline(admin.TabularInline):
@@ -19,6 +24,8 @@ class BlogAdmin(admin.ModelAdmin):
         "name",
         "author",
         "post_date",
+        "comment_count",
+        "last_comment_at",
     )
     list_filter = ("author", "post_date")
     fields = (
@@ -32,6 +39,7 @@ class BlogAdmin(admin.ModelAdmin):
 
 @admin.register(BlogAuthor)
 class BlogAuthorAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "post_count")
     inlines = [BlogInline]
 
 
@@ -45,3 +53,76 @@ class BlogCommentAdmin(admin.ModelAdmin):
         "description",
         "post_date",
     )
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        "created",
+        "method",
+        "path",
+        "view",
+        "status_code",
+        "duration_ms",
+        "trigger",
+    )
+    list_filter = ("trigger", "url_name")
+    fields = (
+        "created",
+        "method",
+        "path",
+        "url_name",
+        "view",
+        "status_code",
+        "duration_ms",
+        "trigger",
+        "download",
+        "by_cumulative_time",
+        "by_own_time",
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="blog_requestprofile_download",
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        """
+        The raw statistics, for pstats, snakeviz and the like.
+        """
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(
+            bytes(profile.stats), content_type="application/octet-stream"
+        )
+        response["Content-Disposition"] = f'attachment; filename="profile-{pk}.prof"'
+        return response
+
+    @admin.display(description="Duration (ms)", ordering="duration")
+    def duration_ms(self, profile):
+        return round(profile.duration * 1000, 1)
+
+    @admin.display(description="Statistics")
+    def download(self, profile):
+        url = reverse("admin:blog_requestprofile_download", args=[profile.pk])
+        return format_html('<a href="{}">profile-{}.prof</a>', url, profile.pk)
+
+    @admin.display(description="Top functions by cumulative time")
+    def by_cumulative_time(self, profile):
+        return format_html("<pre>{}</pre>", top_functions(profile.stats))
+
+    @admin.display(description="Top functions by own time")
+    def by_own_time(self, profile):
+        return format_html("<pre>{}</pre>", top_functions(profile.stats, "tottime"))
@@ -0,0 +1,168 @@
+from django.http import JsonResponse
+
+from .models import Blog, BlogAuthor, BlogComment
+from .pagination import CursorPaginator, InvalidCursor
+from .querybudget import query_budget
+from .routers import replica_reads
+
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Fields clients may select with ?fields=, mapped to the columns they are read
+# from, and the fields returned when ?fields= is absent.
+BLOG_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "description": "description",
+    "post_date": "post_date",
+    "author": "author_id",
+    "author_name": "author__user__username",
+    "comment_count": "comment_count",
+    "last_comment_at": "last_comment_at",
+}
+BLOG_DEFAULT_FIELDS = ["id", "name", "post_date", "author", "author_name"]
+
+BLOGGER_FIELDS = {
+    "id": "id",
+    "username": "user__username",
+    "bio": "bio",
+    "post_count": "post_count",
+}
+BLOGGER_DEFAULT_FIELDS = ["id", "username", "post_count"]
+
+COMMENT_FIELDS = {
+    "id": "id",
+    "description": "description",
+    "post_date": "post_date",
+    "author": "author_id",
+    "author_name": "author__username",
+}
+COMMENT_DEFAULT_FIELDS = list(COMMENT_FIELDS)
+
+
+class BadRequest(Exception):
+    pass
+
+
+def error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def parse_fields(request, available, default):
+    """
+    Return the field names listed in ?fields=, or the default ones.
+    """
+    if "fields" not in request.GET:
+        return default
+    names = [name for name in request.GET["fields"].split(",") if name]
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise BadRequest(
+            f"Unknown fields {', '.join(unknown)}; "
+            f"available fields are {', '.join(available)}."
+        )
+    return list(dict.fromkeys(names))
+
+
+def parse_limit(request):
+    try:
+        limit = int(request.GET.get("limit", PAGE_SIZE))
+    except ValueError:
+        raise BadRequest("limit must be a number.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise BadRequest(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    return limit
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query["cursor"] = cursor
+    return f"{request.path}?{query.urlencode()}"
+
+
+def list_response(request, queryset, available, default, ordering):
+    """
+    Return one keyset page of `queryset` as JSON, with the requested fields.
+
+    Only the columns of those fields are selected, plus the ordering columns
+    the cursor needs, and rows are serialized straight from values_list()
+    tuples, without instantiating models.
+    """
+    try:
+        names = parse_fields(request, available, default)
+        limit = parse_limit(request)
+    except BadRequest as bad:
+        return error(str(bad))
+    columns = [available[name] for name in names]
+    keys = [name.lstrip("-") for name in ordering]
+    columns += [key for key in keys if key not in columns]
+    positions = [columns.index(key) for key in keys]
+    paginator = CursorPaginator(
+        queryset.values_list(*columns),
+        limit,
+        ordering,
+        row_key=lambda row: [row[position] for position in positions],
+    )
+    try:
+        page = paginator.page(request.GET.get("cursor"))
+    except InvalidCursor:
+        return error("Invalid cursor.")
+    return JsonResponse(
+        {
+            # The ordering columns added for the cursor come last: zip()
+            # leaves them out.
+            "results": [dict(zip(names, row)) for row in page.object_list],
+            "next": page_url(request, page.next_cursor),
+            "previous": page_url(request, page.previous_cursor),
+        }
+    )
+
+
+@replica_reads
+@query_budget(1)
+def blog_list(request):
+    """
+    Blogs, newest first.
+    """
+    return list_response(
+        request,
+        Blog.objects.all(),
+        BLOG_FIELDS,
+        BLOG_DEFAULT_FIELDS,
+        ("-post_date", "-id"),
+    )
+
+
+@replica_reads
+@query_budget(1)
+def blogger_list(request):
+    """
+    Bloggers, in the order of BloggerListView's cursor pages.
+    """
+    return list_response(
+        request,
+        BlogAuthor.objects.all(),
+        BLOGGER_FIELDS,
+        BLOGGER_DEFAULT_FIELDS,
+        ("id",),
+    )
+
+
+@replica_reads
+@query_budget(2)
+def blog_comment_list(request, pk):
+    """
+    A blog's comments, in posting order.
+    """
+    if not Blog.objects.filter(pk=pk).exists():
+        return error("No such blog.", status=404)
+    return list_response(
+        request,
+        BlogComment.objects.filter(blog_id=pk),
+        COMMENT_FIELDS,
+        COMMENT_DEFAULT_FIELDS,
+        ("post_date", "id"),
+    )
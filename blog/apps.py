@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class BlogConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "blog"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .db import apply_pragmas
+
+        connection_created.connect(apply_pragmas, dispatch_uid="blog.apply_pragmas")
@@ -0,0 +1,215 @@
+"""
+Native async implementations of the main blog views, for ASGI deployments.
+
+They are selected per URL name with the BLOG_ASYNC_VIEWS setting (see
+blog.urls) and render the same templates as their sync counterparts in
+blog.views, behind the same replica routing, page cache and conditional GET
+handling. All database access goes through the async ORM, so rows and counts
+are loaded before rendering: templates must not trigger queries.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+from django.forms import modelform_factory
+from django.http import (
+    Http404,
+    HttpResponseNotAllowed,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.shortcuts import render
+from django.urls import reverse
+
+from .cache import cached_page
+from .conditional import conditional_page
+from .live import fetch_events, publisher
+from .models import Blog, BlogAuthor, BlogComment
+from .pagination import apaginate_queryset
+from .querybudget import query_budget
+from .routers import pin_to_primary, replica_reads
+from .views import (
+    BlogCommentCreate,
+    BlogDetailView,
+    BlogListByAuthorView,
+    BlogListView,
+    comment_paginator,
+    render_index,
+)
+
+
+BlogCommentForm = modelform_factory(BlogComment, fields=["description"])
+
+
+def _list_context(name, paginated):
+    paginator, page, object_list, is_paginated = paginated
+    return {
+        "paginator": paginator,
+        "page_obj": page,
+        "is_paginated": is_paginated,
+        "object_list": object_list,
+        name: object_list,
+    }
+
+
+@query_budget(0)
+async def index(request):
+    """
+    Home page, see blog.views.index.
+    """
+    return render_index(request)
+
+
+@replica_reads
+@cached_page(BlogListView)
+@query_budget(BlogListView.query_budget)
+@conditional_page(BlogListView)
+async def blog_list(request, view=None):
+    """
+    List of all blogs, see blog.views.BlogListView.
+    """
+    if view is not None:
+        paginated = view.paginated
+    else:
+        paginated = await apaginate_queryset(
+            request,
+            Blog.objects.select_related("author__user"),
+            BlogListView.paginate_by,
+            BlogListView.cursor_ordering,
+            BlogListView.cursor_count_mode,
+        )
+    return render(request, "blog/blog_list.html", _list_context("blog_list", paginated))
+
+
+@replica_reads
+@cached_page(BlogListByAuthorView)
+@query_budget(BlogListByAuthorView.query_budget)
+@conditional_page(BlogListByAuthorView)
+async def blog_list_by_author(request, pk, view=None):
+    """
+    List of the blogs of one blogger, see blog.views.BlogListByAuthorView.
+    """
+    if view is not None:
+        blogger, paginated = view.blogger, view.paginated
+    else:
+        try:
+            blogger = await BlogAuthor.objects.select_related("user").aget(pk=pk)
+        except BlogAuthor.DoesNotExist:
+            raise Http404("No blogger found matching the query")
+        paginated = await apaginate_queryset(
+            request,
+            Blog.objects.filter(author=blogger),
+            BlogListByAuthorView.paginate_by,
+            BlogListByAuthorView.cursor_ordering,
+        )
+    context = _list_context("blog_list", paginated)
+    context["blogger"] = blogger
+    return render(request, "blog/blog_list_by_author.html", context)
+
+
+@replica_reads
+@cached_page(BlogDetailView)
+@query_budget(BlogDetailView.query_budget)
+@conditional_page(BlogDetailView)
+async def blog_detail(request, pk, view=None):
+    """
+    One blog with the first page of its comments, see blog.views.BlogDetailView.
+    """
+    if view is not None:
+        blog = view.object
+    else:
+        try:
+            blog = await Blog.objects.select_related("author__user").aget(pk=pk)
+        except Blog.DoesNotExist:
+            raise Http404("No blog found matching the query")
+    comment_page = await comment_paginator(pk).apage()
+    context = {"blog": blog, "object": blog, "comment_page": comment_page}
+    return render(request, "blog/blog_detail.html", context)
+
+
+@query_budget(BlogCommentCreate.query_budget)
+async def blog_comment_create(request, pk):
+    """
+    Form for adding a blog comment, see blog.views.BlogCommentCreate.
+    """
+    if request.method not in ("GET", "HEAD", "POST"):
+        return HttpResponseNotAllowed(["GET", "HEAD", "POST"])
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return redirect_to_login(request.get_full_path())
+    try:
+        blog = await Blog.objects.aget(pk=pk)
+    except Blog.DoesNotExist:
+        raise Http404("No blog found matching the query")
+    form = BlogCommentForm(request.POST if request.method == "POST" else None)
+    if form.is_valid():
+        form.instance.author = request.user
+        form.instance.blog = blog
+        await form.instance.asave()
+        response = HttpResponseRedirect(reverse("blog-detail", kwargs={"pk": pk}))
+        return pin_to_primary(response)
+    return render(request, "blog/blogcomment_form.html", {"form": form, "blog": blog})
+
+
+async def live_comments(request, pk):
+    """
+    Server-sent event stream of the comments posted on a blog from now on, or
+    after the comment id given by Last-Event-ID or `?after=`.
+
+    Streams stay open for minutes, so they must not hold a database connection
+    of their own: every query goes through the publisher's shared connection,
+    and the session is never loaded.
+    """
+    # Under WSGI the stream would be consumed to the end before sending.
+    if not settings.BLOG_LIVE_COMMENTS or not isinstance(request, ASGIRequest):
+        raise Http404("Live comments are not enabled.")
+    if not await publisher.run_sync(Blog.objects.filter(pk=pk).exists):
+        raise Http404("No blog found matching the query")
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.GET["after"])
+    except (KeyError, ValueError):
+        after = None
+    response = StreamingHttpResponse(
+        comment_events(pk, after), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Don't let nginx buffer the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+# Nothing runs on the request's own connection (see above).
+live_comments.query_budget = 0
+
+
+async def comment_events(blog_id, after):
+    subscription = await publisher.subscribe(blog_id)
+    try:
+        yield f"retry: {settings.BLOG_LIVE_POLL_INTERVAL * 1000:.0f}\n\n"
+        last_sent = after or 0
+        if after is not None:
+            # Subscribed first, so nothing falls between the catch-up and the
+            # live events; duplicates are skipped by id.
+            for _, comment_id, event in await publisher.run_sync(
+                fetch_events, [blog_id], after
+            ):
+                last_sent = comment_id
+                yield event
+        loop = asyncio.get_running_loop()
+        closes_at = loop.time() + settings.BLOG_LIVE_MAX_AGE
+        while not subscription.dropped and loop.time() < closes_at:
+            timeout = min(settings.BLOG_LIVE_HEARTBEAT, closes_at - loop.time())
+            try:
+                comment_id, event = await asyncio.wait_for(
+                    subscription.queue.get(), timeout
+                )
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if comment_id > last_sent:
+                last_sent = comment_id
+                yield event
+    finally:
+        publisher.unsubscribe(subscription)
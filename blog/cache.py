@@ -0,0 +1,215 @@
+import time
+from contextlib import nullcontext
+from functools import wraps
+from hashlib import md5
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.utils.cache import set_response_etag
+
+from .routers import PRIMARY_COOKIE, read_from
+
+
+# Every cached page key embeds the current values of the version counters it
+# depends on, so bumping a counter makes all the affected pages unreachable at
+# once without having to know or delete their keys.
+GENERATION_KEY = "blog:v:generation"
+LIST_KEY = "blog:v:list"
+# When a counter was last bumped, see primary_reads_after_bump().
+BUMPED_AT_KEY = "blog:v:bumped-at"
+
+# Validators are kept so ConditionalGetMiddleware can answer cache hits with 304.
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+def blog_key(pk):
+    return f"blog:v:blog:{pk}"
+
+
+def author_key(pk):
+    return f"blog:v:author:{pk}"
+
+
+def get_cache():
+    return caches[settings.BLOG_PAGE_CACHE_ALIAS]
+
+
+def get_versions(keys):
+    """
+    Return the current value of each version counter, in one cache round trip.
+    """
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, 1, timeout=None)
+            versions[key] = cache.get(key, 1)
+    return [versions[key] for key in keys]
+
+
+def page_cache_key(request, dependencies):
+    """
+    Return the cache key of a page from its URL and its version counters.
+    """
+    keys = [GENERATION_KEY] + list(dependencies)
+    versions = ".".join(str(version) for version in get_versions(keys))
+    path = md5(request.get_full_path().encode()).hexdigest()
+    return f"blog:page:{path}:{versions}"
+
+
+def bump(*keys, using=DEFAULT_DB_ALIAS):
+    """
+    Increment version counters, invalidating every page that embeds them.
+
+    `using` is the database written to: pages are rendered from the default
+    one and its replicas, so writes to any other leave them alone.
+    """
+    if using != DEFAULT_DB_ALIAS:
+        return
+    cache = get_cache()
+    for key in keys:
+        if key is None:
+            continue
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Unknown key: no cached page can depend on it yet.
+            cache.add(key, 1, timeout=None)
+    if settings.BLOG_READ_REPLICAS:
+        cache.set(BUMPED_AT_KEY, time.time(), settings.BLOG_REPLICA_STICKY_SECONDS)
+
+
+def primary_reads_after_bump():
+    """
+    Return a context manager rendering a page missing from the cache from the
+    primary if a counter was bumped in the last BLOG_REPLICA_STICKY_SECONDS.
+
+    The write behind the bump may not have reached the replicas yet, and the
+    stale page rendered from one would be cached under the new versions.
+    """
+    if settings.BLOG_READ_REPLICAS and get_cache().get(BUMPED_AT_KEY) is not None:
+        return read_from(None)
+    return nullcontext()
+
+
+class CachedPageMixin:
+    """
+    Serve anonymous GET requests from the page cache.
+
+    Views list the version counters their output depends on in
+    `get_cache_dependencies()`. Requests carrying a session cookie bypass the
+    cache, so a hit never touches the session or the database, unless
+    BLOG_ANONYMOUS_SHELL makes the page identical for every user. So do
+    clients pinned to the primary after a write: they must see it.
+    """
+
+    def get_cache_dependencies(self):
+        return [LIST_KEY]
+
+    def cacheable(self, request):
+        return (
+            settings.BLOG_PAGE_CACHE
+            and request.method in ("GET", "HEAD")
+            and PRIMARY_COOKIE not in request.COOKIES
+            and (
+                settings.BLOG_ANONYMOUS_SHELL
+                or settings.SESSION_COOKIE_NAME not in request.COOKIES
+            )
+        )
+
+    def page_cache_key(self, request):
+        return page_cache_key(request, self.get_cache_dependencies())
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+        # setup() has already run, so self.kwargs is available here.
+        key = self.page_cache_key(request)
+        cached = get_cache().get(key)
+        if cached is not None:
+            content, headers = cached
+            return HttpResponse(content, headers=headers)
+        with primary_reads_after_bump():
+            response = super().dispatch(request, *args, **kwargs)
+            if callable(getattr(response, "render", None)):
+                response.render()
+        entry = _cache_entry(response)
+        if entry is not None:
+            get_cache().set(key, entry, settings.BLOG_PAGE_CACHE_TIMEOUT)
+        return response
+
+
+def _cache_entry(response):
+    """
+    Return what to store in the page cache for a response, or None.
+    """
+    if response.status_code != 200 or response.cookies:
+        return None
+    headers = {
+        name: response[name] for name in CACHED_HEADERS if response.has_header(name)
+    }
+    return response.content, headers
+
+
+def shared_page(get_dependencies):
+    """
+    Decorator caching a function-based view whose output is the same for
+    every visitor, session or not; `get_dependencies(**kwargs)` returns its
+    version counters from the URL arguments.
+
+    An ETag is stored with the page, so repeated conditional requests are
+    answered with 304 by ConditionalGetMiddleware straight from the cache.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            if not settings.BLOG_PAGE_CACHE or request.method not in ("GET", "HEAD"):
+                return view_func(request, *args, **kwargs)
+            key = page_cache_key(request, get_dependencies(**kwargs))
+            cached = get_cache().get(key)
+            if cached is not None:
+                content, headers = cached
+                return HttpResponse(content, headers=headers)
+            response = set_response_etag(view_func(request, *args, **kwargs))
+            entry = _cache_entry(response)
+            if entry is not None:
+                get_cache().set(key, entry, settings.BLOG_PAGE_CACHE_TIMEOUT)
+            return response
+
+        return wrapped_view
+
+    return decorator
+
+
+def cached_page(view_class):
+    """
+    Async view decorator: serve the view from the page cache exactly as the
+    CachedPageMixin view `view_class` would, using its dependencies.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapped_view(request, *args, **kwargs):
+            view = view_class()
+            view.setup(request, *args, **kwargs)
+            if not view.cacheable(request):
+                return await view_func(request, *args, **kwargs)
+            key = await sync_to_async(view.page_cache_key)(request)
+            cached = await get_cache().aget(key)
+            if cached is not None:
+                content, headers = cached
+                return HttpResponse(content, headers=headers)
+            with await sync_to_async(primary_reads_after_bump)():
+                response = await view_func(request, *args, **kwargs)
+            entry = _cache_entry(response)
+            if entry is not None:
+                await get_cache().aset(key, entry, settings.BLOG_PAGE_CACHE_TIMEOUT)
+            return response
+
+        return wrapped_view
+
+    return decorator
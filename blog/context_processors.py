@@ -0,0 +1,14 @@
+from django.conf import settings
+
+
+def page_shell(request):
+    """
+    Tell templates whether per-user fragments are rendered inline or deferred,
+    and whether comments are pushed live.
+    """
+    return {
+        "anonymous_shell": settings.BLOG_ANONYMOUS_SHELL,
+        "esi_fragments": settings.BLOG_ESI_FRAGMENTS,
+        "live_comments": settings.BLOG_LIVE_COMMENTS,
+        "comments_newest_first": settings.BLOG_COMMENTS_NEWEST_FIRST,
+    }
@@ -0,0 +1,76 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+# Named pragma profiles, selected with SQLITE_PRAGMA_PROFILE and refined key
+# by key with SQLITE_PRAGMAS.
+PRAGMA_PROFILES = {
+    # SQLite defaults: rollback journal, readers and writers block each other.
+    "off": {},
+    # WAL lets readers proceed while a comment is being written; NORMAL sync
+    # is durable across application crashes (not power loss) in WAL mode.
+    "production": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64000,
+        "temp_store": "memory",
+    },
+    # Same, but fsync on every commit.
+    "durable": {
+        "journal_mode": "wal",
+        "synchronous": "full",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64000,
+        "temp_store": "memory",
+    },
+}
+
+ALLOWED_PRAGMAS = {
+    "journal_mode",
+    "synchronous",
+    "busy_timeout",
+    "mmap_size",
+    "cache_size",
+    "temp_store",
+    "wal_autocheckpoint",
+    "foreign_keys",
+}
+
+_VALUE_RE = re.compile(r"^-?\w+$")
+
+
+def get_pragmas():
+    """
+    Return the pragmas to apply to every new SQLite connection, in order.
+    """
+    profile = settings.SQLITE_PRAGMA_PROFILE
+    if profile not in PRAGMA_PROFILES:
+        raise ImproperlyConfigured(
+            f"Unknown SQLITE_PRAGMA_PROFILE {profile!r}, "
+            f"expected one of {', '.join(PRAGMA_PROFILES)}."
+        )
+    pragmas = dict(PRAGMA_PROFILES[profile])
+    pragmas.update(settings.SQLITE_PRAGMAS)
+    for name, value in pragmas.items():
+        # Pragmas can't be parameterized, so only plain words and numbers
+        # are let through.
+        if name not in ALLOWED_PRAGMAS or not _VALUE_RE.match(str(value)):
+            raise ImproperlyConfigured(f"Invalid SQLite pragma {name}={value!r}.")
+    return pragmas
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """
+    connection_created receiver applying the configured pragma profile.
+    """
+    if connection.vendor != "sqlite":
+        return
+    # Straight on the sqlite3 connection: connection setup isn't a query of
+    # whichever view happens to open the connection (see blog.querybudget).
+    for name, value in get_pragmas().items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
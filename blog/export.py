@@ -0,0 +1,232 @@
+import csv
+import datetime
+import json
+import zlib
+from itertools import groupby
+from operator import attrgetter
+
+from asgiref.sync import sync_to_async
+from django.utils.dateparse import parse_date
+
+from .models import Blog, BlogComment
+
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+CSV_HEADER = [
+    "blog_id",
+    "blog_name",
+    "blog_post_date",
+    "blog_description",
+    "author_id",
+    "author_username",
+    "author_bio",
+    "comment_id",
+    "comment_author",
+    "comment_post_date",
+    "comment_description",
+]
+
+
+class Echo:
+    """
+    File-like object whose write() returns the value, for csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _json_default(value):
+    # Full precision, unlike DjangoJSONEncoder which truncates microseconds.
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def parse_date_range(since, until):
+    """
+    Parse the optional YYYY-MM-DD bounds of an export; raise ValueError if
+    they are invalid.
+    """
+    bounds = []
+    for name, value in (("since", since), ("until", until)):
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            bounds.append(parse_date(value))
+        except ValueError:
+            bounds.append(None)
+        if bounds[-1] is None:
+            raise ValueError(f"{name} must be a YYYY-MM-DD date, not {value!r}.")
+    if None not in bounds and bounds[0] > bounds[1]:
+        raise ValueError("since is after until.")
+    return bounds
+
+
+def export_querysets(since=None, until=None, using=None):
+    """
+    Return the blogs to export, by id, with authors joined in, and their
+    comments, by blog id then posting order, with authors joined in.
+    """
+    blogs = Blog.objects.select_related("author__user").order_by("pk")
+    comments = BlogComment.objects.select_related("author").order_by(
+        "blog_id", "post_date", "pk"
+    )
+    if since is not None:
+        blogs = blogs.filter(post_date__gte=since)
+        comments = comments.filter(blog__post_date__gte=since)
+    if until is not None:
+        blogs = blogs.filter(post_date__lte=until)
+        comments = comments.filter(blog__post_date__lte=until)
+    if using is not None:
+        blogs = blogs.using(using)
+        comments = comments.using(using)
+    return blogs, comments
+
+
+def with_comments(blogs, comments):
+    """
+    Yield (blog, comments) pairs, merging two iterables both ordered by blog
+    id, so that only one blog's comments are in memory at a time.
+    """
+    groups = groupby(comments, key=attrgetter("blog_id"))
+    group = next(groups, None)
+    for blog in blogs:
+        # Skip the comments of blogs created after the blogs were read.
+        while group is not None and group[0] < blog.pk:
+            group = next(groups, None)
+        if group is not None and group[0] == blog.pk:
+            yield blog, list(group[1])
+            group = next(groups, None)
+        else:
+            yield blog, []
+
+
+def _username(user):
+    return user.username if user is not None else None
+
+
+def _author(blog):
+    if blog.author is None:
+        return None
+    return {
+        "id": blog.author.pk,
+        "username": _username(blog.author.user),
+        "bio": blog.author.bio,
+    }
+
+
+def ndjson_lines(blogs):
+    for blog, comments in blogs:
+        record = {
+            "id": blog.pk,
+            "name": blog.name,
+            "post_date": blog.post_date,
+            "description": blog.description,
+            "author": _author(blog),
+            "comments": [
+                {
+                    "id": comment.pk,
+                    "author": _username(comment.author),
+                    "post_date": comment.post_date,
+                    "description": comment.description,
+                }
+                for comment in comments
+            ],
+        }
+        yield json.dumps(record, default=_json_default) + "\n"
+
+
+def csv_lines(blogs):
+    """
+    One row per comment, with its blog and the blog's author repeated; blogs
+    without comments get a single row with empty comment columns.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for blog, comments in blogs:
+        author = _author(blog) or {}
+        columns = [
+            blog.pk,
+            blog.name,
+            blog.post_date.isoformat(),
+            blog.description,
+            author.get("id"),
+            author.get("username"),
+            author.get("bio"),
+        ]
+        for comment in comments:
+            yield writer.writerow(
+                columns
+                + [
+                    comment.pk,
+                    _username(comment.author),
+                    comment.post_date.isoformat(),
+                    comment.description,
+                ]
+            )
+        if not comments:
+            yield writer.writerow(columns + [None] * 4)
+
+
+def export_lines(fmt, since=None, until=None, using=None, chunk_size=1000):
+    """
+    Yield the export as text lines, reading blogs and comments `chunk_size`
+    rows at a time, so memory use doesn't grow with the corpus or with the
+    comments of the hottest blogs beyond one blog's.
+    """
+    blogs, comments = export_querysets(since, until, using)
+    blogs = with_comments(
+        blogs.iterator(chunk_size=chunk_size), comments.iterator(chunk_size=chunk_size)
+    )
+    if fmt == "csv":
+        return csv_lines(blogs)
+    return ndjson_lines(blogs)
+
+
+def encode(lines, compress=False, buffer_size=64 * 1024):
+    """
+    Encode lines to UTF-8 in blocks of about `buffer_size` bytes, gzipping
+    them on the fly if asked to.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    block = []
+    size = 0
+    for line in lines:
+        data = line.encode()
+        block.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            data = b"".join(block)
+            block, size = [], 0
+            yield compressor.compress(data) if compressor else data
+    data = b"".join(block)
+    if compressor:
+        yield compressor.compress(data) + compressor.flush()
+    elif data:
+        yield data
+
+
+async def aiterate(chunks):
+    """
+    Yield the chunks of the sync iterator `chunks` from the event loop, each
+    computed in the request's thread-sensitive worker thread, where its
+    queries run.
+
+    Under ASGI Django reads a sync StreamingHttpResponse to the end before
+    sending anything.
+    """
+    chunks = iter(chunks)
+    done = object()
+    try:
+        while (chunk := await sync_to_async(next)(chunks, done)) is not done:
+            yield chunk
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            await sync_to_async(close)()
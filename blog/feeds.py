@@ -0,0 +1,106 @@
+import datetime
+
+from django.contrib.syndication.views import Feed
+from django.db.models.functions import Substr
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from .cache import LIST_KEY, author_key, shared_page
+from .models import Blog, BlogAuthor
+from .querybudget import query_budget
+
+
+FEED_ITEMS = 20
+EXCERPT_LENGTH = 300
+
+
+def feed_items(queryset):
+    """
+    Return the newest blogs of `queryset` with their blogger's username
+    joined in, loading only the start of each description.
+    """
+    return (
+        queryset.select_related("author__user")
+        .only("name", "post_date", "author", "author__user__username")
+        # One more character than shown, so the excerpt knows it was cut.
+        .annotate(excerpt=Substr("description", 1, EXCERPT_LENGTH + 1))
+        .order_by("-post_date", "-id")[:FEED_ITEMS]
+    )
+
+
+class LatestBlogsFeed(Feed):
+    """
+    RSS feed of the newest blogs.
+    """
+
+    title = "Blogs"
+    description = "The newest blog posts."
+
+    def link(self):
+        return reverse("blogs")
+
+    def items(self):
+        return feed_items(Blog.objects.all())
+
+    def item_title(self, item):
+        return item.name
+
+    def item_description(self, item):
+        return Truncator(item.excerpt).chars(EXCERPT_LENGTH)
+
+    def item_author_name(self, item):
+        if item.author is None or item.author.user is None:
+            return None
+        return item.author.user.username
+
+    def item_pubdate(self, item):
+        # Blogs are dated, not timed: publish them at midnight.
+        return timezone.make_aware(
+            datetime.datetime.combine(item.post_date, datetime.time.min)
+        )
+
+
+class LatestBlogsAtomFeed(LatestBlogsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestBlogsFeed.description
+
+
+class BlogsByAuthorFeed(LatestBlogsFeed):
+    """
+    RSS feed of the newest blogs of one blogger, mirroring blogs-by-author.
+    """
+
+    def get_object(self, request, pk):
+        return get_object_or_404(BlogAuthor.objects.select_related("user"), pk=pk)
+
+    def title(self, obj):
+        return f"Blogs by {obj}"
+
+    def description(self, obj):
+        return f"The newest blog posts by {obj}."
+
+    def link(self, obj):
+        return obj.get_absolute_url()
+
+    def items(self, obj):
+        return feed_items(Blog.objects.filter(author=obj))
+
+
+class BlogsByAuthorAtomFeed(BlogsByAuthorFeed):
+    feed_type = Atom1Feed
+    subtitle = BlogsByAuthorFeed.description
+
+
+# Feeds are the same for every reader, so they are cached regardless of the
+# session; aggregators polling with If-None-Match then get a 304 without SQL.
+blogs_feed = shared_page(lambda: [LIST_KEY])(query_budget(1)(LatestBlogsFeed()))
+blogs_atom = shared_page(lambda: [LIST_KEY])(query_budget(1)(LatestBlogsAtomFeed()))
+blogs_by_author_feed = shared_page(lambda pk: [author_key(pk)])(
+    query_budget(2)(BlogsByAuthorFeed())
+)
+blogs_by_author_atom = shared_page(lambda pk: [author_key(pk)])(
+    query_budget(2)(BlogsByAuthorAtomFeed())
+)
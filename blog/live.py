@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import Context
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.template.loader import render_to_string
+
+from .models import BlogComment
+
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(comment_id, html):
+    """
+    Return a server-sent event carrying one rendered comment.
+    """
+    data = "".join(f"data: {line}\n" for line in html.splitlines())
+    return f"id: {comment_id}\nevent: comment\n{data}\n"
+
+
+def fetch_events(blog_ids, after_id):
+    """
+    Return (blog id, comment id, event) for the comments of `blog_ids` posted
+    after `after_id`, in order, with one query whatever the number of blogs.
+    Each comment is rendered once, however many clients receive it.
+    """
+    comments = (
+        BlogComment.objects.filter(blog_id__in=blog_ids, pk__gt=after_id)
+        .select_related("author")
+        .order_by("pk")
+    )
+    return [
+        (
+            comment.blog_id,
+            comment.pk,
+            format_event(
+                comment.pk,
+                render_to_string("blog/fragments/comment.html", {"comment": comment}),
+            ),
+        )
+        for comment in comments
+    ]
+
+
+def last_comment_id():
+    return BlogComment.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+
+
+class Subscription:
+    """
+    Queue of events for one connected client.
+
+    A client that falls BLOG_LIVE_QUEUE_SIZE events behind is dropped rather
+    than buffered without bound; its EventSource reconnects and catches up
+    from Last-Event-ID.
+    """
+
+    def __init__(self, blog_id):
+        self.blog_id = blog_id
+        self.queue = asyncio.Queue(settings.BLOG_LIVE_QUEUE_SIZE)
+        self.dropped = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped = True
+
+
+class CommentPublisher:
+    """
+    Per-process fan-out of new comments to live subscribers.
+
+    A single task polls for comments on every watched blog at once, every
+    BLOG_LIVE_POLL_INTERVAL seconds or as soon as a comment is saved in this
+    process, and renders each comment once for all of its watchers. The
+    cost of a poll therefore doesn't depend on the number of connections.
+    Queries run in one dedicated thread, which keeps its connection open.
+    """
+
+    def __init__(self):
+        self.subscribers = {}
+        self.loop = None
+        self.task = None
+        self.wakeup = None
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="blog-live")
+
+    async def run_sync(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, func, *args
+        )
+
+    async def subscribe(self, blog_id):
+        subscription = Subscription(blog_id)
+        self.subscribers.setdefault(blog_id, set()).add(subscription)
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.loop is not loop:
+            self.loop = loop
+            self.wakeup = asyncio.Event()
+            # A fresh context keeps the task out of the request that started it.
+            self.task = loop.create_task(self.poll(), context=Context())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        watchers = self.subscribers.get(subscription.blog_id, set())
+        watchers.discard(subscription)
+        if not watchers:
+            self.subscribers.pop(subscription.blog_id, None)
+
+    def notify(self):
+        """
+        Wake the poller now; safe to call from any thread.
+        """
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def poll(self):
+        last_id = await self.run_sync(last_comment_id)
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(
+                    self.wakeup.wait(), settings.BLOG_LIVE_POLL_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            blog_ids = list(self.subscribers)
+            if not blog_ids:
+                break
+            try:
+                events = await self.run_sync(fetch_events, blog_ids, last_id)
+            except DatabaseError:
+                logger.exception("Polling for live comments failed.")
+                await self.run_sync(connection.close)
+                continue
+            for blog_id, comment_id, event in events:
+                last_id = comment_id
+                for subscription in self.subscribers.get(blog_id, ()):
+                    subscription.put((comment_id, event))
+
+
+publisher = CommentPublisher()
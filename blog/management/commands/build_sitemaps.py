@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.sitemaps import build_sitemaps
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the sitemap shards touched since the last run, and the sitemap "
+        "index, into BLOG_SITEMAP_ROOT; once or every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Render every shard, not only the stale ones.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep building, waiting this many seconds between rounds.",
+        )
+
+    def handle(self, *args, **options):
+        rebuild = options["all"]
+        while True:
+            start = time.monotonic()
+            count = build_sitemaps(rebuild)
+            rebuild = False
+            # Quiet rounds aren't worth a line when looping.
+            if count or options["interval"] is None:
+                self.stdout.write(
+                    f"Rendered {count} sitemap shards in "
+                    f"{time.monotonic() - start:.2f}s."
+                )
+            if options["interval"] is None:
+                break
+            time.sleep(options["interval"])
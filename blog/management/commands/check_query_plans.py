@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from blog.queryplans import explain, plan_problems, view_querysets
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN QUERY PLAN on the queries issued by the blog views and fail "
+        "if any of them does a full table scan or a temp b-tree sort."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("EXPLAIN QUERY PLAN checks require SQLite.")
+        failures = []
+        for label, queryset, seek in view_querysets():
+            problems = plan_problems(queryset, seek=seek)
+            if options["verbosity"] > 1:
+                self.stdout.write(label)
+                for detail in explain(queryset):
+                    self.stdout.write(f"    {detail}")
+            if problems:
+                failures.append(f"{label}: {'; '.join(problems)}")
+        if failures:
+            raise CommandError("Degraded query plans:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("All view query plans use indexes."))
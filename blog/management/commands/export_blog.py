@@ -0,0 +1,75 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.export import FORMATS, encode, export_lines, parse_date_range
+
+
+class Command(BaseCommand):
+    help = (
+        "Export every blog with its blogger and comments as NDJSON or CSV, in "
+        "constant memory, optionally gzipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="File to write (default: - for stdout).",
+        )
+        parser.add_argument(
+            "--format",
+            choices=list(FORMATS),
+            help="Output format (default: from the file extension, else ndjson).",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Gzip the output (implied by an output path ending in .gz).",
+        )
+        parser.add_argument("--since", help="Only blogs posted on or after this date.")
+        parser.add_argument("--until", help="Only blogs posted on or before this date.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of blogs loaded per query (default: 1000).",
+        )
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="Database to read from (default: default).",
+        )
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        fmt = options["format"] or ("csv" if ".csv" in path else "ndjson")
+        compress = options["gzip"] or path.endswith(".gz")
+        try:
+            since, until = parse_date_range(options["since"], options["until"])
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        start = time.monotonic()
+        lines = export_lines(
+            fmt, since, until, options["database"], options["chunk_size"]
+        )
+        size = 0
+        output = sys.stdout.buffer if path == "-" else open(path, "wb")
+        try:
+            for block in encode(lines, compress):
+                output.write(block)
+                size += len(block)
+        finally:
+            if path == "-":
+                output.flush()
+            else:
+                output.close()
+        if path != "-":
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Exported {size} bytes to {path} in "
+                    f"{time.monotonic() - start:.1f}s."
+                )
+            )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from blog.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Print a token profiling the requests passing it as ?profile=, for "
+        "BLOG_PROFILE_TOKEN_MAX_AGE seconds."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token())
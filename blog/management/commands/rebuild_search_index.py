@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from blog.search import FTS_TABLE, install_triggers
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-create the sync triggers and rebuild the FTS5 blog search index "
+        "from the blog_blog table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--optimize",
+            action="store_true",
+            help="Merge the index b-trees after rebuilding for faster queries.",
+        )
+
+    def handle(self, *args, **options):
+        if not install_triggers(connection):
+            raise CommandError(
+                "The blog search index requires SQLite FTS5 and migration 0007."
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            if options["optimize"]:
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"
+                )
+        self.stdout.write(self.style.SUCCESS("Rebuilt the blog search index."))
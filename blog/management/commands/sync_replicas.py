@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def sync_database(source, target):
+    """
+    Copy a SQLite database into another one with the online backup API.
+
+    Readers of the target wait on its lock (busy_timeout) while the pages are
+    copied, then see the new snapshot in full; they never see a partial copy.
+    """
+    source.backup(target)
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into every BLOG_READ_REPLICAS "
+        "database, once or every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep syncing, waiting this many seconds between rounds.",
+        )
+
+    def handle(self, *args, **options):
+        replicas = settings.BLOG_READ_REPLICAS
+        if not replicas:
+            raise CommandError("No read replicas are configured.")
+        for alias in ["default"] + replicas:
+            if connections[alias].vendor != "sqlite":
+                raise CommandError(f"Database {alias!r} is not a SQLite database.")
+        while True:
+            start = time.monotonic()
+            primary = connections["default"]
+            primary.ensure_connection()
+            for alias in replicas:
+                replica = connections[alias]
+                replica.ensure_connection()
+                sync_database(primary.connection, replica.connection)
+                # Let each round start from fresh connections.
+                replica.close()
+            primary.close()
+            self.stdout.write(
+                f"Synced {len(replicas)} replicas in {time.monotonic() - start:.2f}s."
+            )
+            if options["interval"] is None:
+                break
+            time.sleep(options["interval"])
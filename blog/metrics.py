@@ -0,0 +1,258 @@
+import os
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+from django.views.decorators.cache import never_cache
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from .querybudget import query_budget
+
+
+# prometheus_client switches to its multiprocess mode, where every worker
+# writes its samples to memory-mapped files in this directory, when the
+# variable is set before it is imported. The endpoint then adds up the files
+# of all the workers.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+LOCAL_ADDRESSES = {"127.0.0.1", "::1"}
+UNRESOLVED = "unresolved"
+
+REQUESTS = Counter(
+    "blog_requests",
+    "Requests handled, by URL name, method and status code.",
+    ["view", "method", "status"],
+)
+LATENCY = Histogram(
+    "blog_request_duration_seconds",
+    "Time spent producing the response, by URL name.",
+    ["view"],
+)
+QUERIES = Histogram(
+    "blog_request_queries",
+    "SQL queries run per request, by URL name.",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, float("inf")),
+)
+QUERY_TIME = Histogram(
+    "blog_request_query_duration_seconds",
+    "Time spent in SQL queries per request, by URL name.",
+    ["view"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, float("inf")),
+)
+TEMPLATE_TIME = Histogram(
+    "blog_request_template_duration_seconds",
+    "Time spent rendering templates per request, by URL name.",
+    ["view"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, float("inf")),
+)
+RESPONSE_SIZE = Histogram(
+    "blog_response_size_bytes",
+    "Size of the response body, by URL name; streaming responses excluded.",
+    ["view"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, float("inf")),
+)
+
+# The measurements of the request being handled, if it is being measured.
+current = ContextVar("blog_request_metrics", default=None)
+
+
+class RequestMetrics:
+    """
+    What one request spent, in seconds, and the SQL queries it ran.
+
+    An execute wrapper: install it on the connections used by the request.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.template_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - start
+
+
+class Template(django_backend.Template):
+    """
+    Django template charging its render time to the current request.
+    """
+
+    def render(self, context=None, request=None):
+        metrics = current.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    The Django template backend, timing the templates it renders.
+
+    Only the templates loaded through the backend (render(), TemplateResponse,
+    render_to_string()) are timed; those they include are part of their time.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return UNRESOLVED
+    return match.view_name
+
+
+def server_timing(metrics, total):
+    """
+    Return a Server-Timing header value, durations in milliseconds, for the
+    browser's developer tools.
+    """
+    return (
+        f'db;dur={metrics.query_seconds * 1000:.1f};desc="{metrics.queries} queries", '
+        f"tpl;dur={metrics.template_seconds * 1000:.1f}, "
+        f"total;dur={total * 1000:.1f}"
+    )
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, SQL queries, template render time and response size
+    of every request by URL name, when BLOG_METRICS is set, and report them in
+    a Server-Timing header. prometheus_metrics exposes them to Prometheus.
+
+    Streaming responses are measured up to their first byte.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.BLOG_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with measure_queries(metrics):
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.record(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = time.perf_counter()
+        try:
+            # The async ORM runs queries in the request's thread-sensitive
+            # worker thread, which has its own connections: measure those.
+            stack = await sync_to_async(measure_queries)(metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            current.reset(token)
+        return self.record(request, response, metrics, time.perf_counter() - start)
+
+    def record(self, request, response, metrics, total):
+        name = view_name(request)
+        REQUESTS.labels(name, request.method, str(response.status_code)).inc()
+        LATENCY.labels(name).observe(total)
+        QUERIES.labels(name).observe(metrics.queries)
+        QUERY_TIME.labels(name).observe(metrics.query_seconds)
+        TEMPLATE_TIME.labels(name).observe(metrics.template_seconds)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(name).observe(len(response.content))
+        response["Server-Timing"] = server_timing(metrics, total)
+        return response
+
+
+def measure_queries(wrapper):
+    """
+    Install the execute wrapper `wrapper` on the current thread's connections
+    until the returned ExitStack is closed.
+    """
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
+
+
+def can_read_metrics(request):
+    # Behind a reverse proxy on the same host every client looks local: have
+    # the proxy deny /blog/metrics to the outside.
+    if request.META.get("REMOTE_ADDR") in LOCAL_ADDRESSES:
+        return True
+    user = getattr(request, "user", None)
+    return user is not None and user.is_active and user.is_staff
+
+
+def metrics_readers_only(view_func):
+    """
+    Decorator answering 404 to the clients can_read_metrics() refuses. Put it
+    outside query_budget: the session and user lookups aren't the view's.
+    """
+
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        if not can_read_metrics(request):
+            raise Http404
+        return view_func(request, *args, **kwargs)
+
+    return wrapped_view
+
+
+@never_cache
+@metrics_readers_only
+@query_budget(0)
+def prometheus_metrics(request):
+    """
+    The metrics of all the workers in the Prometheus text format, for staff
+    and local clients; others get a 404.
+    """
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,47 @@
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Blog = apps.get_model("blog", "Blog")
+    BlogAuthor = apps.get_model("blog", "BlogAuthor")
+    BlogComment = apps.get_model("blog", "BlogComment")
+    comments = BlogComment.objects.filter(blog=OuterRef("pk")).order_by().values("blog")
+    Blog.objects.update(
+        comment_count=Coalesce(
+            Subquery(comments.annotate(n=Count("pk")).values("n")), 0
+        ),
+        last_comment_at=Subquery(
+            comments.annotate(last=Max("post_date")).values("last")
+        ),
+    )
+    posts = Blog.objects.filter(author=OuterRef("pk")).order_by().values("author")
+    BlogAuthor.objects.update(
+        post_count=Coalesce(Subquery(posts.annotate(n=Count("pk")).values("n")), 0)
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0004_alter_blogcomment_post_date"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="blog",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="blog",
+            name="last_comment_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="blogauthor",
+            name="post_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
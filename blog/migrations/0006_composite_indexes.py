@@ -0,0 +1,34 @@
+# Generated by Django 4.2.5 on 2026-10-18 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0005_blog_counters"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="blogauthor",
+            options={"ordering": ["user", "id"]},
+        ),
+        migrations.AddIndex(
+            model_name="blog",
+            index=models.Index(
+                fields=["-post_date", "-id"], name="blog_post_date_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="blog",
+            index=models.Index(
+                fields=["author", "-post_date", "-id"], name="blog_author_post_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="blogcomment",
+            index=models.Index(
+                fields=["blog", "post_date", "id"], name="comment_blog_post_date_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+
+# External-content FTS5 index over Blog.name and Blog.description. The
+# triggers keep it in sync for every write path, including QuerySet.update()
+# and bulk_create(), which bypass model signals.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE blog_blog_fts USING fts5(
+        name, description,
+        content='blog_blog', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER blog_blog_fts_insert AFTER INSERT ON blog_blog BEGIN
+        INSERT INTO blog_blog_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER blog_blog_fts_delete AFTER DELETE ON blog_blog BEGIN
+        INSERT INTO blog_blog_fts(blog_blog_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER blog_blog_fts_update AFTER UPDATE OF name, description
+    ON blog_blog BEGIN
+        INSERT INTO blog_blog_fts(blog_blog_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO blog_blog_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO blog_blog_fts(blog_blog_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS blog_blog_fts_update",
+    "DROP TRIGGER IF EXISTS blog_blog_fts_delete",
+    "DROP TRIGGER IF EXISTS blog_blog_fts_insert",
+    "DROP TABLE IF EXISTS blog_blog_fts",
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0006_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
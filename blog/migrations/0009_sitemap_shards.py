@@ -0,0 +1,35 @@
+# Generated by Django 4.2.5 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0008_modified_timestamps"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SitemapShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("section", models.CharField(max_length=20)),
+                ("number", models.PositiveIntegerField()),
+                ("stale", models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="sitemapshard",
+            constraint=models.UniqueConstraint(
+                fields=("section", "number"), name="sitemap_shard_unique"
+            ),
+        ),
+    ]
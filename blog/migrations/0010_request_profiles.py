@@ -0,0 +1,51 @@
+# Generated by Django 4.2.5 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0009_sitemap_shards"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.CharField(max_length=2000)),
+                ("url_name", models.CharField(blank=True, max_length=200)),
+                ("view", models.CharField(blank=True, max_length=200)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                (
+                    "duration",
+                    models.FloatField(help_text="Seconds, profiler overhead included."),
+                ),
+                (
+                    "trigger",
+                    models.CharField(
+                        choices=[
+                            ("staff", "Staff user"),
+                            ("token", "Signed token"),
+                            ("sample", "Random sample"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("stats", models.BinaryField()),
+            ],
+            options={
+                "ordering": ["-id"],
+            },
+        ),
+    ]
@@ -4,6 +4,31 @@ from datetime import date
 from django.urls import reverse  # Used to generate URLs by reversing the URL patterns
 from django.contrib.auth.models import User  # Blog author or commenter
 
+from .cache import GENERATION_KEY, bump
+
+
+class VersionedQuerySet(models.QuerySet):
+    """
+    QuerySet that invalidates the page cache on bulk writes, which don't send
+    the model signals blog.signals relies on.
+    """
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        bump(GENERATION_KEY, using=self.db)
+        return rows
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super().bulk_create(*args, **kwargs)
+        bump(GENERATION_KEY, using=self.db)
+        SitemapShard.mark_stale(self.model, [obj.pk for obj in objs], using=self.db)
+        return objs
+
+    def bulk_update(self, *args, **kwargs):
+        rows = super().bulk_update(*args, **kwargs)
+        bump(GENERATION_KEY, using=self.db)
+        return rows
+
 
 class BlogAuthor(models.Model):
     """
@@ -12,9 +37,17 @@ class BlogAuthor(models.Model):
 
     user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True)
     bio = models.TextField(max_length=400, help_text="Enter your bio details here.")
+    # Denormalized counter maintained by blog.signals, see recount_blog command.
+    post_count = models.PositiveIntegerField(default=0, editable=False)
+    # Also moved by blog.signals when the blogger's post list changes.
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = VersionedQuerySet.as_manager()
 
     class Meta:
-        ordering = ["user", "bio"]
+        # user is unique, so "id" only breaks ties between bloggers without a
+        # user and lets the user_id index serve the ordering on its own.
+        ordering = ["user", "id"]
 
     def get_absolute_url(self):
         """
@@ -26,6 +59,9 @@ class BlogAuthor(models.Model):
         """
         String for representing the Model object.
         """
+        if self.user is None:
+            # The user was deleted (SET_NULL).
+            return f"Blogger {self.pk}"
         return self.user.username
 
 
@@ -41,9 +77,25 @@ class Blog(models.Model):
         max_length=2000, help_text="Enter your blog text here."
     )
     post_date = models.DateField(default=date.today)
+    # Denormalized comment activity maintained by blog.signals, see recount_blog command.
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_comment_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Also moved by blog.signals when the blog's comments change.
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = VersionedQuerySet.as_manager()
 
     class Meta:
         ordering = ["-post_date"]
+        indexes = [
+            # BlogListView: newest posts first, id as keyset tie-breaker.
+            models.Index(fields=["-post_date", "-id"], name="blog_post_date_id_idx"),
+            # BlogListByAuthorView: one author's posts, newest first.
+            models.Index(
+                fields=["author", "-post_date", "-id"],
+                name="blog_author_post_date_idx",
+            ),
+        ]
 
     def get_absolute_url(self):
         """
@@ -69,10 +121,19 @@ class BlogComment(models.Model):
     author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     # Foreign Key used because BlogComment can only have one author/User, but users can have multiple comments
     post_date = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
     blog = models.ForeignKey(Blog, on_delete=models.CASCADE)
 
+    objects = VersionedQuerySet.as_manager()
+
     class Meta:
         ordering = ["post_date"]
+        indexes = [
+            # BlogDetailView: a blog's comments in posting order.
+            models.Index(
+                fields=["blog", "post_date", "id"], name="comment_blog_post_date_idx"
+            ),
+        ]
 
     def __str__(self):
         """
@@ -81,3 +142,75 @@ class BlogComment(models.Model):
         if len(self.description) > 75:
             return f"{self.description[:75]}..."
         return self.description
+
+
+class SitemapShard(models.Model):
+    """
+    Model tracking one pre-rendered sitemap file: the rows of a section whose
+    ids fall in one range of SIZE ids, and whether it must be rebuilt.
+    """
+
+    SIZE = 10000
+    # Sitemap sections, by model.
+    SECTIONS = {"blog": Blog, "blogger": BlogAuthor}
+
+    section = models.CharField(max_length=20)
+    number = models.PositiveIntegerField()
+    stale = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["section", "number"], name="sitemap_shard_unique"
+            ),
+        ]
+
+    @classmethod
+    def mark_stale(cls, model, pks, using=None):
+        """
+        Flag the shards holding the given rows of `model` for rebuilding, in
+        one statement, in the database `using` they were written to.
+        """
+        sections = [name for name, other in cls.SECTIONS.items() if other is model]
+        numbers = {pk // cls.SIZE for pk in pks if pk is not None}
+        if not sections or not numbers:
+            return
+        cls.objects.db_manager(using).bulk_create(
+            [cls(section=sections[0], number=number) for number in sorted(numbers)],
+            update_conflicts=True,
+            unique_fields=["section", "number"],
+            update_fields=["stale"],
+        )
+
+    def __str__(self):
+        return f"{self.section} {self.number}"
+
+
+class RequestProfile(models.Model):
+    """
+    Model holding the cProfile statistics of one profiled request, see
+    blog.profiling.
+    """
+
+    TRIGGERS = [
+        ("staff", "Staff user"),
+        ("token", "Signed token"),
+        ("sample", "Random sample"),
+    ]
+
+    created = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    url_name = models.CharField(max_length=200, blank=True)
+    view = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration = models.FloatField(help_text="Seconds, profiler overhead included.")
+    trigger = models.CharField(max_length=10, choices=TRIGGERS)
+    # marshal dump of the statistics, the format of cProfile's dump_stats().
+    stats = models.BinaryField()
+
+    class Meta:
+        ordering = ["-id"]
+
+    def __str__(self):
+        return f"{self.method} {self.path}"
@@ -0,0 +1,275 @@
+import datetime
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Max, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorEncoder(json.JSONEncoder):
+    """
+    JSON encoder keeping full microsecond precision for dates and datetimes
+    (DjangoJSONEncoder truncates to milliseconds, which breaks keyset equality).
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.date, datetime.datetime)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(payload):
+    """
+    Encode a JSON-serializable payload as an opaque url-safe cursor.
+    """
+    data = json.dumps(payload, cls=CursorEncoder).encode()
+    return urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor, raising InvalidCursor on garbage.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError, Base64Error):
+        raise InvalidCursor(cursor)
+
+
+class CursorPage:
+    """
+    A single page of a keyset-paginated queryset.
+    """
+
+    cursor_based = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset paginator that walks a queryset by the values of its ordering fields.
+
+    Every page is a single indexed range query of `per_page + 1` rows, so the
+    cost of a page does not depend on how far into the list it is. Cursors are
+    opaque url-safe strings encoding the direction and the key of the edge row.
+
+    `ordering` must be unique across rows, e.g. ("-post_date", "-id").
+    `count_mode` is "exact", "estimate" or None to skip counting entirely.
+    `row_key` returns the ordering values of a row, for querysets that don't
+    return model instances (values() or values_list()).
+    """
+
+    def __init__(self, queryset, per_page, ordering, count_mode=None, row_key=None):
+        self.queryset = queryset
+        self.row_key = row_key
+        self.per_page = int(per_page)
+        self.ordering = [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+        self.count_mode = count_mode
+        self.fields = [
+            queryset.model._meta.get_field(name) for name, _ in self.ordering
+        ]
+
+    def _order_by(self, reverse):
+        return [
+            f"{'-' if descending != reverse else ''}{name}"
+            for name, descending in self.ordering
+        ]
+
+    def _keyset_filter(self, values, reverse):
+        """
+        Build the row-value comparison `(a, b) < (x, y)` as nested Q objects.
+
+        The redundant `a <= x` bound in front lets SQLite seek straight to the
+        cursor position in the index instead of walking it from the start.
+        """
+        condition = Q()
+        for i, (name, descending) in enumerate(self.ordering):
+            lookup = "lt" if descending != reverse else "gt"
+            clause = Q(**{f"{name}__{lookup}": values[i]})
+            for j, (prev_name, _) in enumerate(self.ordering[:i]):
+                clause &= Q(**{prev_name: values[j]})
+            condition |= clause
+        name, descending = self.ordering[0]
+        bound = "lte" if descending != reverse else "gte"
+        return Q(**{f"{name}__{bound}": values[0]}) & condition
+
+    def encode_cursor(self, obj, reverse):
+        if self.row_key is not None:
+            values = list(self.row_key(obj))
+        else:
+            values = [getattr(obj, field.attname) for field in self.fields]
+        return encode_cursor(["p" if reverse else "n", values])
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, values = decode_cursor(cursor)
+            if direction not in ("n", "p") or len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            values = [
+                field.to_python(value) for field, value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidCursor(cursor)
+        return direction == "p", values
+
+    def page_queryset(self, values=None, reverse=False):
+        """
+        Return the sliced queryset fetching one page (plus one look-ahead row)
+        after the key `values`, or the first page when no key is given.
+        """
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, reverse))
+        return queryset.order_by(*self._order_by(reverse))[: self.per_page + 1]
+
+    def page(self, cursor=None):
+        """
+        Return the page that follows (or precedes) the given cursor.
+        """
+        reverse, values = False, None
+        if cursor:
+            reverse, values = self.decode_cursor(cursor)
+        rows = list(self.page_queryset(values, reverse))
+        return self._make_page(rows, cursor, reverse)
+
+    async def apage(self, cursor=None):
+        """
+        Async version of page(), which also loads the count up front so that
+        templates can read it without querying.
+        """
+        reverse, values = False, None
+        if cursor:
+            reverse, values = self.decode_cursor(cursor)
+        rows = [obj async for obj in self.page_queryset(values, reverse)]
+        await self.acount()
+        return self._make_page(rows, cursor, reverse)
+
+    def _make_page(self, rows, cursor, reverse):
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                next_cursor = self.encode_cursor(rows[-1], reverse=False)
+            if (has_more and reverse) or (cursor and not reverse):
+                previous_cursor = self.encode_cursor(rows[0], reverse=True)
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    @cached_property
+    def count(self):
+        """
+        Total number of rows, according to `count_mode`.
+
+        The estimate is the highest primary key, which SQLite reads straight
+        from the end of the table b-tree; it is only used for unfiltered lists.
+        """
+        if self.count_mode == "exact":
+            return self.queryset.count()
+        if self.count_mode == "estimate" and not self.queryset.query.has_filters():
+            return self.queryset.aggregate(estimate=Max("pk"))["estimate"] or 0
+        return None
+
+    async def acount(self):
+        """
+        Async version of `count`, caching the result the same way.
+        """
+        if "count" not in self.__dict__:
+            count = None
+            if self.count_mode == "exact":
+                count = await self.queryset.acount()
+            elif (
+                self.count_mode == "estimate" and not self.queryset.query.has_filters()
+            ):
+                result = await self.queryset.aaggregate(estimate=Max("pk"))
+                count = result["estimate"] or 0
+            self.__dict__["count"] = count
+        return self.count
+
+
+class CursorPaginationMixin:
+    """
+    Opt-in keyset pagination for generic ListViews.
+
+    Enabled by the BLOG_CURSOR_PAGINATION setting; otherwise the view falls
+    back to Django's offset-based Paginator and `?page=N` URLs.
+    """
+
+    cursor_ordering = ("-id",)
+    cursor_count_mode = None
+
+    def use_cursor_pagination(self):
+        return getattr(settings, "BLOG_CURSOR_PAGINATION", False)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(
+            queryset, page_size, self.cursor_ordering, self.cursor_count_mode
+        )
+        try:
+            page = paginator.page(self.request.GET.get("cursor"))
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+async def apaginate_queryset(request, queryset, page_size, ordering, count_mode=None):
+    """
+    Async counterpart of CursorPaginationMixin.paginate_queryset() for async
+    views, with the offset fallback done the way MultipleObjectMixin does it.
+
+    Returns (paginator, page, object_list, is_paginated); the page's rows and
+    the paginator's count are loaded before returning.
+    """
+    if getattr(settings, "BLOG_CURSOR_PAGINATION", False):
+        paginator = CursorPaginator(queryset, page_size, ordering, count_mode)
+        try:
+            page = await paginator.apage(request.GET.get("cursor"))
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    paginator = Paginator(queryset, page_size)
+    paginator.count = await queryset.acount()
+    page_number = request.GET.get("page") or 1
+    try:
+        if page_number == "last":
+            page_number = paginator.num_pages
+        page = paginator.page(int(page_number))
+    except (ValueError, InvalidPage):
+        raise Http404("Invalid page.")
+    page.object_list = [obj async for obj in page.object_list]
+    return (paginator, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,172 @@
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+from .models import RequestProfile
+from .slowqueries import view_of
+
+
+TOKEN_SALT = "blog.profiling"
+TOKEN_VALUE = "profile"
+
+
+def make_token():
+    """
+    Return a token profiling the requests passing it as ?profile=, until it
+    is BLOG_PROFILE_TOKEN_MAX_AGE seconds old.
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(TOKEN_VALUE)
+
+
+def check_token(token):
+    try:
+        value = signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=settings.BLOG_PROFILE_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return value == TOKEN_VALUE
+
+
+class DumpedStats:
+    """
+    Stand-in profiler for pstats.Stats, holding statistics read back from a
+    dump.
+    """
+
+    def __init__(self, data):
+        self.stats = marshal.loads(bytes(data))
+
+    def create_stats(self):
+        pass
+
+
+def top_functions(data, sort="cumulative", limit=30):
+    """
+    Return the pstats report of the `limit` first functions of a dump by
+    `sort` order.
+    """
+    output = io.StringIO()
+    stats = pstats.Stats(DumpedStats(data), stream=output)
+    stats.sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def profile_trigger(request):
+    """
+    Return why `request` should be profiled, or None.
+    """
+    token = request.GET.get("profile")
+    if token is not None:
+        if check_token(token):
+            return "token"
+        user = getattr(request, "user", None)
+        if user is not None and user.is_active and user.is_staff:
+            return "staff"
+    rate = settings.BLOG_PROFILE_SAMPLE_RATE
+    if rate and random.randrange(rate) == 0:
+        return "sample"
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Run some requests under cProfile when BLOG_PROFILING is set, and store
+    their statistics as RequestProfile rows, listed in the admin.
+
+    A request is profiled when a staff user adds ?profile=1, when it carries
+    a token from the profile_token command as ?profile=, or at random, for
+    one request in BLOG_PROFILE_SAMPLE_RATE. Other requests only pay for
+    that decision. The BLOG_PROFILE_KEEP latest profiles are kept.
+
+    Only the request's thread is profiled: under WSGI, the iteration of
+    streaming responses is not. Under ASGI it is the event loop, with whatever
+    else it runs meanwhile, and not the worker threads sync code runs in; one
+    request is profiled at a time.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.BLOG_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.profiling = False
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trigger = profile_trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        response = profiler.runcall(self.get_response, request)
+        duration = time.perf_counter() - start
+        return self.save(request, response, trigger, duration, profiler)
+
+    async def __acall__(self, request):
+        if "profile" in request.GET:
+            # The staff check may load the user.
+            trigger = await sync_to_async(profile_trigger)(request)
+        else:
+            trigger = profile_trigger(request)
+        # A second profiler would replace the first on the event loop thread.
+        if trigger is None or self.profiling:
+            return await self.get_response(request)
+
+        profiler = cProfile.Profile()
+        self.profiling = True
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+            self.profiling = False
+        duration = time.perf_counter() - start
+        return await sync_to_async(self.save)(
+            request, response, trigger, duration, profiler
+        )
+
+    def save(self, request, response, trigger, duration, profiler):
+        """
+        Store the statistics of a profiled request, and add their id to its
+        response.
+        """
+        profiler.create_stats()
+        url_name, view = view_of(request)
+        profile = RequestProfile.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            url_name=url_name or "",
+            view=view or "",
+            status_code=response.status_code,
+            duration=duration,
+            trigger=trigger,
+            stats=marshal.dumps(profiler.stats),
+        )
+        self.prune()
+        response["X-Profile-Id"] = str(profile.pk)
+        return response
+
+    def prune(self):
+        oldest_kept = (
+            RequestProfile.objects.order_by("-id")
+            .values_list("id", flat=True)[max(settings.BLOG_PROFILE_KEEP, 1) - 1 :]
+            .first()
+        )
+        if oldest_kept is not None:
+            RequestProfile.objects.filter(id__lt=oldest_kept).delete()
@@ -0,0 +1,147 @@
+import logging
+from asyncio import iscoroutinefunction
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """
+    Execute wrapper that records every SQL statement run through a connection.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+
+def get_query_budget(view):
+    """
+    Return the budget declared on a view function or class-based view.
+    """
+    view = getattr(view, "view_class", view)
+    return getattr(view, "query_budget", None)
+
+
+def enforce_query_budget(name, budget, queries):
+    """
+    Raise or log when a view ran more queries than it declared.
+
+    Raises QueryBudgetExceeded when BLOG_QUERY_BUDGET_STRICT is set, otherwise
+    logs the offending statements at ERROR level.
+    """
+    if budget is None or len(queries) <= budget:
+        return
+    message = "%s ran %d queries, budget is %d:\n%s" % (
+        name,
+        len(queries),
+        budget,
+        "\n".join(queries),
+    )
+    if getattr(settings, "BLOG_QUERY_BUDGET_STRICT", False):
+        raise QueryBudgetExceeded(message)
+    logger.error(message)
+
+
+def _needs_user(request):
+    # Resolve the lazy request.user first: loading the session and user is
+    # middleware work and would otherwise be charged to whichever view or
+    # template happens to touch it first. Shared page shells never touch it,
+    # and resolving it would mark the session accessed (adding Vary: Cookie).
+    return hasattr(request, "user") and not settings.BLOG_ANONYMOUS_SHELL
+
+
+def _render_and_count(name, budget, request, get_response):
+    if _needs_user(request):
+        request.user.is_authenticated
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        response = get_response()
+        # Template responses render lazily after the view returns; render them
+        # here so the queries issued by templates count against the view.
+        if callable(getattr(response, "render", None)):
+            response.render()
+    enforce_query_budget(name, budget, counter.queries)
+    return response
+
+
+class QueryBudgetMixin:
+    """
+    Enforce `query_budget`, the maximum number of SQL queries the view and its
+    template may issue while handling one request.
+    """
+
+    query_budget = None
+
+    def dispatch(self, request, *args, **kwargs):
+        return _render_and_count(
+            self.__class__.__name__,
+            self.query_budget,
+            request,
+            lambda: super(QueryBudgetMixin, self).dispatch(request, *args, **kwargs),
+        )
+
+
+def query_budget(budget):
+    """
+    Decorator equivalent of QueryBudgetMixin for function-based views, sync or
+    async.
+    """
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            return _async_query_budget(view_func, budget)
+
+        # Also accepts callable instances, like syndication feeds.
+        name = getattr(view_func, "__name__", type(view_func).__name__)
+
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            return _render_and_count(
+                name,
+                budget,
+                request,
+                lambda: view_func(request, *args, **kwargs),
+            )
+
+        wrapped_view.query_budget = budget
+        return wrapped_view
+
+    return decorator
+
+
+def _async_query_budget(view_func, budget):
+    @wraps(view_func)
+    async def wrapped_view(request, *args, **kwargs):
+        if _needs_user(request):
+            # Async views render with a loaded user, so templates never query
+            # from the event loop.
+            await sync_to_async(lambda: request.user.is_authenticated)()
+        # The async ORM runs queries in the request's thread-sensitive worker
+        # thread, which has its own connection: install the counter there.
+        counter = QueryCounter()
+        await sync_to_async(lambda: connection.execute_wrappers.append(counter))()
+        try:
+            response = await view_func(request, *args, **kwargs)
+        finally:
+            await sync_to_async(lambda: connection.execute_wrappers.remove(counter))()
+        enforce_query_budget(view_func.__name__, budget, counter.queries)
+        return response
+
+    wrapped_view.query_budget = budget
+    return wrapped_view
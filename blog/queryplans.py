@@ -0,0 +1,120 @@
+import datetime
+
+from django.db import connections
+from django.utils import timezone
+
+from .models import Blog, BlogAuthor
+from .pagination import CursorPaginator
+from .views import (
+    BlogListByAuthorView,
+    BlogListView,
+    BloggerListView,
+    comment_paginator,
+)
+
+
+def explain(queryset):
+    """
+    Return the detail column of SQLite's EXPLAIN QUERY PLAN for a queryset.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(queryset, seek=False):
+    """
+    Return the plan steps that read a whole table or sort into a temp b-tree.
+
+    "SCAN t USING INDEX i" walks an index in order and stops at the LIMIT, so
+    only bare "SCAN t" steps, out of primary key order, count as full table
+    scans. With `seek`, the query
+    must also start with a range search (a keyset page past a cursor), since
+    walking the index from its start is as slow as a deep OFFSET.
+    """
+    plan = explain(queryset)
+    # Tables are b-trees keyed by their integer primary key, so a bare SCAN in
+    # primary key order also walks in order and stops at the LIMIT.
+    pk_order = [name.lstrip("-") for name in queryset.query.order_by] in (
+        ["id"],
+        ["pk"],
+    )
+    problems = []
+    for detail in plan:
+        full_scan = (
+            detail.startswith("SCAN ") and " USING " not in detail and not pk_order
+        )
+        if full_scan or "TEMP B-TREE" in detail:
+            problems.append(detail)
+    if seek and not (
+        plan[0].startswith("SEARCH ") and ("<" in plan[0] or ">" in plan[0])
+    ):
+        problems.append(f"no range seek: {plan[0]}")
+    return problems
+
+
+def _sample_values(paginator):
+    """
+    Return type-correct keyset values; the plan does not depend on them.
+    """
+    samples = {
+        "DateField": datetime.date(2000, 1, 1),
+        "DateTimeField": timezone.now(),
+    }
+    return [samples.get(field.get_internal_type(), 1) for field in paginator.fields]
+
+
+def _list_view_querysets(name, view_class, queryset):
+    paginator = CursorPaginator(
+        queryset, view_class.paginate_by, view_class.cursor_ordering
+    )
+    values = _sample_values(paginator)
+    return [
+        (
+            f"{name} (offset page)",
+            queryset[view_class.paginate_by : view_class.paginate_by * 2],
+            False,
+        ),
+        (f"{name} (first cursor page)", paginator.page_queryset(), False),
+        (f"{name} (next cursor page)", paginator.page_queryset(values), True),
+        (
+            f"{name} (previous cursor page)",
+            paginator.page_queryset(values, reverse=True),
+            True,
+        ),
+    ]
+
+
+def view_querysets():
+    """
+    Return (label, queryset, seek) triples matching the queries the blog views
+    issue; `seek` marks keyset pages that must start with an index range search.
+    """
+    querysets = []
+    querysets += _list_view_querysets(
+        "blogs", BlogListView, Blog.objects.select_related("author__user")
+    )
+    querysets += _list_view_querysets(
+        "bloggers", BloggerListView, BlogAuthor.objects.select_related("user")
+    )
+    querysets += _list_view_querysets(
+        "blogs-by-author", BlogListByAuthorView, Blog.objects.filter(author=1)
+    )
+    querysets.append(
+        (
+            "blog-detail",
+            Blog.objects.select_related("author__user").filter(pk=1),
+            False,
+        )
+    )
+    paginator = comment_paginator(1)
+    querysets += [
+        ("blog-comments (first page)", paginator.page_queryset(), False),
+        (
+            "blog-comments (next page)",
+            paginator.page_queryset(_sample_values(paginator)),
+            True,
+        ),
+    ]
+    return querysets
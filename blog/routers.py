@@ -0,0 +1,117 @@
+import random
+from asyncio import iscoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+
+# Set while a replica-reading view handles a request; None means the primary.
+_read_alias = ContextVar("blog_read_alias", default=None)
+
+# Set on a client right after it writes, so its next pages read from the
+# primary until the replicas have had time to catch up with that write.
+PRIMARY_COOKIE = "blog_primary"
+
+
+@contextmanager
+def read_from(alias):
+    """
+    Route blog reads made inside the block to the given database alias.
+    """
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def choose_replica(request):
+    """
+    Return a replica alias for the request, or None to read from the primary.
+    """
+    replicas = settings.BLOG_READ_REPLICAS
+    if not replicas or PRIMARY_COOKIE in request.COOKIES:
+        return None
+    return random.choice(replicas)
+
+
+def pin_to_primary(response):
+    """
+    Make the client read its own writes for BLOG_REPLICA_STICKY_SECONDS.
+    """
+    response.set_cookie(
+        PRIMARY_COOKIE,
+        "1",
+        max_age=settings.BLOG_REPLICA_STICKY_SECONDS,
+        httponly=True,
+        samesite="Lax",
+    )
+    return response
+
+
+class ReplicaRouter:
+    """
+    Send blog reads to a read replica inside ReplicaReadMixin views and
+    everything else, including every write, to the primary.
+
+    Sessions and users always come from the primary: a login must not
+    depend on replica lag.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == "blog":
+            return _read_alias.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so rows may be related across them.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema with the data, see sync_replicas.
+        if db in settings.BLOG_READ_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serve the view's blog queries from a read replica.
+
+    Must come before the other mixins so that their queries, and the
+    rendering of the template, happen inside the replica block.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with read_from(choose_replica(request)):
+            response = super().dispatch(request, *args, **kwargs)
+            if callable(getattr(response, "render", None)):
+                response.render()
+        return response
+
+
+def replica_reads(view_func):
+    """
+    Decorator equivalent of ReplicaReadMixin for function-based views, sync or
+    async.
+    """
+    if not iscoroutinefunction(view_func):
+
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            with read_from(choose_replica(request)):
+                return view_func(request, *args, **kwargs)
+
+        return wrapped_view
+
+    @wraps(view_func)
+    async def wrapped_view(request, *args, **kwargs):
+        with read_from(choose_replica(request)):
+            return await view_func(request, *args, **kwargs)
+
+    return wrapped_view
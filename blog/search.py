@@ -0,0 +1,133 @@
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Blog
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+FTS_TABLE = "blog_blog_fts"
+
+# Control characters used as highlight markers inside snippet(); the snippet
+# is HTML-escaped before they are swapped for <mark> tags.
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# SQLite drops a table's triggers whenever a migration rebuilds the table
+# (e.g. AddField), so they are re-created after every migrate run, see
+# blog.signals.install_search_triggers.
+TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON blog_blog BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON blog_blog BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name, description
+    ON blog_blog BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+SEARCH_SQL = f"""
+    SELECT rowid, rank, snippet({FTS_TABLE}, -1, %s, %s, '…', 24)
+    FROM {FTS_TABLE}
+    WHERE {FTS_TABLE} MATCH %s {{after}}
+    ORDER BY rank, rowid
+    LIMIT %s
+"""
+
+
+def install_triggers(connection):
+    """
+    Create the index sync triggers if the FTS5 table exists and they don't.
+
+    Returns True when the search index is present.
+    """
+    if connection.vendor != "sqlite":
+        return False
+    if FTS_TABLE not in connection.introspection.table_names():
+        return False
+    with connection.cursor() as cursor:
+        for statement in TRIGGERS_SQL:
+            cursor.execute(statement)
+    return True
+
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query: every word is quoted (so operators and
+    punctuation typed by users can't produce syntax errors) and all words must
+    match. The last word is matched as a prefix.
+    """
+    terms = [f'"{term}"' for term in _TERM_RE.findall(text)]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _highlight(snippet):
+    return mark_safe(
+        escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+    )
+
+
+class SearchResult:
+    def __init__(self, blog, rank, snippet):
+        self.blog = blog
+        self.rank = rank
+        self.snippet = snippet
+
+
+def search_blogs(text, limit, cursor=None):
+    """
+    Return (results, next_cursor) for the blogs matching `text`, best first.
+
+    Results are ranked by bm25 (FTS5's `rank` column) and paginated on
+    (rank, rowid); blogs and their authors are fetched in one extra query.
+    """
+    query = fts_query(text)
+    if not query:
+        return [], None
+    after, params = "", [_MARK_START, _MARK_END, query]
+    if cursor:
+        try:
+            rank, rowid = decode_cursor(cursor)
+            rank, rowid = float(rank), int(rowid)
+        except (ValueError, TypeError):
+            raise InvalidCursor(cursor)
+        after = "AND (rank > %s OR (rank = %s AND rowid > %s))"
+        params += [rank, rank, rowid]
+    params.append(limit + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(SEARCH_SQL.format(after=after), params)
+        rows = db_cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][1], rows[-1][0]])
+    blogs = Blog.objects.select_related("author__user").in_bulk(
+        [row[0] for row in rows]
+    )
+    results = [
+        SearchResult(blogs[rowid], rank, _highlight(snippet))
+        for rowid, rank, snippet in rows
+        if rowid in blogs
+    ]
+    return results, next_cursor
@@ -0,0 +1,212 @@
+from django.contrib.auth.models import User
+from django.db.models import F, Max, QuerySet
+from django.db.models.functions import Coalesce, Greatest
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import GENERATION_KEY, LIST_KEY, author_key, blog_key, bump
+from .live import publisher
+from .models import Blog, BlogAuthor, BlogComment, SitemapShard
+from .search import install_triggers
+
+
+# Counters are updated with single UPDATE ... SET n = n + 1 statements so that
+# concurrent comment posts never lose an increment. They go through
+# _base_manager, whose plain QuerySet.update() doesn't bump the page cache
+# generation the way VersionedQuerySet does: the signal handlers below
+# invalidate precisely instead.
+#
+# The same updates also move `modified` on the parent row, which therefore
+# tracks the last change to everything rendered on that row's page and serves
+# as a cheap Last-Modified validator (see blog.conditional).
+#
+# Decrements are clamped at 0: counters drift below the true count after
+# bulk_create() or import_blog --no-recount until recount_blog runs, and the
+# columns are CHECK (>= 0).
+
+
+def _add_post(author_id, delta):
+    if author_id is not None:
+        BlogAuthor._base_manager.filter(pk=author_id).update(
+            post_count=Greatest(F("post_count") + delta, 0), modified=timezone.now()
+        )
+
+
+def _add_comment(blog_id, post_date):
+    Blog._base_manager.filter(pk=blog_id).update(
+        comment_count=F("comment_count") + 1,
+        last_comment_at=Greatest(Coalesce("last_comment_at", post_date), post_date),
+        modified=timezone.now(),
+    )
+
+
+def _remove_comment(blog_id):
+    Blog._base_manager.filter(pk=blog_id).update(
+        comment_count=Greatest(F("comment_count") - 1, 0),
+        last_comment_at=BlogComment.objects.filter(blog=blog_id)
+        .order_by()
+        .values("blog")
+        .annotate(last=Max("post_date"))
+        .values("last"),
+        modified=timezone.now(),
+    )
+
+
+def _touch_blog(blog_id):
+    Blog._base_manager.filter(pk=blog_id).update(modified=timezone.now())
+
+
+def _deleted_with_blog(origin):
+    """
+    Whether a comment is deleted by the cascade from deleting its blog, the
+    only model whose deletion cascades to comments; `origin` is the instance
+    or queryset delete() was called on.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, Blog)
+
+
+def _remember_previous(sender, instance, field):
+    """
+    Store the current database value of a foreign key before an update.
+    """
+    previous = None
+    if instance.pk is not None:
+        previous = (
+            sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+        )
+    instance._previous_fk = previous
+
+
+@receiver(pre_save, sender=Blog)
+def remember_blog_author(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _remember_previous(sender, instance, "author_id")
+
+
+@receiver(post_save, sender=Blog)
+def count_blog_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        _add_post(instance.author_id, 1)
+    elif instance._previous_fk != instance.author_id:
+        _add_post(instance._previous_fk, -1)
+        _add_post(instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Blog)
+def uncount_blog_post(sender, instance, **kwargs):
+    _add_post(instance.author_id, -1)
+
+
+@receiver(pre_save, sender=BlogComment)
+def remember_comment_blog(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk is not None:
+        _remember_previous(sender, instance, "blog_id")
+    else:
+        instance._previous_fk = None
+
+
+@receiver(post_save, sender=BlogComment)
+def count_blog_comment(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        _add_comment(instance.blog_id, instance.post_date)
+    elif instance._previous_fk not in (None, instance.blog_id):
+        _remove_comment(instance._previous_fk)
+        _add_comment(instance.blog_id, instance.post_date)
+    else:
+        _touch_blog(instance.blog_id)
+
+
+@receiver(post_delete, sender=BlogComment)
+def uncount_blog_comment(sender, instance, origin=None, **kwargs):
+    # The blog row is deleted next: don't update it once per comment.
+    if not _deleted_with_blog(origin):
+        _remove_comment(instance.blog_id)
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def invalidate_blog_pages(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_fk", None)
+    bump(
+        LIST_KEY,
+        blog_key(instance.pk),
+        author_key(instance.author_id),
+        author_key(previous) if previous not in (None, instance.author_id) else None,
+    )
+
+
+@receiver(post_save, sender=BlogAuthor)
+@receiver(post_delete, sender=BlogAuthor)
+def invalidate_blogger_pages(sender, instance, **kwargs):
+    bump(LIST_KEY, author_key(instance.pk))
+
+
+@receiver(post_save, sender=BlogComment)
+@receiver(post_delete, sender=BlogComment)
+def invalidate_comment_pages(sender, instance, origin=None, **kwargs):
+    # invalidate_blog_pages bumps the same keys once for a deleted blog.
+    if _deleted_with_blog(origin):
+        return
+    previous = getattr(instance, "_previous_fk", None)
+    bump(
+        LIST_KEY,
+        blog_key(instance.blog_id),
+        blog_key(previous) if previous not in (None, instance.blog_id) else None,
+    )
+
+
+@receiver(post_save, sender=BlogComment)
+def publish_comment(sender, instance, created, raw=False, **kwargs):
+    # Live streams served by this process pick the comment up right away,
+    # the others on their next poll.
+    if created and not raw:
+        publisher.notify()
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_save, sender=BlogAuthor)
+@receiver(post_delete, sender=Blog)
+@receiver(post_delete, sender=BlogAuthor)
+def mark_sitemap_stale(sender, instance, created=True, **kwargs):
+    # Blogger entries only hold a URL, blog entries also the post_date, which
+    # any save may have changed.
+    if sender is BlogAuthor and not created:
+        return
+    SitemapShard.mark_stale(sender, [instance.pk])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_pages(sender, instance, update_fields=None, **kwargs):
+    # Usernames appear on every page; logins only touch last_login.
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    bump(GENERATION_KEY)
+
+
+@receiver(post_save, sender=User)
+def touch_blogger(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    # A blogger's name is their username, and blog pages show the username of
+    # each commenter: move the validators of the pages showing it.
+    if created or raw:
+        return
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    now = timezone.now()
+    BlogAuthor._base_manager.filter(user=instance).update(modified=now)
+    Blog._base_manager.filter(
+        pk__in=BlogComment.objects.filter(author=instance).values("blog")
+    ).update(modified=now)
+
+
+@receiver(post_migrate)
+def install_search_triggers(sender, app_config, using, **kwargs):
+    if app_config.label == "blog":
+        install_triggers(connections[using])
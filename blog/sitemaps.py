@@ -0,0 +1,128 @@
+import datetime
+import os
+
+from django.conf import settings
+from django.db.models import Max
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.html import escape
+
+from .models import SitemapShard
+
+
+INDEX_FILENAME = "sitemap.xml"
+
+
+def shard_filename(section, number):
+    return f"sitemap-{section}-{number}.xml"
+
+
+def absolute_url(path):
+    return settings.BLOG_SITE_URL.rstrip("/") + path
+
+
+def shard_urls(section, number):
+    """
+    Return the entries of one shard, in id order.
+    """
+    model = SitemapShard.SECTIONS[section]
+    low = number * SitemapShard.SIZE
+    rows = model.objects.filter(pk__gte=low, pk__lt=low + SitemapShard.SIZE)
+    if section == "blog":
+        return [
+            {
+                "location": absolute_url(blog.get_absolute_url()),
+                "lastmod": blog.post_date,
+            }
+            for blog in rows.only("post_date").order_by("pk")
+        ]
+    return [
+        {"location": absolute_url(blogger.get_absolute_url())}
+        for blogger in rows.only("pk").order_by("pk")
+    ]
+
+
+def render_urlset(urls):
+    """
+    Render a shard. Written out rather than with a template, which would
+    take as long as loading its up to SIZE rows.
+    """
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>\n']
+    lines.append('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    for url in urls:
+        lastmod = url.get("lastmod")
+        lines.append(
+            f"<url><loc>{escape(url['location'])}</loc>"
+            + (f"<lastmod>{lastmod.isoformat()}</lastmod>" if lastmod else "")
+            + "</url>\n"
+        )
+    lines.append("</urlset>\n")
+    return "".join(lines)
+
+
+def write_file(path, content):
+    """
+    Replace a file atomically, so it is never served half written.
+    """
+    with open(f"{path}.tmp", "w", encoding="utf-8") as output:
+        output.write(content)
+    os.replace(f"{path}.tmp", path)
+
+
+def write_index(root):
+    """
+    Write the sitemap index, listing every shard file present on disk.
+    """
+    sitemaps = []
+    for shard in SitemapShard.objects.order_by("section", "number"):
+        path = os.path.join(root, shard_filename(shard.section, shard.number))
+        if not os.path.exists(path):
+            continue
+        sitemaps.append(
+            {
+                "location": absolute_url(
+                    reverse(
+                        "sitemap-shard",
+                        kwargs={"section": shard.section, "number": shard.number},
+                    )
+                ),
+                "lastmod": datetime.datetime.fromtimestamp(
+                    os.path.getmtime(path), tz=datetime.timezone.utc
+                ),
+            }
+        )
+    write_file(
+        os.path.join(root, INDEX_FILENAME),
+        render_to_string("blog/sitemap/index.xml", {"sitemaps": sitemaps}),
+    )
+
+
+def build_sitemaps(rebuild=False):
+    """
+    Render the stale shards (every shard if `rebuild`) and the index into
+    BLOG_SITEMAP_ROOT; return the number of shards rendered.
+    """
+    root = settings.BLOG_SITEMAP_ROOT
+    os.makedirs(root, exist_ok=True)
+    if rebuild:
+        for model in SitemapShard.SECTIONS.values():
+            last = model.objects.aggregate(last=Max("pk"))["last"]
+            if last is not None:
+                SitemapShard.mark_stale(model, range(0, last + 1, SitemapShard.SIZE))
+    shards = list(SitemapShard.objects.filter(stale=True))
+    if not shards and os.path.exists(os.path.join(root, INDEX_FILENAME)):
+        return 0
+    # Claim the shards before reading their rows: a row changing meanwhile
+    # flags its shard again for the next run instead of being lost.
+    SitemapShard.objects.filter(pk__in=[shard.pk for shard in shards]).update(
+        stale=False
+    )
+    for shard in shards:
+        path = os.path.join(root, shard_filename(shard.section, shard.number))
+        urls = shard_urls(shard.section, shard.number)
+        if urls:
+            write_file(path, render_urlset(urls))
+        elif os.path.exists(path):
+            os.remove(path)
+    write_index(root)
+    return len(shards)
@@ -0,0 +1,270 @@
+import functools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends import utils as backend_utils
+from django.http import JsonResponse
+from django.template.base import Node
+from django.views.decorators.cache import never_cache
+
+from . import metrics, querybudget, staticfiles
+from .metrics import measure_queries, metrics_readers_only
+from .querybudget import query_budget
+
+
+logger = logging.getLogger(__name__)
+
+TOP = 20
+MAX_TOP = 100
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"(?<![\w.\"])-?\d+(?:\.\d+)?(?![\w\"])")
+PLACEHOLDER_RE = re.compile(r"%s|\?")
+IN_LIST_RE = re.compile(r"\bIN \(\?(?:, \?)*\)", re.IGNORECASE)
+ROWS_RE = re.compile(r"(\(\?(?:, \?)*\))(?:, \1)+")
+SPACE_RE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    Return `sql` with its literals and placeholders replaced by ?, IN lists
+    and multi-row VALUES collapsed, so that statements differing only by
+    their parameters share one fingerprint.
+    """
+    sql = STRING_RE.sub("?", sql)
+    sql = NUMBER_RE.sub("?", sql)
+    sql = PLACEHOLDER_RE.sub("?", sql)
+    sql = IN_LIST_RE.sub("IN (...)", sql)
+    sql = ROWS_RE.sub(r"\1, ...", sql)
+    return SPACE_RE.sub(" ", sql).strip()
+
+
+class QueryStats:
+    """
+    Count, total and longest time of each fingerprint over the last `window`
+    seconds, kept in `slots` slots that expire one at a time.
+    """
+
+    def __init__(self, window, slots=10, clock=time.monotonic):
+        self.window = window
+        self.width = window / slots
+        self.clock = clock
+        self.slots = deque()
+        self.lock = threading.Lock()
+
+    def expire(self, now):
+        while self.slots and self.slots[0][0] <= now - self.window:
+            self.slots.popleft()
+
+    def add(self, fingerprint, seconds):
+        now = self.clock()
+        start = now - now % self.width
+        with self.lock:
+            if not self.slots or self.slots[-1][0] != start:
+                self.slots.append((start, {}))
+                self.expire(now)
+            stats = self.slots[-1][1].get(fingerprint)
+            if stats is None:
+                self.slots[-1][1][fingerprint] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+
+    def top(self, n=TOP):
+        """
+        Return the `n` fingerprints with the most total time in the window,
+        as (fingerprint, count, total seconds, max seconds) tuples.
+        """
+        totals = {}
+        with self.lock:
+            self.expire(self.clock())
+            for _, slot in self.slots:
+                for fingerprint, (count, total, longest) in slot.items():
+                    merged = totals.setdefault(fingerprint, [0, 0.0, 0.0])
+                    merged[0] += count
+                    merged[1] += total
+                    merged[2] = max(merged[2], longest)
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        return [(fingerprint, *stats) for fingerprint, stats in ranked[:n]]
+
+
+# The queries of this process; each gunicorn worker has its own.
+recent = QueryStats(settings.BLOG_SLOW_QUERY_WINDOW)
+
+
+# Project modules wrapping views, templates or queries: the line that caused
+# a query is further out.
+INSTRUMENTATION = {
+    metrics.__file__,
+    querybudget.__file__,
+    staticfiles.__file__,
+    __file__,
+    # blog.profiling imports this module.
+    os.path.join(os.path.dirname(__file__), "profiling.py"),
+}
+
+
+def is_project_file(filename):
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and "site-packages" not in filename
+        and filename not in INSTRUMENTATION
+    )
+
+
+def query_origin(frame):
+    """
+    Return the innermost template line and project source line on the stack
+    of `frame`, as "path:line" strings, or None.
+    """
+    # Skip the cursor wrapper and the execute wrappers it calls.
+    in_cursor = False
+    while frame is not None:
+        if frame.f_code.co_filename == backend_utils.__file__:
+            in_cursor = True
+        elif in_cursor:
+            break
+        frame = frame.f_back
+    template = code = None
+    render_annotated = Node.render_annotated.__code__
+    while frame is not None and not (template and code):
+        if template is None and frame.f_code is render_annotated:
+            node = frame.f_locals.get("self")
+            origin = getattr(node, "origin", None)
+            token = getattr(node, "token", None)
+            if origin is not None and token is not None:
+                name = getattr(origin, "template_name", None) or origin.name
+                template = f"{name}:{token.lineno}"
+        elif code is None and is_project_file(frame.f_code.co_filename):
+            path = os.path.relpath(frame.f_code.co_filename, settings.BASE_DIR)
+            code = f"{path}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return template, code
+
+
+def view_of(request):
+    """
+    Return the URL name and view (class or function) name of `request`.
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None, None
+    view = getattr(match.func, "view_class", match.func)
+    return match.view_name, getattr(view, "__name__", type(view).__name__)
+
+
+class SlowQueryRecorder:
+    """
+    Execute wrapper adding every query of a request to `recent`, and logging
+    those slower than `threshold` seconds with where they came from.
+
+    Fast queries cost two clock reads, a cached fingerprint and a dict update;
+    the stack is only inspected for slow ones.
+    """
+
+    def __init__(self, request, threshold):
+        self.request = request
+        self.threshold = threshold
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            recent.add(fingerprint(sql), elapsed)
+            if elapsed >= self.threshold:
+                self.log(sql, elapsed, sys._getframe(1))
+
+    def log(self, sql, elapsed, frame):
+        url_name, view = view_of(self.request)
+        template, code = query_origin(frame)
+        logger.warning(
+            "Slow query, %.1f ms, in %s (%s), from template %s, code %s: %s",
+            elapsed * 1000,
+            url_name,
+            view,
+            template,
+            code,
+            sql,
+            extra={
+                "fingerprint": fingerprint(sql),
+                "duration": elapsed,
+                "url_name": url_name,
+                "view": view,
+                "template": template,
+                "code": code,
+            },
+        )
+
+
+class SlowQueryMiddleware:
+    """
+    Record the SQL queries of every request when BLOG_SLOW_QUERIES is set:
+    log those taking BLOG_SLOW_QUERY_MS or more, and rank all of them by
+    fingerprint over BLOG_SLOW_QUERY_WINDOW seconds (see slow_queries).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.BLOG_SLOW_QUERIES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = SlowQueryRecorder(request, settings.BLOG_SLOW_QUERY_MS / 1000)
+        with measure_queries(recorder):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        recorder = SlowQueryRecorder(request, settings.BLOG_SLOW_QUERY_MS / 1000)
+        # Queries run in the request's thread-sensitive worker thread.
+        stack = await sync_to_async(measure_queries)(recorder)
+        try:
+            return await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+
+
+@never_cache
+@metrics_readers_only
+@query_budget(0)
+def slow_queries(request):
+    """
+    The fingerprints with the most total time in this worker's window, as
+    JSON, for staff and local clients; ?top= sets how many.
+    """
+    try:
+        n = max(1, min(int(request.GET.get("top", TOP)), MAX_TOP))
+    except ValueError:
+        return JsonResponse({"error": "top must be a number."}, status=400)
+    return JsonResponse(
+        {
+            "window": recent.window,
+            "queries": [
+                {
+                    "fingerprint": fingerprint,
+                    "count": count,
+                    "total_ms": round(total * 1000, 3),
+                    "max_ms": round(longest * 1000, 3),
+                }
+                for fingerprint, count, total, longest in recent.top(n)
+            ],
+        }
+    )
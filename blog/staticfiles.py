@@ -0,0 +1,198 @@
+import mimetypes
+import os
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .storage import ENCODINGS
+
+
+# Hashed names change with their content, so they can be cached for good.
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Anything else may change under the same name: revalidate every time.
+REVALIDATE = "public, no-cache"
+
+
+class StaticFile:
+    """
+    A file of STATIC_ROOT and its precompressed variants.
+    """
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.immutable = immutable
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.last_modified = int(stat.st_mtime)
+        self.version = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+        self.variants = {
+            encoding: path + suffix
+            for suffix, encoding in ENCODINGS.items()
+            if os.path.exists(path + suffix)
+        }
+
+    def etag(self, encoding):
+        # Each encoding is a different representation, with its own ETag.
+        return f'"{self.version}-{encoding}"' if encoding else f'"{self.version}"'
+
+    def path_of(self, encoding):
+        return self.variants[encoding] if encoding else self.path
+
+    def encoding(self, request):
+        """
+        Return the encoding of the variant to send `request`, or None.
+        """
+        accepted = accepted_encodings(request)
+        return next((name for name in self.variants if name in accepted), None)
+
+
+def accepted_encodings(request):
+    """
+    Return the content codings the client accepts (q > 0).
+    """
+    accepted = set()
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if params and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Serve the files collected into STATIC_ROOT at STATIC_URL, ahead of the
+    rest of the middleware, when BLOG_SERVE_STATIC is set.
+
+    Hashed names (see blog.storage) are served with a one year immutable
+    Cache-Control, so browsers never ask for them again; other names are
+    revalidated with their ETag. Clients accepting brotli or gzip get the
+    variants compressed at collectstatic time.
+
+    Under ASGI the middleware runs on the event loop; files are opened and
+    read block by block in worker threads.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.BLOG_SERVE_STATIC:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = urlsplit(settings.STATIC_URL).path
+        if not self.prefix.startswith("/"):
+            self.prefix = "/" + self.prefix
+        self.files = None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.find(request)
+        if static_file is None:
+            return self.get_response(request)
+        return self.serve(request, static_file)
+
+    async def __acall__(self, request):
+        if self.files is None:
+            # Walking STATIC_ROOT would block the event loop.
+            await sync_to_async(self.get_files)()
+        static_file = self.find(request)
+        if static_file is None:
+            return await self.get_response(request)
+        encoding = static_file.encoding(request)
+        response = self.not_modified(request, static_file, encoding)
+        if response is None:
+            file = await sync_to_async(open, thread_sensitive=False)(
+                static_file.path_of(encoding), "rb"
+            )
+            response = self.file_response(static_file, encoding, file)
+            # Django would read a file's blocks to the end before sending them.
+            response.streaming_content = read_blocks(file)
+        return response
+
+    def find(self, request):
+        """
+        Return the StaticFile `request` asks for, or None.
+        """
+        if request.method not in ("GET", "HEAD") or not request.path_info.startswith(
+            self.prefix
+        ):
+            return None
+        return self.get_files().get(request.path_info[len(self.prefix) :])
+
+    def get_files(self):
+        """
+        Index STATIC_ROOT once: only indexed names are ever opened, which
+        rules out path traversal and saves a stat() per request.
+        """
+        if self.files is None:
+            hashed = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+            variants = tuple(ENCODINGS)
+            files = {}
+            root = settings.STATIC_ROOT
+            for directory, _, filenames in os.walk(root):
+                for filename in filenames:
+                    if filename.endswith(variants):
+                        continue
+                    path = os.path.join(directory, filename)
+                    name = os.path.relpath(path, root).replace(os.sep, "/")
+                    files[name] = StaticFile(path, name in hashed)
+            self.files = files
+        return self.files
+
+    def serve(self, request, static_file):
+        encoding = static_file.encoding(request)
+        response = self.not_modified(request, static_file, encoding)
+        if response is None:
+            file = open(static_file.path_of(encoding), "rb")
+            response = self.file_response(static_file, encoding, file)
+        return response
+
+    def not_modified(self, request, static_file, encoding):
+        """
+        Return a 304 response if the client's copy of the file is current.
+        """
+        response = get_conditional_response(
+            request,
+            etag=static_file.etag(encoding),
+            last_modified=static_file.last_modified,
+        )
+        if response is not None:
+            self.add_headers(response, static_file, encoding)
+        return response
+
+    def file_response(self, static_file, encoding, file):
+        response = FileResponse(file, content_type=static_file.content_type)
+        if encoding:
+            response["Content-Encoding"] = encoding
+        response["Last-Modified"] = http_date(static_file.last_modified)
+        self.add_headers(response, static_file, encoding)
+        return response
+
+    def add_headers(self, response, static_file, encoding):
+        response["ETag"] = static_file.etag(encoding)
+        response["Cache-Control"] = IMMUTABLE if static_file.immutable else REVALIDATE
+        if static_file.variants:
+            patch_vary_headers(response, ["Accept-Encoding"])
+
+
+async def read_blocks(file, block_size=64 * 1024):
+    """
+    Yield the blocks of `file`, each read in a worker thread.
+    """
+    read = sync_to_async(file.read, thread_sensitive=False)
+    while block := await read(block_size):
+        yield block
@@ -0,0 +1,65 @@
+import gzip
+import os
+
+import brotli
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+# Encodings of the precompressed variants, by file suffix, in order of
+# preference when a client accepts several.
+ENCODINGS = {".br": "br", ".gz": "gzip"}
+
+
+def compress_gzip(data):
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compress_brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also writes gzip and brotli variants of
+    the hashed text files, for blog.staticfiles.StaticFilesMiddleware.
+
+    Compressing at the highest levels is slow, but happens once per file
+    content, in collectstatic, instead of on every response.
+    """
+
+    compressible_extensions = {".css", ".js", ".map", ".svg", ".txt", ".eot", ".ttf"}
+    compressors = {".br": compress_brotli, ".gz": compress_gzip}
+
+    def stored_name(self, name):
+        # Before collectstatic has written a manifest (development, tests),
+        # link to the files under their own names.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if os.path.splitext(name)[1] in self.compressible_extensions:
+                self.compress(name)
+
+    def compress(self, name):
+        """
+        Write the compressed variants of a file that don't exist yet, unless
+        they are no smaller than the original.
+        """
+        data = None
+        for suffix, compressor in self.compressors.items():
+            path = self.path(name + suffix)
+            # Hashed names are content-addressed: an existing variant is up to date.
+            if os.path.exists(path):
+                continue
+            if data is None:
+                with self.open(name) as original:
+                    data = original.read()
+            compressed = compressor(data)
+            if len(compressed) < len(data):
+                with open(path, "wb") as variant:
+                    variant.write(compressed)
@@ -0,0 +1,24 @@
+from django.test import override_settings
+from django.urls import resolve, reverse
+
+from blog.querybudget import QueryBudgetExceeded, get_query_budget
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin asserting that a URL stays within its view's query budget.
+
+    The view's own enforcement is switched to strict mode for the request, so
+    exactly what the budget declares is counted: the view and its template,
+    but not the session and user lookups done for every request.
+    """
+
+    def assertWithinQueryBudget(self, url_name, args=None, kwargs=None):
+        url = reverse(url_name, args=args, kwargs=kwargs)
+        if get_query_budget(resolve(url).func) is None:
+            self.fail(f"{url_name} does not declare a query budget.")
+        try:
+            with override_settings(BLOG_QUERY_BUDGET_STRICT=True):
+                return self.client.get(url)
+        except QueryBudgetExceeded as error:
+            self.fail(str(error))
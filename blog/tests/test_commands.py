@@ -0,0 +1,428 @@
+import csv
+import gzip
+import json
+import sqlite3
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from blog.cache import GENERATION_KEY
+from blog.models import Blog, BlogAuthor, BlogComment, SitemapShard
+from blog.management.commands.sync_replicas import sync_database
+from blog.profiling import check_token
+from blog.queryplans import plan_problems
+
+
+class RecountBlogCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_user = User.objects.create(username="testuser", password="12345")
+        blog_author = BlogAuthor.objects.create(user=test_user, bio="Test bio")
+        for i in range(1, 6):
+            blog = Blog.objects.create(
+                name=f"Test Blog {i}",
+                author=blog_author,
+                description=f"Test Blog {i} Description",
+            )
+            for j in range(i):
+                BlogComment.objects.create(
+                    description=f"Comment {j}", author=test_user, blog=blog
+                )
+
+    def test_repairs_drift(self):
+        Blog.objects.update(comment_count=42, last_comment_at=None)
+        BlogAuthor.objects.update(post_count=0)
+
+        out = StringIO()
+        call_command("recount_blog", batch_size=2, stdout=out)
+
+        self.assertIn("Recounted 5 blogs and 1 bloggers.", out.getvalue())
+        for blog in Blog.objects.all():
+            self.assertEqual(blog.comment_count, blog.blogcomment_set.count())
+            self.assertEqual(
+                blog.last_comment_at,
+                blog.blogcomment_set.order_by("-post_date")[0].post_date,
+            )
+        self.assertEqual(BlogAuthor.objects.get().post_count, 5)
+
+    def test_touches_only_changed_rows(self):
+        Blog.objects.create(name="No comments", description="Nothing yet")
+        Blog.objects.create(name="Comments deleted", description="Nothing left")
+        Blog.objects.filter(name="Comments deleted").update(
+            last_comment_at=timezone.now()
+        )
+        Blog.objects.filter(name="Test Blog 2").update(comment_count=42)
+        Blog.objects.filter(name="Test Blog 3").update(last_comment_at=None)
+        before = dict(Blog.objects.values_list("name", "modified"))
+
+        out = StringIO()
+        call_command("recount_blog", stdout=out)
+
+        self.assertIn("Recounted 3 blogs and 0 bloggers.", out.getvalue())
+        after = dict(Blog.objects.values_list("name", "modified"))
+        self.assertEqual(
+            {name for name in before if before[name] != after[name]},
+            {"Test Blog 2", "Test Blog 3", "Comments deleted"},
+        )
+
+
+class CheckQueryPlansCommandTest(TestCase):
+    def test_view_queries_use_indexes(self):
+        out = StringIO()
+        call_command("check_query_plans", stdout=out)
+        self.assertIn("All view query plans use indexes.", out.getvalue())
+
+    def test_detects_full_scan_and_temp_sort(self):
+        problems = plan_problems(Blog.objects.order_by("name"))
+        self.assertTrue(any("TEMP B-TREE" in detail for detail in problems))
+        self.assertTrue(any(detail.startswith("SCAN") for detail in problems))
+
+
+class RebuildSearchIndexCommandTest(TestCase):
+    def test_rebuild(self):
+        out = StringIO()
+        call_command("rebuild_search_index", optimize=True, stdout=out)
+        self.assertIn("Rebuilt the blog search index.", out.getvalue())
+
+
+class SyncReplicasCommandTest(SimpleTestCase):
+    def test_sync_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            primary = sqlite3.connect(Path(directory) / "primary.sqlite3")
+            replica = sqlite3.connect(Path(directory) / "replica.sqlite3")
+            primary.execute("PRAGMA journal_mode = wal")
+            replica.execute("PRAGMA journal_mode = wal")
+            primary.execute("CREATE TABLE t (n INTEGER)")
+            primary.executemany("INSERT INTO t VALUES (?)", [(1,), (2,)])
+            primary.commit()
+
+            sync_database(primary, replica)
+            self.assertEqual(replica.execute("SELECT SUM(n) FROM t").fetchone(), (3,))
+
+            primary.execute("INSERT INTO t VALUES (3)")
+            primary.commit()
+            sync_database(primary, replica)
+            self.assertEqual(replica.execute("SELECT SUM(n) FROM t").fetchone(), (6,))
+            primary.close()
+            replica.close()
+
+    def test_requires_replicas(self):
+        with self.settings(BLOG_READ_REPLICAS=[]):
+            with self.assertRaises(CommandError):
+                call_command("sync_replicas")
+
+
+IMPORT_RECORDS = [
+    {"type": "user", "id": 10, "username": "alice"},
+    {"type": "user", "id": 11, "username": "bob", "email": "bob@example.com"},
+    {"type": "author", "id": 20, "user": 10, "bio": "Alice writes."},
+    {
+        "type": "blog",
+        "id": 30,
+        "author": 20,
+        "name": "First",
+        "post_date": "2020-01-02",
+    },
+    {"type": "blog", "id": 31, "author": 20, "name": "Second"},
+    {
+        "type": "comment",
+        "blog": 30,
+        "author": 11,
+        "description": "Nice",
+        "post_date": "2020-01-03T10:00:00+00:00",
+    },
+    {"type": "comment", "blog": 30, "author": 10, "description": "Thanks"},
+    {"type": "comment", "blog": 31, "author": 11, "description": "Again"},
+]
+
+
+class ImportBlogCommandTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write_ndjson(self, records, name="archive.ndjson"):
+        path = self.directory / name
+        path.write_text("".join(json.dumps(record) + "\n" for record in records))
+        return str(path)
+
+    def assertImported(self):
+        alice = User.objects.get(username="alice")
+        self.assertFalse(alice.has_usable_password())
+        blogger = BlogAuthor.objects.get(user=alice)
+        self.assertEqual(blogger.post_count, 2)
+        first = Blog.objects.get(name="First")
+        self.assertEqual(first.author, blogger)
+        self.assertEqual(first.post_date.isoformat(), "2020-01-02")
+        self.assertEqual(first.comment_count, 2)
+        nice = BlogComment.objects.get(description="Nice")
+        self.assertEqual(nice.author.username, "bob")
+        self.assertEqual(nice.post_date.isoformat(), "2020-01-03T10:00:00+00:00")
+        self.assertEqual(BlogComment.objects.count(), 3)
+
+    def test_import_ndjson_in_batches(self):
+        out = StringIO()
+        call_command(
+            "import_blog", self.write_ndjson(IMPORT_RECORDS), batch_size=3, stdout=out
+        )
+        self.assertIn(
+            "Imported 2 users, 1 bloggers, 2 blogs and 3 comments", out.getvalue()
+        )
+        self.assertImported()
+
+    def test_import_csv(self):
+        path = self.directory / "archive.csv"
+        fields = sorted({key for record in IMPORT_RECORDS for key in record})
+        with open(path, "w", newline="") as output:
+            writer = csv.DictWriter(output, fields)
+            writer.writeheader()
+            writer.writerows(IMPORT_RECORDS)
+        call_command("import_blog", str(path), stdout=StringIO())
+        self.assertImported()
+
+    def test_existing_users_are_reused(self):
+        User.objects.create_user(username="bob", password="12345")
+        call_command(
+            "import_blog", self.write_ndjson(IMPORT_RECORDS), stdout=StringIO()
+        )
+        self.assertEqual(User.objects.filter(username="bob").count(), 1)
+        self.assertTrue(User.objects.get(username="bob").check_password("12345"))
+        self.assertImported()
+
+    def test_resume_after_failure(self):
+        broken = IMPORT_RECORDS[:5] + [{"type": "comment", "blog": 99}]
+        path = self.write_ndjson(broken + IMPORT_RECORDS[5:])
+        with self.assertRaisesMessage(CommandError, "Line 6: blog 99"):
+            call_command("import_blog", path, batch_size=3, stdout=StringIO())
+        # The first chunk was committed, the failing one rolled back.
+        self.assertEqual(BlogAuthor.objects.count(), 1)
+        self.assertEqual(Blog.objects.count(), 0)
+        with self.assertRaisesMessage(CommandError, "--resume"):
+            call_command("import_blog", path, stdout=StringIO())
+
+        self.write_ndjson(
+            IMPORT_RECORDS[:5]
+            + [{"type": "user", "id": 12, "username": "carol"}]
+            + IMPORT_RECORDS[5:]
+        )
+        out = StringIO()
+        call_command("import_blog", path, batch_size=3, resume=True, stdout=out)
+        self.assertIn("1 users, 0 bloggers, 2 blogs and 3 comments", out.getvalue())
+        self.assertImported()
+
+        out = StringIO()
+        call_command("import_blog", path, resume=True, stdout=out)
+        self.assertIn("Nothing to do", out.getvalue())
+
+
+class ExportBlogCommandTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        path = self.directory / "archive.ndjson"
+        path.write_text("".join(json.dumps(record) + "\n" for record in IMPORT_RECORDS))
+        call_command("import_blog", str(path), stdout=StringIO())
+
+    def export(self, name, **options):
+        path = str(self.directory / name)
+        out = StringIO()
+        call_command("export_blog", output=path, chunk_size=1, stdout=out, **options)
+        self.assertIn(f"to {path}", out.getvalue())
+        return path
+
+    def test_export_ndjson(self):
+        with open(self.export("export.ndjson")) as export:
+            records = [json.loads(line) for line in export]
+        self.assertEqual([record["name"] for record in records], ["First", "Second"])
+        first = records[0]
+        self.assertEqual(first["post_date"], "2020-01-02")
+        self.assertEqual(first["author"]["username"], "alice")
+        self.assertEqual(
+            [comment["author"] for comment in first["comments"]], ["bob", "alice"]
+        )
+        self.assertEqual(first["comments"][0]["post_date"], "2020-01-03T10:00:00+00:00")
+
+    def test_export_csv_gzip(self):
+        with gzip.open(self.export("export.csv.gz"), "rt", newline="") as export:
+            rows = list(csv.DictReader(export))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["blog_name"], "First")
+        self.assertEqual(rows[0]["author_username"], "alice")
+        self.assertEqual(rows[0]["comment_description"], "Nice")
+
+    def test_date_range(self):
+        Blog.objects.filter(name="Second").update(post_date="2021-06-01")
+        with open(self.export("export.ndjson", since="2021-01-01")) as export:
+            self.assertEqual([json.loads(line)["name"] for line in export], ["Second"])
+        with open(self.export("export.csv", until="2020-12-31")) as export:
+            self.assertEqual(len(list(csv.DictReader(export))), 2)
+        with self.assertRaisesMessage(CommandError, "since must be a YYYY-MM-DD"):
+            self.export("export.csv", since="yesterday")
+
+
+@mock.patch.object(SitemapShard, "SIZE", 2)
+class BuildSitemapsCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username="testuser", password="12345")
+        cls.blog_author = BlogAuthor.objects.create(user=user, bio="Test bio")
+        cls.blogs = [
+            Blog.objects.create(
+                name=f"Test Blog {i}", author=cls.blog_author, description="Text"
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        settings = self.settings(
+            BLOG_SITEMAP_ROOT=directory.name, BLOG_SITE_URL="https://example.com/"
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def build(self, **options):
+        out = StringIO()
+        call_command("build_sitemaps", stdout=out, **options)
+        return out.getvalue()
+
+    def shard(self, pk):
+        return self.root / f"sitemap-blog-{pk // 2}.xml"
+
+    def test_build_all(self):
+        self.assertIn("Rendered", self.build(all=True))
+        index = (self.root / "sitemap.xml").read_text()
+        for blog in self.blogs:
+            self.assertIn(
+                f"<loc>https://example.com{blog.get_absolute_url()}</loc>",
+                self.shard(blog.pk).read_text(),
+            )
+            self.assertIn(f"sitemap-blog-{blog.pk // 2}.xml", index)
+        self.assertIn(
+            f"https://example.com{self.blog_author.get_absolute_url()}",
+            (self.root / f"sitemap-blogger-{self.blog_author.pk // 2}.xml").read_text(),
+        )
+
+    def test_only_touched_shards_are_rendered(self):
+        self.build(all=True)
+        self.assertIn("Rendered 0 sitemap shards", self.build())
+
+        first, last = self.blogs[0], self.blogs[-1]
+        before = self.shard(first.pk).stat().st_mtime_ns
+        last.name = "Renamed"
+        last.save()
+        self.assertIn("Rendered 1 sitemap shards", self.build())
+        self.assertEqual(self.shard(first.pk).stat().st_mtime_ns, before)
+
+        url, shard = last.get_absolute_url(), self.shard(last.pk)
+        last.delete()
+        self.build()
+        if shard.exists():
+            self.assertNotIn(url, shard.read_text())
+        else:
+            # An emptied shard is dropped from the index.
+            self.assertNotIn(shard.name, (self.root / "sitemap.xml").read_text())
+
+    def test_bulk_create_marks_shards(self):
+        self.build(all=True)
+        blogs = Blog.objects.bulk_create(
+            [
+                Blog(name=f"Bulk {i}", author=self.blog_author, description="Text")
+                for i in range(3)
+            ]
+        )
+        shards = {blog.pk // 2 for blog in blogs}
+        self.assertIn(f"Rendered {len(shards)} sitemap shards", self.build())
+        for blog in blogs:
+            self.assertIn(blog.get_absolute_url(), self.shard(blog.pk).read_text())
+
+
+class ProfileTokenCommandTest(SimpleTestCase):
+    def test_prints_a_valid_token(self):
+        out = StringIO()
+        call_command("profile_token", stdout=out)
+        self.assertTrue(check_token(out.getvalue().strip()))
+        self.assertFalse(check_token(out.getvalue().strip() + "x"))
+
+
+class SeedBlogCommandTest(TestCase):
+    def seed(self, *args):
+        out = StringIO()
+        call_command(
+            "seed_blog",
+            "--users=20",
+            "--bloggers=5",
+            "--posts-per-blogger=uniform:1:4",
+            "--comments-per-post=pareto:4:1.5",
+            "--end-date=2026-01-01",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def delete_all(self):
+        for model in (BlogComment, Blog, BlogAuthor, User):
+            model.objects.all().delete()
+
+    def snapshot(self):
+        return (
+            list(Blog.objects.order_by("pk").values_list()),
+            list(BlogComment.objects.order_by("pk").values_list()),
+        )
+
+    def test_deterministic_from_the_seed(self):
+        self.assertIn("Seeded 20 users, 5 bloggers", self.seed())
+        first = self.snapshot()
+        self.assertTrue(first[1])
+        self.delete_all()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+        self.delete_all()
+        self.seed("--seed=1")
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_invalidates_the_seeded_database(self):
+        patch_mark_stale = mock.patch.object(
+            SitemapShard, "mark_stale", wraps=SitemapShard.mark_stale
+        )
+        with mock.patch("blog.management.commands.seed_blog.bump") as bump:
+            with patch_mark_stale as mark_stale:
+                self.seed("--database=default")
+        bump.assert_called_once_with(GENERATION_KEY, using="default")
+        self.assertTrue(mark_stale.call_args_list)
+        for call in mark_stale.call_args_list:
+            self.assertEqual(call.kwargs["using"], "default")
+        self.assertTrue(SitemapShard.objects.filter(stale=True).exists())
+
+    def test_rows_are_consistent(self):
+        self.seed()
+        blogs = self.snapshot()[0]
+        authors = list(BlogAuthor.objects.order_by("pk").values_list("post_count"))
+        call_command("recount_blog", stdout=StringIO())
+        self.assertEqual(self.snapshot()[0], blogs)
+        self.assertEqual(
+            list(BlogAuthor.objects.order_by("pk").values_list("post_count")), authors
+        )
+        for comment in BlogComment.objects.select_related("blog"):
+            self.assertGreaterEqual(comment.post_date.date(), comment.blog.post_date)
+        self.assertTrue(
+            SitemapShard.objects.filter(section="blog", stale=True).exists()
+        )
+
+    def test_passwords(self):
+        self.seed("--password=secret", "--prefix=a-")
+        self.assertTrue(self.client.login(username="a-0", password="secret"))
+        self.seed("--seed=1")
+        self.assertFalse(User.objects.get(username="seed1-0").has_usable_password())
+        with self.assertRaisesMessage(CommandError, "this seed was used"):
+            self.seed("--seed=1")
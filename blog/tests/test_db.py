@@ -0,0 +1,41 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from blog.db import PRAGMA_PROFILES, get_pragmas
+
+
+class PragmaProfileTest(SimpleTestCase):
+    @override_settings(SQLITE_PRAGMA_PROFILE="production", SQLITE_PRAGMAS={})
+    def test_profile(self):
+        self.assertEqual(get_pragmas(), PRAGMA_PROFILES["production"])
+
+    @override_settings(
+        SQLITE_PRAGMA_PROFILE="production", SQLITE_PRAGMAS={"busy_timeout": "100"}
+    )
+    def test_overrides(self):
+        pragmas = get_pragmas()
+        self.assertEqual(pragmas["busy_timeout"], "100")
+        self.assertEqual(pragmas["journal_mode"], "wal")
+
+    @override_settings(SQLITE_PRAGMA_PROFILE="fast")
+    def test_unknown_profile(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_pragmas()
+
+    @override_settings(SQLITE_PRAGMAS={"journal_mode": "wal; DROP TABLE blog_blog"})
+    def test_rejects_injection(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_pragmas()
+
+    @override_settings(SQLITE_PRAGMAS={"writable_schema": "on"})
+    def test_rejects_unknown_pragma(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_pragmas()
+
+
+class ConnectionPragmasTest(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], get_pragmas()["busy_timeout"])
@@ -1,6 +1,8 @@
 import datetime as dt
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 
 from blog.models import Blog, BlogAuthor, BlogComment
@@ -169,3 +171,89 @@ class BlogAuthorModelTest(TestCase):
     def test_get_absolute_url(self):
         author = BlogAuthor.objects.get(id=1)
         self.assertEqual(author.get_absolute_url(), "/blog/blogger/1")
+
+
+class DenormalizedCountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser", password="12345")
+        cls.author = BlogAuthor.objects.create(user=cls.user, bio="Test bio")
+        cls.other_author = BlogAuthor.objects.create(
+            user=User.objects.create(username="testuser2", password="12345"),
+            bio="Other bio",
+        )
+
+    def create_blog(self, author):
+        return Blog.objects.create(
+            name="Test Blog", author=author, description="Test Blog Description"
+        )
+
+    def test_post_count_follows_created_and_deleted_blogs(self):
+        blog = self.create_blog(self.author)
+        self.create_blog(self.author)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.post_count, 2)
+
+        blog.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.post_count, 1)
+
+    def test_post_count_follows_author_change(self):
+        blog = self.create_blog(self.author)
+        blog.author = self.other_author
+        blog.save()
+        self.author.refresh_from_db()
+        self.other_author.refresh_from_db()
+        self.assertEqual(self.author.post_count, 0)
+        self.assertEqual(self.other_author.post_count, 1)
+
+    def test_comment_count_and_last_comment_at(self):
+        blog = self.create_blog(self.author)
+        first = BlogComment.objects.create(
+            description="First", author=self.user, blog=blog
+        )
+        second = BlogComment.objects.create(
+            description="Second", author=self.user, blog=blog
+        )
+        blog.refresh_from_db()
+        self.assertEqual(blog.comment_count, 2)
+        self.assertEqual(blog.last_comment_at, second.post_date)
+
+        second.delete()
+        blog.refresh_from_db()
+        self.assertEqual(blog.comment_count, 1)
+        self.assertEqual(blog.last_comment_at, first.post_date)
+
+        first.delete()
+        blog.refresh_from_db()
+        self.assertEqual(blog.comment_count, 0)
+        self.assertIsNone(blog.last_comment_at)
+
+    def test_drifted_counters_stay_non_negative(self):
+        # bulk_create() skips the signals, leaving the counters behind.
+        blog = Blog.objects.bulk_create(
+            [Blog(name="Bulk", author=self.author, description="Bulk")]
+        )[0]
+        comments = BlogComment.objects.bulk_create(
+            BlogComment(description=f"Comment {i}", author=self.user, blog=blog)
+            for i in range(3)
+        )
+        comments[0].delete()
+        blog.refresh_from_db()
+        self.assertEqual(blog.comment_count, 0)
+
+        blog.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.post_count, 0)
+
+    def test_blog_delete_skips_per_comment_updates(self):
+        blog = self.create_blog(self.author)
+        for i in range(5):
+            BlogComment.objects.create(
+                description=f"Comment {i}", author=self.user, blog=blog
+            )
+        with CaptureQueriesContext(connection) as queries:
+            blog.delete()
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertFalse([sql for sql in updates if '"blog_blog" SET' in sql])
+        self.assertFalse(BlogComment.objects.exists())
@@ -1,8 +1,53 @@
-from django.test import TestCase
-from django.urls import reverse
-from django.contrib.auth.models import User
+import asyncio
+import datetime as dt
+import gzip
+import importlib
+import json
+import marshal
+import re
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-from blog.models import Blog, BlogAuthor
+import brotli
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.template.loader import render_to_string
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.contrib.auth.models import AnonymousUser, User
+from prometheus_client import REGISTRY
+
+from blog import export
+from blog import urls as blog_urls
+from blog.metrics import MetricsMiddleware
+from blog.live import fetch_events, publisher
+from blog.models import Blog, BlogAuthor, BlogComment, RequestProfile
+from blog.profiling import ProfilingMiddleware, make_token, top_functions
+from blog.querybudget import QueryBudgetExceeded, get_query_budget, query_budget
+from blog.routers import PRIMARY_COOKIE, ReplicaRouter, choose_replica, read_from
+from blog.staticfiles import StaticFilesMiddleware
+from blog.slowqueries import (
+    QueryStats,
+    SlowQueryMiddleware,
+    SlowQueryRecorder,
+    fingerprint,
+)
+from blog.tests.mixins import QueryBudgetTestMixin
+from blog.views import BlogDetailView, BlogListByAuthorView
 
 
 class IndexViewTest(TestCase):
@@ -19,6 +64,24 @@ class IndexViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "index.html")
 
+    def test_visit_counter_does_not_touch_the_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("index"))
+        self.assertNotIn("sessionid", response.cookies)
+        self.assertEqual(response.context["cnt_visits"], 1)
+
+    def test_visit_counter_increments(self):
+        self.client.get(reverse("index"))
+        response = self.client.get(reverse("index"))
+        self.assertEqual(response.context["cnt_visits"], 2)
+        self.assertContains(response, "2 times")
+
+    def test_tampered_visit_counter_is_reset(self):
+        self.client.get(reverse("index"))
+        self.client.cookies["cnt_visits"] = "1000"
+        response = self.client.get(reverse("index"))
+        self.assertEqual(response.context["cnt_visits"], 1)
+
 
 class BlogListViewTest(TestCase):
     @classmethod
@@ -222,3 +285,1354 @@ class BlogListByAuthorViewTest(TestCase):
         self.assertTrue("is_paginated" in response.context)
         self.assertTrue(response.context["is_paginated"])
         self.assertEqual(len(response.context["blog_list"]), 2)
+
+
+@override_settings(BLOG_CURSOR_PAGINATION=True)
+class CursorPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_user = User.objects.create(username="testuser", password="12345")
+        test_user.save()
+        blog_author = BlogAuthor.objects.create(
+            user=test_user,
+            bio="Test User Bio",
+        )
+        blog_author.save()
+
+        # Several posts share a date so that the id tie-breaker is exercised.
+        for i in range(1, 13):
+            Blog.objects.create(
+                name=f"Test Blog {i}",
+                author=blog_author,
+                description=f"Test Blog {i} Description",
+                post_date=dt.date(2023, 10, 1) + dt.timedelta(days=i // 3),
+            )
+
+    def walk(self, url):
+        pages = []
+        response = self.client.get(url)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            page = response.context["page_obj"]
+            pages.append([blog.id for blog in response.context["blog_list"]])
+            if not page.has_next():
+                return pages, page
+            response = self.client.get(url + "?cursor=" + page.next_cursor)
+
+    def test_first_page_has_no_previous(self):
+        response = self.client.get(reverse("blogs"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["is_paginated"])
+        self.assertFalse(response.context["page_obj"].has_previous())
+        self.assertEqual(len(response.context["blog_list"]), 5)
+        self.assertContains(response, "?cursor=")
+
+    def test_walk_matches_offset_ordering(self):
+        pages, _ = self.walk(reverse("blogs"))
+        expected = list(
+            Blog.objects.order_by("-post_date", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_previous_cursor_returns_preceding_page(self):
+        pages, last_page = self.walk(reverse("blogs"))
+        response = self.client.get(
+            reverse("blogs") + "?cursor=" + last_page.previous_cursor
+        )
+        self.assertEqual([blog.id for blog in response.context["blog_list"]], pages[-2])
+
+    def test_blogs_by_author_walk(self):
+        pages, _ = self.walk(reverse("blogs-by-author", args=(1,)))
+        self.assertEqual(sum(len(page) for page in pages), 12)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse("blogs") + "?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+    def test_bloggers_cursor(self):
+        response = self.client.get(reverse("bloggers"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["blogauthor_list"]), 1)
+        self.assertFalse(response.context["is_paginated"])
+
+    def test_bloggers_without_user_walk(self):
+        # Bloggers whose user was deleted have a NULL user_id.
+        for i in range(7):
+            BlogAuthor.objects.create(user=None, bio=f"Orphan {i}")
+        expected = list(BlogAuthor.objects.order_by("id").values_list("id", flat=True))
+        pages, last_page = [], None
+        url = reverse("bloggers")
+        response = self.client.get(url)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            last_page = response.context["page_obj"]
+            pages.append([author.id for author in last_page])
+            if not last_page.has_next():
+                break
+            response = self.client.get(url + "?cursor=" + last_page.next_cursor)
+        self.assertEqual(sum(pages, []), expected)
+        response = self.client.get(url + "?cursor=" + last_page.previous_cursor)
+        self.assertEqual(
+            [author.id for author in response.context["page_obj"]], pages[0]
+        )
+
+
+@override_settings(BLOG_QUERY_BUDGET_STRICT=True)
+class QueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(1, 8):
+            test_user = User.objects.create(username=f"testuser{i}", password="12345")
+            blog_author = BlogAuthor.objects.create(
+                user=test_user,
+                bio=f"Test User's{i} Bio",
+            )
+            blog = Blog.objects.create(
+                name=f"Test Blog {i}",
+                author=blog_author,
+                description=f"Test Blog {i} Description",
+            )
+            for j in range(3):
+                BlogComment.objects.create(
+                    description=f"Comment {j}", author=test_user, blog=blog
+                )
+        cls.user = User.objects.create_user(username="commenter", password="12345")
+
+    def test_every_url_declares_a_budget(self):
+        for pattern in blog_urls.urlpatterns:
+            self.assertIsNotNone(get_query_budget(pattern.callback), pattern.name)
+
+    def test_index(self):
+        self.assertWithinQueryBudget("index")
+
+    def test_blogs(self):
+        self.assertWithinQueryBudget("blogs")
+
+    def test_bloggers(self):
+        self.assertWithinQueryBudget("bloggers")
+
+    def test_blogs_by_author(self):
+        self.assertWithinQueryBudget("blogs-by-author", args=(1,))
+
+    def test_blog_detail(self):
+        self.assertWithinQueryBudget("blog-detail", args=(1,))
+
+    def test_blog_comments(self):
+        self.assertWithinQueryBudget("blog-comments", args=(1,))
+
+    def test_blog_comment(self):
+        self.client.login(username="commenter", password="12345")
+        self.assertWithinQueryBudget("blog-comment", args=(1,))
+
+    def test_blog_export(self):
+        User.objects.create_user(username="staff", password="12345", is_staff=True)
+        self.client.login(username="staff", password="12345")
+        self.assertWithinQueryBudget("blog-export")
+
+    def test_feeds(self):
+        self.assertWithinQueryBudget("blogs-feed")
+        self.assertWithinQueryBudget("blogs-atom")
+        self.assertWithinQueryBudget("blogs-by-author-feed", args=(1,))
+        self.assertWithinQueryBudget("blogs-by-author-atom", args=(1,))
+
+    def test_sitemap(self):
+        self.assertWithinQueryBudget("sitemap")
+
+    def test_api(self):
+        self.assertWithinQueryBudget("api-blogs")
+        self.assertWithinQueryBudget("api-bloggers")
+        self.assertWithinQueryBudget("api-blog-comments", args=(1,))
+
+    def test_budget_does_not_grow_with_page_size(self):
+        with self.settings(BLOG_CURSOR_PAGINATION=True):
+            self.assertWithinQueryBudget("blogs")
+            self.assertWithinQueryBudget("bloggers")
+
+    def test_exceeding_budget_raises(self):
+        with mock.patch.object(BlogListByAuthorView, "query_budget", 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse("blogs-by-author", args=(1,)))
+
+
+@override_settings(BLOG_COMMENTS_PER_PAGE=10)
+class BlogCommentListViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_user = User.objects.create(username="testuser", password="12345")
+        blog_author = BlogAuthor.objects.create(user=test_user, bio="Test Bio")
+        blog = Blog.objects.create(
+            name="Test Blog 1",
+            author=blog_author,
+            description="Test Blog 1 Description",
+        )
+        for i in range(1, 26):
+            BlogComment.objects.create(
+                description=f"Comment {i}", author=test_user, blog=blog
+            )
+
+    def test_detail_shows_first_page_of_comments(self):
+        response = self.client.get(reverse("blog-detail", args=(1,)))
+        self.assertEqual(response.status_code, 200)
+        page = response.context["comment_page"]
+        self.assertEqual(
+            [c.description for c in page], [f"Comment {i}" for i in range(1, 11)]
+        )
+        self.assertContains(response, "Load more comments")
+
+    def test_load_more_walks_all_comments(self):
+        page = self.client.get(reverse("blog-detail", args=(1,))).context[
+            "comment_page"
+        ]
+        seen = [c.id for c in page]
+        while page.has_next():
+            response = self.client.get(
+                reverse("blog-comments", args=(1,)) + "?cursor=" + page.next_cursor
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTemplateUsed(response, "blog/blogcomment_list.html")
+            self.assertTemplateNotUsed(response, "base.html")
+            page = response.context["comment_page"]
+            seen += [c.id for c in page]
+        self.assertEqual(seen, list(range(1, 26)))
+
+    @override_settings(BLOG_COMMENTS_NEWEST_FIRST=True)
+    def test_newest_first(self):
+        response = self.client.get(reverse("blog-detail", args=(1,)))
+        self.assertEqual(response.context["comment_page"].object_list[0].id, 25)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse("blog-comments", args=(1,)) + "?cursor=x")
+        self.assertEqual(response.status_code, 404)
+
+
+class BlogSearchViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_user = User.objects.create(username="testuser", password="12345")
+        blog_author = BlogAuthor.objects.create(user=test_user, bio="Test Bio")
+        for i in range(1, 16):
+            Blog.objects.create(
+                name=f"Gardening tips {i}",
+                author=blog_author,
+                description=f"How to grow tomatoes, part {i}.",
+            )
+        Blog.objects.create(
+            name="Cooking",
+            author=blog_author,
+            description="A <b>tomato</b> soup recipe.",
+        )
+
+    def search(self, query, cursor=None):
+        url = reverse("blog-search") + "?q=" + query
+        if cursor:
+            url += "&cursor=" + cursor
+        return self.client.get(url)
+
+    def test_view_uses_correct_template(self):
+        response = self.search("")
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "blog/blog_search.html")
+        self.assertEqual(response.context["results"], [])
+
+    def test_blog_without_author(self):
+        Blog.objects.create(name="Orphan", description="Its blogger was deleted.")
+        response = self.search("orphan")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Orphan")
+
+    def test_matches_name_and_description(self):
+        response = self.search("soup")
+        self.assertEqual(
+            [result.blog.name for result in response.context["results"]],
+            ["Cooking"],
+        )
+        response = self.search("gardening")
+        self.assertEqual(len(response.context["results"]), 10)
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        response = self.search("soup")
+        self.assertContains(response, "<mark>soup</mark>")
+        self.assertContains(response, "&lt;b&gt;tomato&lt;/b&gt;")
+
+    def test_cursor_pagination(self):
+        response = self.search("tomatoes")
+        seen = [result.blog.pk for result in response.context["results"]]
+        response = self.search("tomatoes", response.context["next_cursor"])
+        seen += [result.blog.pk for result in response.context["results"]]
+        self.assertIsNone(response.context["next_cursor"])
+        # Stemming makes "tomatoes" match the "tomato" soup as well.
+        self.assertEqual(sorted(seen), list(range(1, 17)))
+
+    def test_index_follows_updates_and_deletes(self):
+        Blog.objects.filter(name="Cooking").update(description="Bread recipe.")
+        self.assertEqual(self.search("soup").context["results"], [])
+        self.assertEqual(len(self.search("bread").context["results"]), 1)
+        Blog.objects.filter(name="Cooking").delete()
+        self.assertEqual(self.search("bread").context["results"], [])
+
+    def test_fts_syntax_is_not_interpreted(self):
+        response = self.search('"tomato OR" NEAR(')
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.search("tomato", "bogus").status_code, 404)
+
+
+class FeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser", password="12345")
+        cls.blog_author = BlogAuthor.objects.create(user=cls.user, bio="Test Bio")
+        cls.other_author = BlogAuthor.objects.create(bio="Anonymous")
+        Blog.objects.create(
+            name="Old Blog",
+            author=cls.blog_author,
+            description="Short",
+            post_date=dt.date(2020, 1, 1),
+        )
+        Blog.objects.create(
+            name="Long Blog",
+            author=cls.blog_author,
+            description="word " * 1000,
+            post_date=dt.date(2020, 1, 2),
+        )
+        Blog.objects.create(
+            name="Other Blog",
+            author=cls.other_author,
+            description="Other",
+            post_date=dt.date(2019, 12, 1),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_blogs_feed(self):
+        response = self.client.get(reverse("blogs-feed"))
+        self.assertEqual(response["Content-Type"], "application/rss+xml; charset=utf-8")
+        content = response.content.decode()
+        self.assertLess(content.index("Long Blog"), content.index("Old Blog"))
+        self.assertIn("Other Blog", content)
+        self.assertIn("testuser", content)
+        self.assertIn("word word…", content)
+        self.assertNotIn("word " * 100, content)
+        newest = timezone.make_aware(dt.datetime(2020, 1, 2))
+        self.assertEqual(response["Last-Modified"], http_date(newest.timestamp()))
+
+    def test_blogs_by_author_atom(self):
+        url = reverse("blogs-by-author-atom", args=(self.blog_author.pk,))
+        response = self.client.get(url)
+        self.assertEqual(
+            response["Content-Type"], "application/atom+xml; charset=utf-8"
+        )
+        self.assertContains(response, "Blogs by testuser")
+        self.assertContains(response, "Old Blog")
+        self.assertNotContains(response, "Other Blog")
+        missing = reverse("blogs-by-author-feed", args=(99,))
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_items_load_authors_and_excerpts_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("blogs-feed"))
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]["sql"]
+        self.assertIn("SUBSTR", sql)
+        self.assertEqual(sql.count('"blog_blog"."description"'), 1)
+
+    @override_settings(BLOG_PAGE_CACHE=True)
+    def test_unchanged_polls_run_no_sql(self):
+        url = reverse("blogs-by-author-feed", args=(self.blog_author.pk,))
+        etag = self.client.get(url)["ETag"]
+        self.client.cookies["sessionid"] = "whatever"
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Blog.objects.create(name="New Blog", author=self.blog_author, description="")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "New Blog")
+
+
+@override_settings(BLOG_PAGE_CACHE=True)
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser", password="12345")
+        cls.blog_author = BlogAuthor.objects.create(user=cls.user, bio="Test Bio")
+        cls.blog = Blog.objects.create(
+            name="Test Blog 1",
+            author=cls.blog_author,
+            description="Test Blog 1 Description",
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_hit_runs_no_sql(self):
+        url = reverse("blog-detail", args=(1,))
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, "Test Blog 1 Description")
+
+    def test_new_comment_shows_on_next_request(self):
+        url = reverse("blog-detail", args=(1,))
+        self.client.get(url)
+        BlogComment.objects.create(
+            description="Fresh comment", author=self.user, blog=self.blog
+        )
+        self.assertContains(self.client.get(url), "Fresh comment")
+
+    def test_queryset_update_invalidates(self):
+        url = reverse("blogs")
+        self.client.get(url)
+        Blog.objects.filter(pk=1).update(name="Renamed Blog")
+        self.assertContains(self.client.get(url), "Renamed Blog")
+
+    def test_blog_save_invalidates_author_page_only_for_its_author(self):
+        url = reverse("blogs-by-author", args=(1,))
+        self.client.get(url)
+        Blog.objects.create(
+            name="Second Blog", author=self.blog_author, description="Another"
+        )
+        self.assertContains(self.client.get(url), "Second Blog")
+
+    def test_session_cookie_bypasses_cache(self):
+        url = reverse("blog-detail", args=(1,))
+        self.client.get(url)
+        self.client.cookies["sessionid"] = "whatever"
+        # Session, blog (kept from the validators) and comments.
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser", password="12345")
+        cls.blog_author = BlogAuthor.objects.create(user=cls.user, bio="Test Bio")
+        for i in range(1, 8):
+            Blog.objects.create(
+                name=f"Test Blog {i}",
+                author=cls.blog_author,
+                description=f"Test Blog {i} Description",
+            )
+
+    def assertRevalidates(self, url, change, queries, last_modified=False):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        # List pages change when a row is deleted, without any row modified.
+        self.assertEqual(response.has_header("Last-Modified"), last_modified)
+
+        # Only the validator queries run for a 304.
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_blog_detail_changes_with_new_comment(self):
+        self.assertRevalidates(
+            reverse("blog-detail", args=(1,)),
+            lambda: BlogComment.objects.create(
+                description="New comment", author=self.user, blog_id=1
+            ),
+            queries=1,
+            last_modified=True,
+        )
+
+    def test_blog_detail_changes_with_author_username(self):
+        def change():
+            self.user.username = "renamed"
+            self.user.save()
+
+        url = reverse("blog-detail", args=(1,))
+        last_modified = self.client.get(url)["Last-Modified"]
+        self.assertRevalidates(url, change, queries=1, last_modified=True)
+        # Last-Modified has one second resolution.
+        later = timezone.now() + dt.timedelta(seconds=2)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            self.user.username = "renamed again"
+            self.user.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertContains(response, "renamed again")
+
+    def test_blog_detail_changes_with_commenter_username(self):
+        commenter = User.objects.create(username="commenter")
+        BlogComment.objects.create(description="Hi", author=commenter, blog_id=1)
+
+        def change():
+            commenter.username = "renamed commenter"
+            commenter.save()
+
+        self.assertRevalidates(
+            reverse("blog-detail", args=(1,)), change, queries=1, last_modified=True
+        )
+
+    def test_blog_list_changes_with_deleted_blog(self):
+        url = reverse("blogs")
+        response = self.client.get(url)
+        Blog.objects.get(pk=7).delete()
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(timezone.now().timestamp() + 60)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Test Blog 7")
+
+    def test_list_rows_are_loaded_once(self):
+        # The count and the page, loaded for the validators and rendered.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("blogs"))
+        self.assertEqual(len(response.context["blog_list"]), 5)
+        with self.assertNumQueries(3):
+            self.client.get(reverse("blogs-by-author", args=(1,)))
+
+    def test_blog_list_changes_with_edited_blog(self):
+        def change():
+            blog = Blog.objects.get(pk=7)
+            blog.name = "Edited"
+            blog.save()
+
+        self.assertRevalidates(reverse("blogs"), change, queries=2)
+
+    def test_blogs_by_author_changes_with_deleted_blog(self):
+        self.assertRevalidates(
+            reverse("blogs-by-author", args=(1,)),
+            lambda: Blog.objects.get(pk=7).delete(),
+            queries=3,
+        )
+
+    def test_bloggers_changes_with_edited_bio(self):
+        def change():
+            self.blog_author.bio = "New bio"
+            self.blog_author.save()
+
+        self.assertRevalidates(reverse("bloggers"), change, queries=2)
+
+    def test_if_modified_since(self):
+        url = reverse("blog-detail", args=(1,))
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(BLOG_ANONYMOUS_SHELL=True)
+class AnonymousShellTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        blog_author = BlogAuthor.objects.create(user=cls.user, bio="Test Bio")
+        Blog.objects.create(
+            name="Test Blog 1",
+            author=blog_author,
+            description="Test Blog 1 Description",
+        )
+
+    def test_page_is_identical_for_all_users(self):
+        url = reverse("blog-detail", args=(1,))
+        anonymous = self.client.get(url)
+        self.client.login(username="testuser", password="12345")
+        logged_in = self.client.get(url)
+        self.assertEqual(anonymous.content, logged_in.content)
+        self.assertEqual(anonymous["ETag"], logged_in["ETag"])
+        self.assertNotIn("Cookie", logged_in.get("Vary", ""))
+        self.assertNotContains(logged_in, "testuser</li>")
+        self.assertContains(logged_in, "deferred-fragment")
+
+    def test_user_nav_fragment(self):
+        url = reverse("user-nav") + "?next=/blog/blog/1"
+        self.assertContains(self.client.get(url), "/accounts/login/?next=/blog/blog/1")
+        self.client.login(username="testuser", password="12345")
+        response = self.client.get(url)
+        self.assertContains(response, "User: testuser")
+        self.assertIn("private", response["Cache-Control"])
+
+    def test_fragment_rejects_foreign_next(self):
+        url = reverse("user-nav") + "?next=https://example.com/"
+        self.assertNotContains(self.client.get(url), "example.com")
+
+    def test_comment_link_fragment(self):
+        url = reverse("blog-comment-link", args=(1,))
+        self.assertContains(self.client.get(url), "to add a new comment")
+        self.client.login(username="testuser", password="12345")
+        self.assertContains(self.client.get(url), reverse("blog-comment", args=(1,)))
+
+    @override_settings(BLOG_ESI_FRAGMENTS=True)
+    def test_esi_includes(self):
+        response = self.client.get(reverse("blog-detail", args=(1,)))
+        self.assertContains(
+            response, '<esi:include src="/blog/fragments/user-nav?next=/blog/blog/1"/>'
+        )
+        self.assertNotContains(response, "deferred-fragment")
+
+
+class ReplicaRoutingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        blog_author = BlogAuthor.objects.create(user=cls.user, bio="Test bio")
+        cls.blog = Blog.objects.create(
+            name="Test Blog", author=blog_author, description="Test Description"
+        )
+
+    def test_blog_reads_follow_the_replica_block(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Blog))
+        with read_from("replica1"):
+            self.assertEqual(router.db_for_read(Blog), "replica1")
+            self.assertIsNone(router.db_for_read(User))
+            self.assertEqual(router.db_for_write(Blog), "default")
+        self.assertIsNone(router.db_for_read(Blog))
+
+    @override_settings(BLOG_READ_REPLICAS=["replica1", "replica2"])
+    def test_choose_replica(self):
+        request = RequestFactory().get("/")
+        self.assertIn(choose_replica(request), ["replica1", "replica2"])
+        request.COOKIES[PRIMARY_COOKIE] = "1"
+        self.assertIsNone(choose_replica(request))
+
+    @override_settings(BLOG_READ_REPLICAS=["replica1"])
+    def test_replicas_are_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate("replica1", "blog"))
+        self.assertIsNone(router.allow_migrate("default", "blog"))
+
+    @override_settings(BLOG_REPLICA_STICKY_SECONDS=15)
+    def test_commenting_pins_reads_to_primary(self):
+        self.client.login(username="testuser", password="12345")
+        response = self.client.post(
+            reverse("blog-comment", args=(self.blog.pk,)), {"description": "Hi"}
+        )
+        self.assertEqual(response.cookies[PRIMARY_COOKIE]["max-age"], 15)
+
+    @override_settings(BLOG_PAGE_CACHE=True, BLOG_READ_REPLICAS=["replica1"])
+    def test_cache_miss_after_write_renders_from_primary(self):
+        # replica1 isn't a configured database: reading from it would fail.
+        cache.clear()
+        BlogComment.objects.create(description="Hi", author=self.user, blog=self.blog)
+        response = self.client.get(reverse("blog-detail", args=(self.blog.pk,)))
+        self.assertContains(response, "Hi")
+
+    @override_settings(BLOG_PAGE_CACHE=True, BLOG_ANONYMOUS_SHELL=True)
+    def test_pinned_clients_bypass_the_page_cache(self):
+        request = RequestFactory().get("/")
+        self.assertTrue(BlogDetailView().cacheable(request))
+        request.COOKIES[PRIMARY_COOKIE] = "1"
+        self.assertFalse(BlogDetailView().cacheable(request))
+
+
+ASYNC_URL_NAMES = ["index", "blogs", "blogs-by-author", "blog-detail", "blog-comment"]
+
+
+class AsyncViewsTest(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        blog_author = BlogAuthor.objects.create(user=cls.user, bio="Test bio")
+        for i in range(1, 8):
+            blog = Blog.objects.create(
+                name=f"Test Blog {i}",
+                author=blog_author,
+                description=f"Test Blog {i} Description",
+            )
+            for j in range(3):
+                BlogComment.objects.create(
+                    description=f"Comment {j}", author=cls.user, blog=blog
+                )
+
+    def setUp(self):
+        self.use_urls(ASYNC_URL_NAMES)
+        self.addCleanup(self.use_urls, [])
+
+    def use_urls(self, async_views):
+        with self.settings(BLOG_ASYNC_VIEWS=async_views):
+            importlib.reload(blog_urls)
+        clear_url_caches()
+
+    def test_urls_are_async(self):
+        for pattern in blog_urls.urlpatterns:
+            self.assertEqual(
+                asyncio.iscoroutinefunction(pattern.callback),
+                pattern.name in ASYNC_URL_NAMES + ["blog-live-comments"],
+                pattern.name,
+            )
+
+    def test_within_query_budget(self):
+        self.assertWithinQueryBudget("index")
+        self.assertWithinQueryBudget("blogs")
+        self.assertWithinQueryBudget("blogs-by-author", args=(1,))
+        self.assertWithinQueryBudget("blog-detail", args=(1,))
+        self.client.login(username="testuser", password="12345")
+        self.assertWithinQueryBudget("blog-comment", args=(1,))
+
+    def test_pages_match_sync_views(self):
+        for settings in ({}, {"BLOG_CURSOR_PAGINATION": True}):
+            with self.settings(**settings):
+                for name, args in [
+                    ("blogs", ()),
+                    ("blogs-by-author", (1,)),
+                    ("blog-detail", (1,)),
+                ]:
+                    url = reverse(name, args=args)
+                    async_response = self.client.get(url, {"page": 2})
+                    self.use_urls([])
+                    sync_response = self.client.get(url, {"page": 2})
+                    self.use_urls(ASYNC_URL_NAMES)
+                    self.assertEqual(async_response.content, sync_response.content)
+
+    def test_missing_objects(self):
+        self.assertEqual(
+            self.client.get(reverse("blog-detail", args=(99,))).status_code, 404
+        )
+        self.assertEqual(
+            self.client.get(reverse("blogs", args=()), {"page": 9}).status_code, 404
+        )
+
+    def test_comment_create(self):
+        url = reverse("blog-comment", args=(1,))
+        self.assertRedirects(self.client.get(url), f"{reverse('login')}?next={url}")
+        self.client.login(username="testuser", password="12345")
+        response = self.client.post(url, {"description": "Async comment"})
+        self.assertRedirects(response, reverse("blog-detail", args=(1,)))
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        self.assertTrue(
+            BlogComment.objects.filter(description="Async comment", author=self.user)
+        )
+        self.assertEqual(Blog.objects.get(pk=1).comment_count, 4)
+
+    def test_budget_is_enforced(self):
+        @query_budget(0)
+        async def view(request):
+            return await Blog.objects.acount()
+
+        request = RequestFactory().get("/")
+        with self.settings(BLOG_QUERY_BUDGET_STRICT=True):
+            with self.assertRaises(QueryBudgetExceeded):
+                async_to_sync(view)(request)
+
+
+@override_settings(
+    BLOG_LIVE_COMMENTS=True, BLOG_LIVE_POLL_INTERVAL=10, BLOG_LIVE_HEARTBEAT=0.05
+)
+class LiveCommentsTest(TransactionTestCase):
+    # The publisher queries from its own thread, so test data must be committed.
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        blog_author = BlogAuthor.objects.create(user=self.user, bio="Test bio")
+        self.blog = Blog.objects.create(
+            name="Test Blog", author=blog_author, description="Test Description"
+        )
+        self.first = BlogComment.objects.create(
+            description="First comment", author=self.user, blog=self.blog
+        )
+        self.url = reverse("blog-live-comments", args=(self.blog.pk,))
+
+    def add_comment(self, description):
+        return BlogComment.objects.create(
+            description=description, author=self.user, blog=self.blog
+        )
+
+    async def next_event(self, chunks):
+        while True:
+            chunk = await asyncio.wait_for(anext(chunks), 5)
+            if not chunk.startswith((b":", b"retry:")):
+                return chunk.decode()
+
+    async def test_streams_missed_and_new_comments(self):
+        response = await self.async_client.get(self.url, {"after": 0})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+
+        event = await self.next_event(chunks)
+        self.assertIn(f"id: {self.first.pk}\nevent: comment\n", event)
+        self.assertIn("First comment", event)
+
+        second = await sync_to_async(self.add_comment)("Second comment")
+        event = await self.next_event(chunks)
+        self.assertIn(f"id: {second.pk}\n", event)
+        self.assertIn("Second comment", event)
+        await chunks.aclose()
+
+    async def test_one_poll_for_all_watchers(self):
+        with mock.patch("blog.live.fetch_events", wraps=fetch_events) as fetch:
+            subscriptions = [await publisher.subscribe(self.blog.pk) for _ in range(50)]
+            # Let the poller start before posting.
+            await asyncio.sleep(0.1)
+            comment = await sync_to_async(self.add_comment)("Hello everyone")
+            for subscription in subscriptions:
+                comment_id, event = await asyncio.wait_for(subscription.queue.get(), 5)
+                self.assertEqual(comment_id, comment.pk)
+            self.assertEqual(fetch.call_count, 1)
+        for subscription in subscriptions:
+            publisher.unsubscribe(subscription)
+
+    def test_requires_asgi(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    async def test_unknown_blog(self):
+        url = reverse("blog-live-comments", args=(99,))
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+
+class BlogExportViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        User.objects.create_user(username="staff", password="12345", is_staff=True)
+        blog_author = BlogAuthor.objects.create(user=cls.user, bio="Test bio")
+        for i in range(1, 4):
+            blog = Blog.objects.create(
+                name=f"Test Blog {i}",
+                author=blog_author,
+                description=f"Test Blog {i} Description",
+                post_date=dt.date(2020, i, 1),
+            )
+            BlogComment.objects.create(
+                description=f"Comment {i}", author=cls.user, blog=blog
+            )
+
+    def get(self, **params):
+        return self.client.get(reverse("blog-export"), params)
+
+    def test_staff_only(self):
+        self.assertEqual(self.get().status_code, 302)
+        self.client.login(username="testuser", password="12345")
+        self.assertEqual(self.get().status_code, 302)
+
+    def test_ndjson(self):
+        self.client.login(username="staff", password="12345")
+        response = self.get(since="2020-02-01")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [record["name"] for record in records], ["Test Blog 2", "Test Blog 3"]
+        )
+        self.assertEqual(records[0]["comments"][0]["description"], "Comment 2")
+
+    async def test_streamed_under_asgi(self):
+        await sync_to_async(self.async_client.login)(username="staff", password="12345")
+        response = await self.async_client.get(reverse("blog-export"))
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(
+            [json.loads(line)["name"] for line in content.splitlines()],
+            ["Test Blog 1", "Test Blog 2", "Test Blog 3"],
+        )
+
+    def test_csv_gzip(self):
+        self.client.login(username="staff", password="12345")
+        response = self.get(format="csv", gzip=1, until="2020-02-01")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn("blog-export.csv.gz", response["Content-Disposition"])
+        content = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertEqual(len(content.splitlines()), 3)
+        self.assertIn("Comment 1", content)
+
+    @override_settings(BLOG_ANONYMOUS_SHELL=True, BLOG_QUERY_BUDGET_STRICT=True)
+    def test_staff_lookup_is_not_charged_to_the_budget(self):
+        self.client.login(username="staff", password="12345")
+        self.assertEqual(self.get().status_code, 200)
+
+    def test_comments_are_streamed_apart_from_blogs(self):
+        # One query for the blogs and one for all their comments, whatever
+        # the number of chunks.
+        lines = export.export_lines("ndjson", chunk_size=1)
+        with self.assertNumQueries(2):
+            records = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [[c["description"] for c in r["comments"]] for r in records],
+            [["Comment 1"], ["Comment 2"], ["Comment 3"]],
+        )
+
+    def test_bad_parameters(self):
+        self.client.login(username="staff", password="12345")
+        self.assertEqual(self.get(format="xml").status_code, 400)
+        self.assertEqual(self.get(since="2020-13-01").status_code, 400)
+        self.assertEqual(
+            self.get(since="2020-03-01", until="2020-01-01").status_code, 400
+        )
+
+
+class SitemapViewTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        settings = self.settings(BLOG_SITEMAP_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_serves_rendered_files_without_sql(self):
+        (self.root / "sitemap.xml").write_text("<sitemapindex/>")
+        (self.root / "sitemap-blog-3.xml").write_text("<urlset/>")
+        with self.assertNumQueries(0):
+            index = self.client.get(reverse("sitemap"))
+            shard = self.client.get(
+                reverse("sitemap-shard", kwargs={"section": "blog", "number": 3})
+            )
+        self.assertEqual(b"".join(index.streaming_content), b"<sitemapindex/>")
+        self.assertEqual(b"".join(shard.streaming_content), b"<urlset/>")
+        response = self.client.get(
+            reverse("sitemap"), HTTP_IF_MODIFIED_SINCE=index["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_files(self):
+        self.assertEqual(self.client.get(reverse("sitemap")).status_code, 404)
+        url = reverse("sitemap-shard", kwargs={"section": "comment", "number": 0})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class JsonApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser", password="12345")
+        cls.blog_author = BlogAuthor.objects.create(user=cls.user, bio="Test Bio")
+        cls.blogs = [
+            Blog.objects.create(
+                name=f"Test Blog {i}",
+                author=cls.blog_author,
+                description=f"Test Blog {i} Description",
+                post_date=dt.date(2020, 1, 1 + i % 3),
+            )
+            for i in range(7)
+        ]
+        for i in range(5):
+            BlogComment.objects.create(
+                description=f"Comment {i}", author=cls.user, blog=cls.blogs[0]
+            )
+
+    def get_all(self, url, **params):
+        results = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            results += response.json()["results"]
+            url, params = response.json()["next"], {}
+        return results
+
+    def test_blogs_walk_every_row_once(self):
+        results = self.get_all(reverse("api-blogs"), limit=3)
+        expected = sorted(self.blogs, key=lambda blog: (blog.post_date, blog.pk))
+        self.assertEqual(
+            [result["id"] for result in results],
+            [blog.pk for blog in reversed(expected)],
+        )
+        self.assertEqual(
+            set(results[0]), {"id", "name", "post_date", "author", "author_name"}
+        )
+        self.assertEqual(results[0]["author_name"], "testuser")
+
+    def test_previous_page(self):
+        first = self.client.get(reverse("api-blogs"), {"limit": 3}).json()
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(self.client.get(second["previous"]).json(), first)
+
+    def test_sparse_fields_select_only_their_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("api-blogs"), {"fields": "name"})
+        self.assertEqual(response.json()["results"][0], {"name": "Test Blog 5"})
+        sql = queries[-1]["sql"]
+        self.assertNotIn("description", sql)
+        self.assertNotIn("JOIN", sql)
+
+    def test_bloggers_and_comments(self):
+        bloggers = self.get_all(reverse("api-bloggers"), fields="username,bio")
+        self.assertEqual(bloggers, [{"username": "testuser", "bio": "Test Bio"}])
+        url = reverse("api-blog-comments", args=(self.blogs[0].pk,))
+        comments = self.get_all(url, limit=2, fields="description,author_name")
+        self.assertEqual(
+            [comment["description"] for comment in comments],
+            [f"Comment {i}" for i in range(5)],
+        )
+        self.assertEqual(comments[0]["author_name"], "testuser")
+
+    def test_bloggers_without_user(self):
+        for i in range(3):
+            BlogAuthor.objects.create(user=None, bio=f"Orphan {i}")
+        bloggers = self.get_all(reverse("api-bloggers"), limit=2)
+        self.assertEqual(
+            [blogger["id"] for blogger in bloggers],
+            list(BlogAuthor.objects.order_by("id").values_list("id", flat=True)),
+        )
+
+    def test_errors(self):
+        for params in ({"fields": "id,password"}, {"limit": 0}, {"cursor": "bogus"}):
+            response = self.client.get(reverse("api-blogs"), params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.json())
+        url = reverse("api-blog-comments", args=(999,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class StaticFilesTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        (self.root / "css").mkdir()
+        (self.root / "img").mkdir()
+        self.css = 'body { background: url("../img/dot.svg"); }\n' * 50
+        (self.root / "css" / "site.css").write_text(self.css)
+        (self.root / "img" / "dot.svg").write_text("<svg></svg>")
+        settings = self.settings(STATIC_ROOT=directory.name, STATIC_URL="/static/")
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # What collectstatic does once the files are copied.
+        paths = {
+            name: (staticfiles_storage, name)
+            for name in ("css/site.css", "img/dot.svg")
+        }
+        list(staticfiles_storage.post_process(paths))
+        self.hashed = staticfiles_storage.stored_name("css/site.css")
+
+    def test_collectstatic_writes_compressed_variants(self):
+        self.assertRegex(self.hashed, r"^css/site\.[0-9a-f]{12}\.css$")
+        content = (self.root / self.hashed).read_bytes()
+        self.assertIn(b"../img/dot.", content)
+        self.assertEqual(
+            gzip.decompress((self.root / f"{self.hashed}.gz").read_bytes()), content
+        )
+        self.assertEqual(
+            brotli.decompress((self.root / f"{self.hashed}.br").read_bytes()), content
+        )
+
+    def test_hashed_files_are_immutable_and_precompressed(self):
+        url = f"/static/{self.hashed}"
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(
+            response["Cache-Control"], "public, max-age=31536000, immutable"
+        )
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        body = b"".join(response.streaming_content)
+        self.assertEqual(
+            brotli.decompress(body).decode(),
+            staticfiles_storage.open(self.hashed).read().decode(),
+        )
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br;q=0")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        response = self.client.get(url)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_unhashed_files_are_revalidated(self):
+        response = self.client.get("/static/css/site.css")
+        self.assertEqual(response["Cache-Control"], "public, no-cache")
+        self.assertEqual(b"".join(response.streaming_content).decode(), self.css)
+
+    def test_unknown_files_fall_through(self):
+        self.assertEqual(self.client.get("/static/css/missing.css").status_code, 404)
+        self.assertEqual(self.client.get("/static/../manage.py").status_code, 404)
+
+    async def test_served_from_the_event_loop(self):
+        async def get_response(request):
+            return HttpResponse("view")
+
+        middleware = StaticFilesMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await self.async_client.get("/static/css/site.css")
+        self.assertEqual(response["Cache-Control"], "public, no-cache")
+        self.assertEqual(response["Content-Length"], str(len(self.css)))
+        self.assertTrue(response.is_async)
+        content = b"".join([block async for block in response.streaming_content])
+        self.assertEqual(content.decode(), self.css)
+        response = await self.async_client.get(
+            "/static/css/site.css", headers={"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(
+            (await self.async_client.get("/static/css/missing.css")).status_code, 404
+        )
+
+    @override_settings(BLOG_SERVE_STATIC=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            StaticFilesMiddleware(lambda request: HttpResponse())
+        self.assertEqual(self.client.get("/static/css/site.css").status_code, 404)
+
+
+@override_settings(BLOG_METRICS=True)
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username="testuser", password="12345")
+        author = BlogAuthor.objects.create(user=user, bio="Test Bio")
+        cls.blog = Blog.objects.create(
+            name="Test Blog 1", author=author, description="Test Blog 1 Description"
+        )
+        cls.staff = User.objects.create(username="staff", is_staff=True)
+
+    def sample(self, name, labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_measured_by_url_name(self):
+        labels = {"view": "blog-detail"}
+        count = self.sample("blog_request_duration_seconds_count", labels)
+        queries = self.sample("blog_request_queries_sum", labels)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("blog-detail", args=(self.blog.pk,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.sample("blog_request_duration_seconds_count", labels), count + 1
+        )
+        self.assertEqual(
+            self.sample("blog_request_queries_sum", labels),
+            queries + len(captured),
+        )
+        self.assertGreater(
+            self.sample("blog_request_template_duration_seconds_sum", labels), 0
+        )
+        self.assertGreater(self.sample("blog_response_size_bytes_sum", labels), 0)
+        self.assertEqual(
+            self.sample(
+                "blog_requests_total",
+                {"view": "blog-detail", "method": "GET", "status": "200"},
+            ),
+            self.sample("blog_request_duration_seconds_count", labels),
+        )
+        self.assertRegex(
+            response["Server-Timing"],
+            rf'^db;dur=[\d.]+;desc="{len(captured)} queries", '
+            r"tpl;dur=[\d.]+, total;dur=[\d.]+$",
+        )
+
+    async def test_asgi_requests_are_measured(self):
+        url = reverse("blog-detail", args=(self.blog.pk,))
+        middleware = MetricsMiddleware(self.async_client.handler.get_response_async)
+        self.assertTrue(iscoroutinefunction(middleware))
+        expected = (await sync_to_async(self.client.get)(url))["Server-Timing"]
+        response = await self.async_client.get(url)
+        queries = r'desc="([1-9]\d*) queries"'
+        self.assertEqual(
+            re.search(queries, response["Server-Timing"]).group(1),
+            re.search(queries, expected).group(1),
+        )
+
+    def test_unresolved_urls_share_a_label(self):
+        self.client.get("/blog/nowhere")
+        self.assertGreater(
+            self.sample("blog_request_duration_seconds_count", {"view": "unresolved"}),
+            0,
+        )
+
+    def test_endpoint_is_for_staff_and_local_clients(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="10.0.0.1").status_code, 404)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(
+            b"# TYPE blog_request_duration_seconds histogram", response.content
+        )
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="10.0.0.1").status_code, 200)
+
+    @override_settings(BLOG_ANONYMOUS_SHELL=True, BLOG_QUERY_BUDGET_STRICT=True)
+    def test_staff_lookup_is_not_charged_to_the_budget(self):
+        # With the page shell the user is only loaded by the access check.
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(BLOG_METRICS=False)
+    def test_disabled(self):
+        response = self.client.get(reverse("blog-detail", args=(self.blog.pk,)))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+
+@override_settings(BLOG_SLOW_QUERIES=True, BLOG_SLOW_QUERY_MS=0)
+class SlowQueryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username="testuser", password="12345")
+        BlogAuthor.objects.create(user=user, bio="Test Bio")
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint(
+                'SELECT "t"."id"  FROM "t" WHERE "t"."id" IN (%s, %s, %s)\n'
+                "AND \"t\".\"name\" = 'it''s' LIMIT 21"
+            ),
+            'SELECT "t"."id" FROM "t" WHERE "t"."id" IN (...) '
+            'AND "t"."name" = ? LIMIT ?',
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO "t2" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO "t2" ("a", "b") VALUES (?, ?), ...',
+        )
+
+    def test_rolling_window(self):
+        now = [0.0]
+        stats = QueryStats(60, slots=6, clock=lambda: now[0])
+        stats.add("a", 1.0)
+        stats.add("b", 0.5)
+        now[0] = 30
+        stats.add("b", 0.75)
+        self.assertEqual(stats.top(), [("b", 2, 1.25, 0.75), ("a", 1, 1.0, 1.0)])
+        self.assertEqual(stats.top(1), [("b", 2, 1.25, 0.75)])
+        now[0] = 65
+        self.assertEqual(stats.top(), [("b", 1, 0.75, 0.75)])
+
+    def test_slow_queries_are_logged_with_their_origin(self):
+        # The views load their rows before rendering: have a template query.
+        request = RequestFactory().get(reverse("bloggers"))
+        request.resolver_match = resolve(request.path)
+        request.user = AnonymousUser()
+        recorder = SlowQueryRecorder(request, 0)
+        with self.assertLogs("blog.slowqueries", "WARNING") as logs:
+            with connection.execute_wrapper(recorder):
+                render_to_string(
+                    "blog/blogauthor_list.html",
+                    {"blogauthor_list": BlogAuthor.objects.select_related("user")},
+                    request,
+                )
+        records = [record for record in logs.records if record.template]
+        self.assertTrue(records)
+        record = records[0]
+        self.assertEqual(record.url_name, "bloggers")
+        self.assertEqual(record.view, "BloggerListView")
+        self.assertRegex(record.template, r"^blog/blogauthor_list\.html:\d+$")
+        self.assertIn("blog_blogauthor", record.fingerprint)
+        self.assertFalse(record.code.startswith("blog/metrics.py"))
+
+    async def test_asgi_requests_are_recorded(self):
+        middleware = SlowQueryMiddleware(self.async_client.handler.get_response_async)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.assertLogs("blog.slowqueries", "WARNING") as logs:
+            response = await self.async_client.get(reverse("bloggers"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any(record.url_name == "bloggers" for record in logs.records))
+
+    @override_settings(BLOG_SLOW_QUERY_MS=60000)
+    def test_top_fingerprints(self):
+        with self.assertNoLogs("blog.slowqueries"):
+            self.client.get(reverse("bloggers"))
+        self.assertEqual(
+            self.client.get(
+                reverse("slow-queries"), REMOTE_ADDR="10.0.0.1"
+            ).status_code,
+            404,
+        )
+        queries = self.client.get(reverse("slow-queries")).json()["queries"]
+        self.assertTrue(
+            any('FROM "blog_blogauthor"' in query["fingerprint"] for query in queries)
+        )
+        for top, expected in (("-5", 1), ("0", 1), ("1000", len(queries))):
+            response = self.client.get(reverse("slow-queries"), {"top": top})
+            self.assertEqual(len(response.json()["queries"]), expected, top)
+
+    @override_settings(BLOG_PROFILING=True)
+    def test_middleware_is_not_blamed(self):
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+        with self.assertLogs("blog.slowqueries", "WARNING") as logs:
+            # The user is loaded by the profiling and metrics access checks.
+            self.client.get(reverse("bloggers"), {"profile": "1"})
+            self.client.get(reverse("slow-queries"), REMOTE_ADDR="10.0.0.1")
+        for record in logs.records:
+            self.assertFalse(
+                record.code
+                and record.code.startswith(
+                    ("blog/staticfiles.py", "blog/profiling.py")
+                ),
+                record.code,
+            )
+
+    @override_settings(
+        BLOG_ANONYMOUS_SHELL=True,
+        BLOG_QUERY_BUDGET_STRICT=True,
+        BLOG_SLOW_QUERY_MS=60000,
+    )
+    def test_staff_lookup_is_not_charged_to_the_budget(self):
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+        response = self.client.get(reverse("slow-queries"), REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(BLOG_PROFILING=True)
+class ProfilingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser("staff", "staff@example.com", "x")
+
+    def test_unsampled_requests_are_not_profiled(self):
+        response = self.client.get(reverse("bloggers"), {"profile": "1"})
+        self.assertFalse(response.has_header("X-Profile-Id"))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_staff_users_profile_on_demand(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("bloggers"), {"profile": "1"})
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response["X-Profile-Id"], str(profile.pk))
+        self.assertEqual(profile.trigger, "staff")
+        self.assertEqual(profile.path, "/blog/bloggers/?profile=1")
+        self.assertEqual(profile.url_name, "bloggers")
+        self.assertEqual(profile.view, "BloggerListView")
+        self.assertEqual(profile.status_code, 200)
+        self.assertIn("_render_and_count", top_functions(profile.stats))
+
+    def test_signed_token(self):
+        response = self.client.get(reverse("index"), {"profile": make_token()})
+        self.assertTrue(response.has_header("X-Profile-Id"))
+        self.assertEqual(RequestProfile.objects.get().trigger, "token")
+        response = self.client.get(reverse("index"), {"profile": "profile:x:y"})
+        self.assertFalse(response.has_header("X-Profile-Id"))
+        with override_settings(BLOG_PROFILE_TOKEN_MAX_AGE=-1):
+            response = self.client.get(reverse("index"), {"profile": make_token()})
+        self.assertFalse(response.has_header("X-Profile-Id"))
+
+    async def test_asgi_requests(self):
+        middleware = ProfilingMiddleware(self.async_client.handler.get_response_async)
+        self.assertTrue(iscoroutinefunction(middleware))
+        await sync_to_async(self.async_client.force_login)(self.staff)
+        response = await self.async_client.get(reverse("bloggers"), {"profile": "1"})
+        profile = await RequestProfile.objects.aget()
+        self.assertEqual(response["X-Profile-Id"], str(profile.pk))
+        self.assertEqual(profile.trigger, "staff")
+        self.assertEqual(profile.url_name, "bloggers")
+        response = await self.async_client.get(reverse("index"))
+        self.assertFalse(response.has_header("X-Profile-Id"))
+
+    @override_settings(BLOG_PROFILE_SAMPLE_RATE=1, BLOG_PROFILE_KEEP=2)
+    def test_sampled_requests_and_retention(self):
+        ids = [self.client.get(reverse("index"))["X-Profile-Id"] for _ in range(3)]
+        self.assertEqual(
+            [str(pk) for pk in RequestProfile.objects.values_list("pk", flat=True)],
+            ids[:0:-1],
+        )
+        self.assertEqual(RequestProfile.objects.first().trigger, "sample")
+
+    @override_settings(BLOG_PROFILE_SAMPLE_RATE=1)
+    def test_admin_lists_and_shows_profiles(self):
+        pk = self.client.get(reverse("index"))["X-Profile-Id"]
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("admin:blog_requestprofile_changelist"))
+        self.assertContains(response, "/blog/")
+        response = self.client.get(
+            reverse("admin:blog_requestprofile_change", args=[pk])
+        )
+        self.assertContains(response, "Top functions by own time")
+        self.assertContains(response, "render_index")
+        response = self.client.get(
+            reverse("admin:blog_requestprofile_download", args=[pk])
+        )
+        self.assertEqual(
+            response["Content-Disposition"], f'attachment; filename="profile-{pk}.prof"'
+        )
+        stats = marshal.loads(response.content)
+        self.assertIn("render_index", {function for _, _, function in stats})
@@ -1,17 +1,90 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, async_views, feeds, metrics, slowqueries, views
+
+
+def pick(name, view, async_view):
+    """
+    Return the async implementation of a URL if BLOG_ASYNC_VIEWS names it.
+    """
+    return async_view if name in settings.BLOG_ASYNC_VIEWS else view
 
 
 urlpatterns = [
-    path("", views.index, name="index"),
-    path("blogs/", views.BlogListView.as_view(), name="blogs"),
+    path("", pick("index", views.index, async_views.index), name="index"),
+    path(
+        "blogs/",
+        pick("blogs", views.BlogListView.as_view(), async_views.blog_list),
+        name="blogs",
+    ),
+    path(
+        "blogger/<int:pk>",
+        pick(
+            "blogs-by-author",
+            views.BlogListByAuthorView.as_view(),
+            async_views.blog_list_by_author,
+        ),
+        name="blogs-by-author",
+    ),
+    path(
+        "blog/<int:pk>",
+        pick("blog-detail", views.BlogDetailView.as_view(), async_views.blog_detail),
+        name="blog-detail",
+    ),
+    path(
+        "blogger/<int:pk>/feed",
+        feeds.blogs_by_author_feed,
+        name="blogs-by-author-feed",
+    ),
     path(
-        "blogger/<int:pk>", views.BlogListByAuthorView.as_view(), name="blogs-by-author"
+        "blogger/<int:pk>/atom",
+        feeds.blogs_by_author_atom,
+        name="blogs-by-author-atom",
     ),
-    path("blog/<int:pk>", views.BlogDetailView.as_view(), name="blog-detail"),
+    path("blogs/feed/", feeds.blogs_feed, name="blogs-feed"),
+    path("blogs/atom/", feeds.blogs_atom, name="blogs-atom"),
     path("bloggers/", views.BloggerListView.as_view(), name="bloggers"),
+    path("search/", views.BlogSearchView.as_view(), name="blog-search"),
+    path("export/", views.export_blog, name="blog-export"),
+    path("api/blogs/", api.blog_list, name="api-blogs"),
+    path("api/bloggers/", api.blogger_list, name="api-bloggers"),
+    path(
+        "api/blog/<int:pk>/comments/",
+        api.blog_comment_list,
+        name="api-blog-comments",
+    ),
+    path("sitemap.xml", views.sitemap, name="sitemap"),
+    path(
+        "sitemap-<slug:section>-<int:number>.xml",
+        views.sitemap,
+        name="sitemap-shard",
+    ),
+    path("metrics", metrics.prometheus_metrics, name="metrics"),
+    path("slow-queries", slowqueries.slow_queries, name="slow-queries"),
+    path("fragments/user-nav", views.user_nav, name="user-nav"),
+    path(
+        "fragments/blog/<int:pk>/comment-link",
+        views.comment_link,
+        name="blog-comment-link",
+    ),
+    path(
+        "blog/<int:pk>/comments/live",
+        async_views.live_comments,
+        name="blog-live-comments",
+    ),
+    path(
+        "blog/<int:pk>/comments",
+        views.BlogCommentListView.as_view(),
+        name="blog-comments",
+    ),
     path(
-        "blog/<int:pk>/create", views.BlogCommentCreate.as_view(), name="blog-comment"
+        "blog/<int:pk>/create",
+        pick(
+            "blog-comment",
+            views.BlogCommentCreate.as_view(),
+            async_views.blog_comment_create,
+        ),
+        name="blog-comment",
     ),
 ]
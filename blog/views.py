@@ -1,66 +1,329 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.views import generic
 from django.urls import reverse
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.cache import never_cache
+from django.views.static import serve
 from django.views.generic.edit import CreateView
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-from .models import Blog, BlogAuthor, BlogComment
+from .cache import CachedPageMixin, author_key, blog_key
+from . import export, sitemaps
+from .conditional import ConditionalGetMixin, ListConditionalGetMixin
+from .models import Blog, BlogAuthor, BlogComment, SitemapShard
+from .pagination import CursorPaginationMixin, CursorPaginator, InvalidCursor
+from .querybudget import QueryBudgetMixin, query_budget
+from .routers import ReplicaReadMixin, choose_replica, pin_to_primary
+from .search import search_blogs
 
 
+VISITS_COOKIE = "cnt_visits"
+VISITS_COOKIE_SALT = "blog.views.index"
+
+
+@query_budget(0)
 def index(request):
     """
     View function for home page of site.
     """
-    request.session["cnt_visits"] = 1 + request.session.get("cnt_visits", 0)
+    return render_index(request)
+
+
+def render_index(request):
+    """
+    Render the home page; shared by the sync and async index views.
+    """
+    # The visit counter lives in a signed cookie rather than the session, so the
+    # home page never writes (or creates) a django_session row.
+    try:
+        cnt_visits = 1 + int(
+            request.get_signed_cookie(VISITS_COOKIE, default=0, salt=VISITS_COOKIE_SALT)
+        )
+    except ValueError:
+        cnt_visits = 1
     context = {
-        "cnt_visits": request.session["cnt_visits"],
-        "request_session": request.session,
+        "cnt_visits": cnt_visits,
     }
     # Render the HTML template index.html
-    return render(request, "index.html", context)
+    response = render(request, "index.html", context)
+    response.set_signed_cookie(
+        VISITS_COOKIE,
+        cnt_visits,
+        salt=VISITS_COOKIE_SALT,
+        max_age=365 * 24 * 60 * 60,
+        httponly=True,
+        samesite="Lax",
+    )
+    return response
+
+
+def _safe_next(request):
+    """
+    Return the `next` query parameter if it points back into this site.
+    """
+    next_url = request.GET.get("next", "/")
+    if not url_has_allowed_host_and_scheme(
+        next_url, {request.get_host()}, request.is_secure()
+    ):
+        return "/"
+    return next_url
+
+
+@never_cache
+@query_budget(2)  # Session and user lookups.
+def user_nav(request):
+    """
+    Per-user sidebar fragment (username, login/logout) of the shared page shell.
+    """
+    return render(
+        request, "blog/fragments/user_nav.html", {"next": _safe_next(request)}
+    )
+
+
+@never_cache
+@query_budget(2)  # Session and user lookups.
+def comment_link(request, pk):
+    """
+    Per-user "add a comment" fragment of the shared blog detail page.
+    """
+    return render(
+        request,
+        "blog/fragments/comment_link.html",
+        {"blog_id": pk, "next": _safe_next(request)},
+    )
+
+
+@staff_member_required
+@query_budget(0)  # Rows are read as the response streams, after the view.
+def export_blog(request):
+    """
+    Staff-only streaming download of the export_blog command's output.
+    """
+    fmt = request.GET.get("format", "ndjson")
+    if fmt not in export.FORMATS:
+        return HttpResponseBadRequest(f"Unknown format {fmt!r}.")
+    try:
+        since, until = export.parse_date_range(
+            request.GET.get("since"), request.GET.get("until")
+        )
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    compress = bool(request.GET.get("gzip"))
+    lines = export.export_lines(fmt, since, until, using=choose_replica(request))
+    content = export.encode(lines, compress)
+    if isinstance(request, ASGIRequest):
+        content = export.aiterate(content)
+    response = StreamingHttpResponse(
+        content, content_type="application/gzip" if compress else export.FORMATS[fmt]
+    )
+    filename = f"blog-export.{fmt}" + (".gz" if compress else "")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
 
 
-class BlogListView(generic.ListView):
+@query_budget(0)
+def sitemap(request, section=None, number=None):
+    """
+    Serve the sitemap index or one shard from the files rendered by the
+    build_sitemaps command; better still, let the web server do it.
+    """
+    if section is None:
+        filename = sitemaps.INDEX_FILENAME
+    elif section in SitemapShard.SECTIONS:
+        filename = sitemaps.shard_filename(section, number)
+    else:
+        raise Http404("Unknown sitemap section.")
+    return serve(request, filename, document_root=settings.BLOG_SITEMAP_ROOT)
+
+
+class BlogListView(
+    ReplicaReadMixin,
+    CachedPageMixin,
+    QueryBudgetMixin,
+    ListConditionalGetMixin,
+    CursorPaginationMixin,
+    generic.ListView,
+):
     """
     Generic class-based view for a list of all blogs.
     """
 
     model = Blog
     paginate_by = 5
+    cursor_ordering = ("-post_date", "-id")
+    cursor_count_mode = "estimate"
+    query_budget = 2
+
+    def get_queryset(self):
+        """
+        Return blogs with their author and the author's user joined in.
+        """
+        return Blog.objects.select_related("author__user")
 
+    def get_validator_row(self, blog):
+        # Author names are shown; BlogAuthor.modified moves with the username.
+        return (blog.pk, blog.modified, blog.author and blog.author.modified)
 
-class BlogDetailView(generic.DetailView):
+
+class BlogDetailView(
+    ReplicaReadMixin,
+    CachedPageMixin,
+    QueryBudgetMixin,
+    ConditionalGetMixin,
+    generic.DetailView,
+):
     """
     Generic class-based detail view for a blog.
     """
 
     model = Blog
+    query_budget = 2
+
+    def get_queryset(self):
+        """
+        Return blogs with the author and the author's user joined in.
+        """
+        return Blog.objects.select_related("author__user")
 
+    def get_cache_dependencies(self):
+        return [blog_key(self.kwargs["pk"])]
 
-class BloggerListView(generic.ListView):
+    def get_validator_state(self):
+        """
+        Blog.modified also moves when the blog's comments change, and the
+        author's when their username does. The blog is kept for the render.
+        """
+        self.object = self.get_object()
+        rows = [(self.object.pk, self.object.modified)]
+        if self.object.author is not None:
+            rows.append((self.object.author.pk, self.object.author.modified))
+        return rows, (settings.BLOG_COMMENTS_NEWEST_FIRST,)
+
+    def get_object(self, queryset=None):
+        if hasattr(self, "object"):
+            return self.object
+        return super(BlogDetailView, self).get_object(queryset)
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the first page of comments; the rest is loaded from BlogCommentListView.
+        """
+        context = super(BlogDetailView, self).get_context_data(**kwargs)
+        context["comment_page"] = comment_paginator(self.object.pk).page()
+        return context
+
+
+def comment_paginator(blog_id):
+    """
+    Return a keyset paginator over a blog's comments with their authors joined in.
+    """
+    if settings.BLOG_COMMENTS_NEWEST_FIRST:
+        ordering = ("-post_date", "-id")
+    else:
+        ordering = ("post_date", "id")
+    return CursorPaginator(
+        BlogComment.objects.filter(blog_id=blog_id).select_related("author"),
+        settings.BLOG_COMMENTS_PER_PAGE,
+        ordering,
+    )
+
+
+class BlogCommentListView(
+    ReplicaReadMixin, CachedPageMixin, QueryBudgetMixin, generic.TemplateView
+):
+    """
+    Rendered fragment with the next page of comments for a blog ("load more").
+    """
+
+    template_name = "blog/blogcomment_list.html"
+    query_budget = 1
+
+    def get_cache_dependencies(self):
+        return [blog_key(self.kwargs["pk"])]
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the page of comments following the `cursor` query parameter.
+        """
+        context = super(BlogCommentListView, self).get_context_data(**kwargs)
+        try:
+            context["comment_page"] = comment_paginator(self.kwargs["pk"]).page(
+                self.request.GET.get("cursor")
+            )
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        context["blog_id"] = self.kwargs["pk"]
+        return context
+
+
+class BloggerListView(
+    ReplicaReadMixin,
+    CachedPageMixin,
+    QueryBudgetMixin,
+    ListConditionalGetMixin,
+    CursorPaginationMixin,
+    generic.ListView,
+):
     """
     Generic class-based view for a list of bloggers.
     """
 
     model = BlogAuthor
     paginate_by = 5
+    # Not the model's (user, id) ordering: user is NULL for bloggers whose
+    # user was deleted, and a NULL cursor key can't be compared.
+    cursor_ordering = ("id",)
+    cursor_count_mode = "estimate"
+    query_budget = 2
+
+    def get_queryset(self):
+        """
+        Return bloggers with their user joined in (used by BlogAuthor.__str__).
+        """
+        return BlogAuthor.objects.select_related("user")
 
 
-class BlogListByAuthorView(generic.ListView):
+class BlogListByAuthorView(
+    ReplicaReadMixin,
+    CachedPageMixin,
+    QueryBudgetMixin,
+    ListConditionalGetMixin,
+    CursorPaginationMixin,
+    generic.ListView,
+):
     """
     Generic class-based view for a list of blogs posted by a particular BlogAuthor.
     """
 
     model = Blog
     paginate_by = 5
+    cursor_ordering = ("-post_date", "-id")
     template_name = "blog/blog_list_by_author.html"
+    query_budget = 3
+
+    def get_cache_dependencies(self):
+        return [author_key(self.kwargs["pk"])]
+
+    def get_validator_state(self):
+        """
+        Validate the blogger's name and bio along with the page of their blogs.
+        """
+        rows, extra = super(BlogListByAuthorView, self).get_validator_state()
+        return rows + [(self.blogger.pk, self.blogger.modified)], extra
 
     def get_queryset(self):
         """
         Return list of Blog objects created by BlogAuthor (author id specified in URL)
         """
-        target_author = get_object_or_404(BlogAuthor, pk=self.kwargs["pk"])
-        return Blog.objects.filter(author=target_author)
+        if not hasattr(self, "blogger"):
+            self.blogger = get_object_or_404(
+                BlogAuthor.objects.select_related("user"), pk=self.kwargs["pk"]
+            )
+        return Blog.objects.filter(author=self.blogger)
 
     def get_context_data(self, **kwargs):
         """
@@ -68,12 +331,12 @@ class BlogListByAuthorView(generic.ListView):
         """
         # Call the base implementation first to get a context
         context = super(BlogListByAuthorView, self).get_context_data(**kwargs)
-        # Get the blogger object from the "pk" URL parameter and add it to the context
-        context["blogger"] = get_object_or_404(BlogAuthor, pk=self.kwargs["pk"])
+        # Reuse the blogger already loaded by get_queryset
+        context["blogger"] = self.blogger
         return context
 
 
-class BlogCommentCreate(LoginRequiredMixin, CreateView):
+class BlogCommentCreate(QueryBudgetMixin, LoginRequiredMixin, CreateView):
     """
     Form for adding a blog comment.
     """
@@ -82,6 +345,16 @@ class BlogCommentCreate(LoginRequiredMixin, CreateView):
     fields = [
         "description",
     ]
+    # Blog lookup, plus the insert and counter update on POST.
+    query_budget = 3
+
+    def get_blog(self):
+        """
+        Return the blog being commented on, loading it at most once per request.
+        """
+        if not hasattr(self, "blog"):
+            self.blog = get_object_or_404(Blog, pk=self.kwargs["pk"])
+        return self.blog
 
     def get_context_data(self, **kwargs):
         """
@@ -90,7 +363,7 @@ class BlogCommentCreate(LoginRequiredMixin, CreateView):
         # Call the base implementation first to get a context
         context = super(BlogCommentCreate, self).get_context_data(**kwargs)
         # Get the blog from id and add it to the context
-        context["blog"] = get_object_or_404(Blog, pk=self.kwargs["pk"])
+        context["blog"] = self.get_blog()
         return context
 
     def form_valid(self, form):
@@ -100,9 +373,11 @@ class BlogCommentCreate(LoginRequiredMixin, CreateView):
         # Add logged-in user as author of comment
         form.instance.author = self.request.user
         # Associate comment with blog based on passed id
-        form.instance.blog = get_object_or_404(Blog, pk=self.kwargs["pk"])
+        form.instance.blog = self.get_blog()
         # Call super-class form validation behaviour
-        return super(BlogCommentCreate, self).form_valid(form)
+        response = super(BlogCommentCreate, self).form_valid(form)
+        # Show the author their comment even before the replicas have it.
+        return pin_to_primary(response)
 
     def get_success_url(self):
         """
@@ -114,3 +389,29 @@ class BlogCommentCreate(LoginRequiredMixin, CreateView):
                 "pk": self.kwargs["pk"],
             },
         )
+
+
+class BlogSearchView(QueryBudgetMixin, generic.TemplateView):
+    """
+    Full-text search over blog names and descriptions.
+    """
+
+    template_name = "blog/blog_search.html"
+    paginate_by = 10
+    # FTS5 match and the blogs (with authors) of the page.
+    query_budget = 2
+
+    def get_context_data(self, **kwargs):
+        """
+        Add ranked results with highlighted snippets and the next page cursor.
+        """
+        context = super(BlogSearchView, self).get_context_data(**kwargs)
+        query = self.request.GET.get("q", "").strip()
+        try:
+            results, next_cursor = search_blogs(
+                query, self.paginate_by, self.request.GET.get("cursor")
+            )
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        context.update(query=query, results=results, next_cursor=next_cursor)
+        return context
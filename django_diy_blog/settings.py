@@ -50,10 +50,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "blog.staticfiles.StaticFilesMiddleware",
+    "blog.metrics.MetricsMiddleware",
+    "blog.slowqueries.SlowQueryMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "django.middleware.http.ConditionalGetMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "blog.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -62,7 +67,7 @@ ROOT_URLCONF = "django_diy_blog.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "blog.metrics.DjangoTemplates",
         "DIRS": [os.path.join(BASE_DIR, "templates")],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -71,6 +76,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "blog.context_processors.page_shell",
             ],
         },
     },
@@ -83,10 +89,39 @@ WSGI_APPLICATION = "django_diy_blog.wsgi.application"
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+    "default": env.db("DATABASE_URL", default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+}
+
+# Pragmas applied to every new SQLite connection (see blog.db): a named
+# profile ("off", "production" or "durable") plus per-pragma overrides, e.g.
+# SQLITE_PRAGMAS=busy_timeout=10000,synchronous=full
+SQLITE_PRAGMA_PROFILE = env("SQLITE_PRAGMA_PROFILE", default="production")
+SQLITE_PRAGMAS = env.dict("SQLITE_PRAGMAS", default={})
+
+# Read replicas for the read-only blog views (see blog.routers), e.g.
+# DATABASE_REPLICA_URLS=sqlite:////var/lib/blog/replica1.sqlite3,sqlite:////...
+# They are refreshed from the primary by `manage.py sync_replicas --interval N`.
+# After posting, a client reads from the primary for BLOG_REPLICA_STICKY_SECONDS,
+# and so do pages missing from the page cache after any write.
+BLOG_READ_REPLICAS = []
+for number, url in enumerate(env.list("DATABASE_REPLICA_URLS", default=[]), 1):
+    alias = f"replica{number}"
+    DATABASES[alias] = environ.Env.db_url_config(url)
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    BLOG_READ_REPLICAS.append(alias)
+BLOG_REPLICA_STICKY_SECONDS = env.int("BLOG_REPLICA_STICKY_SECONDS", default=30)
+
+DATABASE_ROUTERS = ["blog.routers.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The in-process default is per worker; point CACHE_URL at a shared backend
+# (e.g. filecache:///var/tmp/django_cache or pymemcache://127.0.0.1:11211) so
+# page cache invalidation reaches every gunicorn worker.
+
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
 }
 
 
@@ -125,6 +160,16 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = "static/"
+STATIC_ROOT = env("STATIC_ROOT", default="") or str(BASE_DIR / "staticfiles")
+
+# collectstatic fingerprints file names and writes gzip and brotli variants;
+# BLOG_SERVE_STATIC serves them from STATIC_ROOT with far-future caching
+# (turn it off when the web server serves STATIC_ROOT itself).
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "blog.storage.CompressedManifestStaticFilesStorage"},
+}
+BLOG_SERVE_STATIC = env.bool("BLOG_SERVE_STATIC", default=True)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -133,4 +178,75 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 LOGIN_REDIRECT_URL = "/"
 
+# Keyset pagination for the blog list views: constant-time deep pages,
+# opaque ?cursor= links instead of ?page=N.
+BLOG_CURSOR_PAGINATION = env.bool("BLOG_CURSOR_PAGINATION", default=False)
+
+# Comments on the blog detail page are served in pages of this size.
+BLOG_COMMENTS_PER_PAGE = env.int("BLOG_COMMENTS_PER_PAGE", default=20)
+BLOG_COMMENTS_NEWEST_FIRST = env.bool("BLOG_COMMENTS_NEWEST_FIRST", default=False)
+
+# Serve anonymous blog pages from the cache, invalidated by model changes.
+BLOG_PAGE_CACHE = env.bool("BLOG_PAGE_CACHE", default=False)
+BLOG_PAGE_CACHE_TIMEOUT = env.int("BLOG_PAGE_CACHE_TIMEOUT", default=3600)
+BLOG_PAGE_CACHE_ALIAS = "default"
+
+# Render one HTML shell for every visitor and load the per-user bits (sidebar
+# login state, "add a comment" link) from fragment URLs, either with a small
+# script or as <esi:include> tags for an ESI-capable reverse proxy.
+BLOG_ANONYMOUS_SHELL = env.bool("BLOG_ANONYMOUS_SHELL", default=False)
+BLOG_ESI_FRAGMENTS = env.bool("BLOG_ESI_FRAGMENTS", default=False)
+
+# Push new comments to open blog detail pages over server-sent events. The
+# stream is an async view and needs an ASGI server (django_diy_blog.asgi).
+# Each worker polls for new comments on all watched blogs once per interval;
+# streams are closed after BLOG_LIVE_MAX_AGE seconds and the browser resumes
+# them from the last comment it received.
+BLOG_LIVE_COMMENTS = env.bool("BLOG_LIVE_COMMENTS", default=False)
+BLOG_LIVE_POLL_INTERVAL = env.float("BLOG_LIVE_POLL_INTERVAL", default=2.0)
+BLOG_LIVE_HEARTBEAT = 15
+BLOG_LIVE_MAX_AGE = env.int("BLOG_LIVE_MAX_AGE", default=300)
+BLOG_LIVE_QUEUE_SIZE = 100
+
+# URL names served by the native async views in blog.async_views instead of
+# the sync ones, when running under ASGI, e.g.
+# BLOG_ASYNC_VIEWS=index,blogs,blogs-by-author,blog-detail,blog-comment
+BLOG_ASYNC_VIEWS = env.list("BLOG_ASYNC_VIEWS", default=[])
+
+# Sitemaps are rendered into BLOG_SITEMAP_ROOT by the build_sitemaps command
+# (run it every few minutes with --interval), one file per range of ids, and
+# only the files whose rows changed are rendered again. Point the web server
+# at that directory for /blog/sitemap*.xml. Sitemaps hold absolute URLs, on
+# BLOG_SITE_URL.
+BLOG_SITEMAP_ROOT = env("BLOG_SITEMAP_ROOT", default="") or str(BASE_DIR / "sitemaps")
+BLOG_SITE_URL = env("BLOG_SITE_URL", default="http://localhost:8000")
+
+# Record per-view latency, SQL queries, template render time and response
+# size (see blog.metrics), reported in a Server-Timing header and served to
+# Prometheus at /blog/metrics, for staff and local clients. Under gunicorn,
+# set PROMETHEUS_MULTIPROC_DIR to an empty directory, cleared at each start,
+# so the metrics of all the workers are added up.
+BLOG_METRICS = env.bool("BLOG_METRICS", default=False)
+
+# Log the SQL queries of a request taking BLOG_SLOW_QUERY_MS or more, with
+# the URL name, view and template or code line that ran them, and rank all
+# queries by fingerprint over the last BLOG_SLOW_QUERY_WINDOW seconds at
+# /blog/slow-queries (per worker; see blog.slowqueries).
+BLOG_SLOW_QUERIES = env.bool("BLOG_SLOW_QUERIES", default=False)
+BLOG_SLOW_QUERY_MS = env.float("BLOG_SLOW_QUERY_MS", default=100.0)
+BLOG_SLOW_QUERY_WINDOW = env.int("BLOG_SLOW_QUERY_WINDOW", default=600)
+
+# Profile requests with cProfile (see blog.profiling): those of staff users
+# adding ?profile=1, those passing a token from `manage.py profile_token` as
+# ?profile=, valid for BLOG_PROFILE_TOKEN_MAX_AGE seconds, and one request in
+# BLOG_PROFILE_SAMPLE_RATE picked at random (0 to pick none). The latest
+# BLOG_PROFILE_KEEP profiles are listed in the admin.
+BLOG_PROFILING = env.bool("BLOG_PROFILING", default=False)
+BLOG_PROFILE_SAMPLE_RATE = env.int("BLOG_PROFILE_SAMPLE_RATE", default=0)
+BLOG_PROFILE_TOKEN_MAX_AGE = env.int("BLOG_PROFILE_TOKEN_MAX_AGE", default=3600)
+BLOG_PROFILE_KEEP = env.int("BLOG_PROFILE_KEEP", default=100)
+
+# Raise instead of logging when a view exceeds its declared query_budget.
+BLOG_QUERY_BUDGET_STRICT = env.bool("BLOG_QUERY_BUDGET_STRICT", default=False)
+
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"